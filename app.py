@@ -11,15 +11,39 @@ Run:
   python app.py
 """
 
+import asyncio
+import importlib
 import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 import gradio as gr
 
-from core import ingestion, rag
-from core.artifacts import generate_report, generate_quiz, generate_podcast
+# core.ingestion / core.rag / core.artifacts and storage.vector_store pull in
+# sentence-transformers, torch and ChromaDB.  They are imported inside the
+# callbacks that need them (and warmed up in the background by build_app) so
+# the login screen does not wait on model loading.
 from core.models import LLMUnavailableError
-from storage import notebook_store, chat_store, artifact_store, vector_store
+from storage import artifact_store, chat_store, notebook_store
+from utils.batching import BatchCollector
+from utils.config import (
+    ARTIFACT_CONCURRENCY,
+    CHAT_DISPLAY_WINDOW,
+    CHAT_PERSIST_MAX_BATCH,
+    CHAT_PERSIST_WINDOW_S,
+    INGEST_CONCURRENCY,
+    INGEST_WORKERS,
+    LIGHT_CONCURRENCY,
+    LLM_CONCURRENCY,
+    QUEUE_DEFAULT_CONCURRENCY,
+    QUEUE_MAX_SIZE,
+    RAG_BATCH_CONCURRENCY,
+    RAG_BATCH_MAX_SIZE,
+    RAG_BATCH_WINDOW_S,
+    UI_CACHE_TTL_S,
+)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -27,6 +51,82 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+_HEAVY_MODULES = ("storage.vector_store", "core.rag", "core.ingestion", "core.artifacts")
+
+
+def _warm_up() -> None:
+    """Import the heavy modules and load the embedding model so the first
+    real request finds them ready."""
+    for name in _HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            logger.exception("Background import of %s failed", name)
+    try:
+        _vector_store().load_embedding_model()
+    except Exception:
+        logger.exception("Background load of the embedding model failed")
+
+
+def _retrieve_batch(requests):
+    from core import rag
+    return rag.retrieve_batch(requests)
+
+
+# Coalesces naive retrieval for chat turns from concurrent users into
+# rag.retrieve_batch() calls; each answer then streams on its own.  HyDE,
+# reranking and multi-query make an LLM call first, so they call
+# rag.retrieve() directly rather than hold up the plain lookups.
+_rag_batcher = BatchCollector(
+    _retrieve_batch,
+    max_batch_size=RAG_BATCH_MAX_SIZE,
+    window_s=RAG_BATCH_WINDOW_S,
+    max_concurrency=RAG_BATCH_CONCURRENCY,
+)
+
+# Shared across uploads so threads are reused.  PDF/PPTX parsing and
+# embedding are per-file independent, so a multi-file upload ingests its
+# files side by side instead of one after another.
+_ingest_pool = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+
+# ── Recurring component updates ────────────────────────
+#
+# Gradio edits returned update dicts in place: it pops "value" and drops
+# None entries.  An update without a value survives that untouched, so it
+# can be shared as a constant.  Updates that carry a value (even None) must
+# be built per call, or the first response would strip the value from the
+# shared dict and later responses would stop clearing the component.
+
+_HIDDEN = gr.update(visible=False)
+_SKIP = gr.skip()
+
+# on_login's answer for a visitor who is not logged in.  on_login only runs
+# from demo.load, i.e. on a fresh page, so components that start out empty
+# are skipped; the rest are immutable strings.  Safe to return as-is.
+_LOGGED_OUT = (
+    "",          # current_user
+    "",          # current_notebook_id
+    _SKIP,       # notebook_dd
+    "*Please log in with Hugging Face to start.*",
+    _SKIP,       # artifact_dd
+    _SKIP,       # chatbot
+    _SKIP,       # chat_history
+    "",          # citation_md
+    "*No sources yet.*",
+    _SKIP,       # audio_player
+    "",          # artifact_viewer
+)
+
+
+def _hidden_cleared() -> dict:
+    """Hide a component and clear its value (e.g. the podcast player)."""
+    return gr.update(visible=False, value=None)
+
+
+def _empty_dropdown() -> dict:
+    """Dropdown with no choices and nothing selected."""
+    return gr.update(choices=[], value=None)
+
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -39,28 +139,76 @@ def _get_username(profile: gr.OAuthProfile | None) -> str:
     return profile.username
 
 
-def _notebook_choices(username: str) -> list[str]:
-    """Return list of 'name (id)' strings for the dropdown."""
+# ── Short-lived cache for UI listings ──────────────────────
+#
+# Listing notebooks, sources and artifacts hits index.json, ChromaDB and the
+# artifacts directory.  Several callbacks re-read the same listing within a
+# single user action, so results are kept for UI_CACHE_TTL_S seconds and
+# dropped explicitly whenever the underlying data changes.  A listing whose
+# every change goes through a callback here (ttl=None) is kept until
+# invalidated.
+#
+# Keyed by (kind, username, notebook_id); notebook_id is "" for per-user
+# listings.
+
+_ui_cache: dict[tuple[str, str, str], tuple[float, object]] = {}
+
+
+def _cached(kind: str, username: str, notebook_id: str, loader, ttl: float | None = UI_CACHE_TTL_S):
+    key = (kind, username, notebook_id)
+    now = time.monotonic()
+    hit = _ui_cache.get(key)
+    if hit is not None and (ttl is None or now - hit[0] < ttl):
+        return hit[1]
+    value = loader()
+    _ui_cache[key] = (now, value)
+    return value
+
+
+def _invalidate(username: str, notebook_id: str | None = None) -> None:
+    """Drop cached listings for a user, or only for one of their notebooks."""
+    for key in list(_ui_cache):
+        if key[1] == username and (notebook_id is None or key[2] in ("", notebook_id)):
+            _ui_cache.pop(key, None)
+
+
+def _notebook_choices(username: str) -> list[tuple[str, str]]:
+    """Return ``(name, id)`` pairs for the dropdown.
+
+    Gradio shows the name and hands the id back as the dropdown value, so
+    callbacks get the notebook id directly without parsing the label.
+
+    Notebooks are only created, renamed or deleted through this UI, and each
+    of those callbacks invalidates the user's entry, so the list is read
+    from index.json once per change rather than once per callback.
+    """
     if not username:
         return []
-    notebooks = notebook_store.list_notebooks(username)
-    return [f"{nb['name']}  ({nb['id']})" for nb in notebooks]
+    return _cached("notebooks", username, "", lambda: [
+        (nb["name"], nb["id"])
+        for nb in notebook_store.list_notebooks(username)
+    ], ttl=None)
 
 
-def _parse_notebook_id(selection: str | None) -> str | None:
-    """Extract notebook UUID from dropdown value like 'My Notes  (uuid-here)'."""
-    if not selection:
-        return None
-    # ID is between the last '(' and ')'
-    try:
-        return selection.rsplit("(", 1)[1].rstrip(")")
-    except (IndexError, AttributeError):
-        return None
+def _artifact_choices(username: str, notebook_id: str) -> list[str]:
+    """Return list of 'type/filename' strings for the artifact dropdown."""
+    return _cached("artifacts", username, notebook_id, lambda: [
+        f"{a['type']}/{a['filename']}"
+        for a in artifact_store.list_artifacts(username, notebook_id)
+    ])
+
+
+def _vector_store():
+    from storage import vector_store
+    return vector_store
 
 
 def _sources_markdown(username: str, notebook_id: str) -> str:
     """Build a Markdown list of ingested sources for display."""
-    sources = vector_store.list_sources(username, notebook_id)
+    sources = _cached(
+        "sources", username, notebook_id,
+        lambda: _vector_store().list_sources(username, notebook_id),
+    )
     if not sources:
         return "*No sources ingested yet.*"
     lines = [f"- {s}" for s in sources]
@@ -68,18 +216,80 @@ def _sources_markdown(username: str, notebook_id: str) -> str:
 
 
 def _citations_markdown(citations) -> str:
-    """Format RAG citations as Markdown."""
+    """Format RAG citations as Markdown, one line per distinct source."""
     if not citations:
         return ""
-    lines = ["**Sources cited:**"]
-    seen = set()
+    first_by_source = {}
     for c in citations:
-        label = c.source_name
-        if label not in seen:
-            score_pct = f"{c.relevance_score * 100:.0f}%"
-            lines.append(f"- **{label}** (relevance: {score_pct})")
-            seen.add(label)
-    return "\n".join(lines)
+        first_by_source.setdefault(c.source_name, c)
+    body = "\n".join(
+        f"- **{label}** (relevance: {c.relevance_score * 100:.0f}%)"
+        for label, c in first_by_source.items()
+    )
+    return f"**Sources cited:**\n{body}"
+
+
+# ── Write-behind chat persistence ──────────────────────
+#
+# on_chat hands finished turns to _chat_writer and returns to the browser
+# without waiting on disk.  Turns queued within CHAT_PERSIST_WINDOW_S of each
+# other are written together: one append (and one touch_notebook) per
+# notebook, in arrival order.
+
+def _persist_chat_batch(entries):
+    grouped: dict[tuple[str, str], list[int]] = {}
+    for i, (username, notebook_id, _) in enumerate(entries):
+        grouped.setdefault((username, notebook_id), []).append(i)
+
+    results: list[Exception | None] = [None] * len(entries)
+    for (username, notebook_id), idxs in grouped.items():
+        try:
+            chat_store.append_messages(
+                username, notebook_id, [m for i in idxs for m in entries[i][2]]
+            )
+        except (ValueError, OSError) as e:
+            for i in idxs:
+                results[i] = e
+    return results
+
+
+_chat_writer = BatchCollector(
+    _persist_chat_batch,
+    max_batch_size=CHAT_PERSIST_MAX_BATCH,
+    window_s=CHAT_PERSIST_WINDOW_S,
+)
+_chat_writes: set[asyncio.Task] = set()   # strong refs until each write lands
+
+
+def _on_chat_written(task: asyncio.Task) -> None:
+    _chat_writes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Saving chat messages failed", exc_info=task.exception())
+
+
+def _persist_chat(username: str, notebook_id: str, pending: list[dict]) -> None:
+    """Queue buffered chat messages for a write-behind append and clear the buffer."""
+    if not pending:
+        return
+    task = asyncio.get_running_loop().create_task(
+        _chat_writer.submit((username, notebook_id, list(pending)))
+    )
+    pending.clear()
+    _chat_writes.add(task)
+    task.add_done_callback(_on_chat_written)
+
+
+def _chat_window(history: list[dict]) -> list[dict]:
+    """The tail of *history* that the Chatbot renders."""
+    return history[-CHAT_DISPLAY_WINDOW:]
+
+
+def _replace_or_append_reply(history: list[dict], content: str) -> None:
+    """Put *content* in the trailing assistant bubble, adding one if needed."""
+    if history and history[-1]["role"] == "assistant":
+        history[-1]["content"] = content
+    else:
+        history.append({"role": "assistant", "content": content})
 
 
 # ---------------------------------------------------------------------------
@@ -93,6 +303,9 @@ CUSTOM_CSS = """
 
 
 def build_app() -> gr.Blocks:
+    threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+    notebook_store.sweep_trash()
+
     with gr.Blocks(
         title="StudyPod — NotebookLM Clone",
     ) as demo:
@@ -100,6 +313,11 @@ def build_app() -> gr.Blocks:
         # ── Hidden state ──────────────────────────────────────
         current_user = gr.State("")
         current_notebook_id = gr.State("")
+        # Full chat of the selected notebook, kept server-side.  The Chatbot
+        # only ever receives the last CHAT_DISPLAY_WINDOW messages, so a long
+        # session doesn't re-send (or re-render) its whole back catalogue on
+        # every turn.
+        chat_history = gr.State([])
 
         # ── Header ────────────────────────────────────────────
         gr.Markdown("# 📚 StudyPod — NotebookLM Clone")
@@ -141,6 +359,7 @@ def build_app() -> gr.Blocks:
                     file_count="multiple",
                     file_types=[".pdf", ".pptx", ".txt"],
                 )
+                ingest_files_btn = gr.Button("Ingest files", size="sm", variant="primary")
                 url_input = gr.Textbox(
                     label="Or paste a URL",
                     placeholder="https://example.com/article",
@@ -196,30 +415,23 @@ def build_app() -> gr.Blocks:
         def on_login(profile: gr.OAuthProfile | None):
             username = _get_username(profile)
             if not username:
-                return (
-                    "",          # current_user
-                    "",          # current_notebook_id
-                    gr.update(choices=[], value=None),  # notebook_dd
-                    "*Please log in with Hugging Face to start.*",
-                    gr.update(choices=[], value=None),  # artifact_dd
-                    [],          # chatbot
-                    "",          # citation_md
-                    "*No sources yet.*",
-                    gr.update(visible=False),  # audio_player
-                    "",          # artifact_viewer
-                )
+                return _LOGGED_OUT
             choices = _notebook_choices(username)
+            # This only runs on page load, so everything except the user,
+            # the notebook list and the status lines still holds its
+            # initial empty value — skip sending those back.
             return (
                 username,
-                "",
+                _SKIP,       # current_notebook_id
                 gr.update(choices=choices, value=None),
                 f"✅ Logged in as **{username}**",
-                gr.update(choices=[], value=None),
-                [],
-                "",
+                _SKIP,       # artifact_dd
+                _SKIP,       # chatbot
+                _SKIP,       # chat_history
+                _SKIP,       # citation_md
                 "*Select or create a notebook.*",
-                gr.update(visible=False),
-                "",
+                _SKIP,       # audio_player
+                _SKIP,       # artifact_viewer
             )
 
         demo.load(
@@ -227,9 +439,10 @@ def build_app() -> gr.Blocks:
             inputs=None,
             outputs=[
                 current_user, current_notebook_id, notebook_dd,
-                status_md, artifact_dd, chatbot, citation_md,
+                status_md, artifact_dd, chatbot, chat_history, citation_md,
                 source_list_md, audio_player, artifact_viewer,
             ],
+            concurrency_limit=LIGHT_CONCURRENCY,
         )
 
         # ── Create notebook ───────────────────────────────────
@@ -242,11 +455,11 @@ def build_app() -> gr.Blocks:
                 return gr.update(), gr.update(), "", ""
             try:
                 meta = notebook_store.create_notebook(username, name.strip())
+                _invalidate(username)
                 choices = _notebook_choices(username)
                 # Auto-select the new notebook
-                new_val = f"{meta['name']}  ({meta['id']})"
                 return (
-                    gr.update(choices=choices, value=new_val),
+                    gr.update(choices=choices, value=meta["id"]),
                     meta["id"],
                     "",   # clear name textbox
                     "*No sources yet.*",
@@ -259,58 +472,62 @@ def build_app() -> gr.Blocks:
             on_create_notebook,
             inputs=[current_user, notebook_name_tb],
             outputs=[notebook_dd, current_notebook_id, notebook_name_tb, source_list_md],
+            concurrency_limit=LIGHT_CONCURRENCY,
         )
 
         # ── Select notebook ───────────────────────────────────
-        def on_select_notebook(username, selection):
-            nb_id = _parse_notebook_id(selection)
+        def on_select_notebook(username, nb_id):
+            # notebook_dd's value is the notebook id (see _notebook_choices)
             if not username or not nb_id:
-                return "", [], "", "*No sources yet.*", gr.update(choices=[], value=None), "", gr.update(visible=False)
+                return "", [], [], "", "*No sources yet.*", _empty_dropdown(), "", _HIDDEN
             # Load chat history
+            # Stored messages also carry timestamp / citations / timing, which
+            # the Chatbot doesn't accept, so project to role + content.
             history = chat_store.get_history(username, nb_id)
-            messages = []
-            for msg in history:
-                messages.append({"role": msg["role"], "content": msg["content"]})
+            messages = [{"role": m["role"], "content": m["content"]} for m in history]
             # Load sources
             sources_md = _sources_markdown(username, nb_id)
             # Load artifacts list
-            arts = artifact_store.list_artifacts(username, nb_id)
-            art_choices = [f"{a['type']}/{a['filename']}" for a in arts]
+            art_choices = _artifact_choices(username, nb_id)
             return (
                 nb_id,
+                _chat_window(messages),
                 messages,
                 "",          # clear citations
                 sources_md,
                 gr.update(choices=art_choices, value=None),
                 "",          # clear artifact viewer
-                gr.update(visible=False),  # hide audio
+                _HIDDEN,  # hide audio
             )
 
         notebook_dd.change(
             on_select_notebook,
             inputs=[current_user, notebook_dd],
             outputs=[
-                current_notebook_id, chatbot, citation_md,
+                current_notebook_id, chatbot, chat_history, citation_md,
                 source_list_md, artifact_dd, artifact_viewer, audio_player,
             ],
+            concurrency_limit=LIGHT_CONCURRENCY,
         )
 
         # ── Delete notebook ───────────────────────────────────
-        def on_delete_notebook(username, selection):
-            nb_id = _parse_notebook_id(selection)
+        def on_delete_notebook(username, nb_id):
             if not username or not nb_id:
                 gr.Warning("No notebook selected.")
-                return gr.update(), "", [], "", "*No sources yet.*"
+                return gr.update(), "", [], [], "", "*No sources yet.*"
             try:
+                # Release the collection's files before the directory goes
+                _vector_store().delete_collection(username, nb_id)
                 notebook_store.delete_notebook(username, nb_id)
-                vector_store.delete_collection(username, nb_id)
             except KeyError:
                 pass
+            _invalidate(username)
             choices = _notebook_choices(username)
             return (
                 gr.update(choices=choices, value=None),
                 "",
                 [],
+                [],
                 "",
                 "*Select or create a notebook.*",
             )
@@ -318,12 +535,12 @@ def build_app() -> gr.Blocks:
         delete_nb_btn.click(
             on_delete_notebook,
             inputs=[current_user, notebook_dd],
-            outputs=[notebook_dd, current_notebook_id, chatbot, citation_md, source_list_md],
+            outputs=[notebook_dd, current_notebook_id, chatbot, chat_history, citation_md, source_list_md],
+            concurrency_limit=LIGHT_CONCURRENCY,
         )
 
         # ── Rename notebook ───────────────────────────────────
-        def on_rename_notebook(username, selection, new_name):
-            nb_id = _parse_notebook_id(selection)
+        def on_rename_notebook(username, nb_id, new_name):
             if not username or not nb_id:
                 gr.Warning("No notebook selected.")
                 return gr.update(), ""
@@ -332,10 +549,9 @@ def build_app() -> gr.Blocks:
                 return gr.update(), new_name
             try:
                 notebook_store.update_notebook_name(username, nb_id, new_name.strip())
+                _invalidate(username)
                 choices = _notebook_choices(username)
-                meta = notebook_store.get_notebook(username, nb_id)
-                new_val = f"{meta['name']}  ({meta['id']})"
-                return gr.update(choices=choices, value=new_val), ""
+                return gr.update(choices=choices, value=nb_id), ""
             except (ValueError, RuntimeError, KeyError) as e:
                 gr.Warning(str(e))
                 return gr.update(), new_name
@@ -344,35 +560,47 @@ def build_app() -> gr.Blocks:
             on_rename_notebook,
             inputs=[current_user, notebook_dd, notebook_name_tb],
             outputs=[notebook_dd, notebook_name_tb],
+            concurrency_limit=LIGHT_CONCURRENCY,
         )
 
         # ── File upload (ingestion) ───────────────────────────
         def on_file_upload(username, nb_id, files):
             if not username:
                 gr.Warning("Please log in first.")
-                return gr.update()
+                return gr.update(), gr.update()
             if not nb_id:
                 gr.Warning("Please select or create a notebook first.")
-                return gr.update()
+                return gr.update(), gr.update()
             if not files:
-                return gr.update()
+                gr.Warning("No files selected.")
+                return gr.update(), gr.update()
+
+            from core import ingestion
 
-            results = []
-            for f in files:
+            def ingest_one(f):
                 try:
                     file_path = f.name if hasattr(f, "name") else str(f)
                     res = ingestion.ingest_file(username, nb_id, file_path)
-                    results.append(f"✅ {res['source']} — {res['chunks']} chunks")
+                    return f"✅ {res['source']} — {res['chunks']} chunks"
                 except (ValueError, OSError) as e:
-                    results.append(f"❌ Error: {e}")
+                    return f"❌ Error: {e}"
+
+            # map() keeps the report in upload order.
+            results = list(_ingest_pool.map(ingest_one, files))
 
             gr.Info("\n".join(results))
-            return _sources_markdown(username, nb_id)
+            _invalidate(username, nb_id)
+            return _sources_markdown(username, nb_id), None   # clear the picker
 
-        file_upload.change(
+        # Ingest only on an explicit click: file_upload.change also fires when
+        # the component is re-rendered or cleared, and each spurious fire would
+        # re-parse and re-embed every file.
+        ingest_files_btn.click(
             on_file_upload,
             inputs=[current_user, current_notebook_id, file_upload],
-            outputs=[source_list_md],
+            outputs=[source_list_md, file_upload],
+            concurrency_limit=INGEST_CONCURRENCY,
+            concurrency_id="ingest",
         )
 
         # ── URL ingestion ─────────────────────────────────────
@@ -386,9 +614,12 @@ def build_app() -> gr.Blocks:
             if not url or not url.strip():
                 gr.Warning("Please enter a URL.")
                 return gr.update(), url
+            from core import ingestion
+
             try:
                 res = ingestion.ingest_url(username, nb_id, url.strip())
                 gr.Info(f"✅ {res['source']} — {res['chunks']} chunks")
+                _invalidate(username, nb_id)
                 return _sources_markdown(username, nb_id), ""
             except (ValueError, OSError) as e:
                 gr.Warning(f"❌ {e}")
@@ -398,40 +629,66 @@ def build_app() -> gr.Blocks:
             on_ingest_url,
             inputs=[current_user, current_notebook_id, url_input],
             outputs=[source_list_md, url_input],
+            concurrency_limit=INGEST_CONCURRENCY,
+            concurrency_id="ingest",
         )
 
         # ── Chat (RAG) ───────────────────────────────────────
-        def on_chat(username, nb_id, message, history, technique):
+        async def on_chat(username, nb_id, message, history, technique):
             if not username:
                 gr.Warning("Please log in first.")
-                return history or [], "", gr.update()
+                yield _SKIP, _SKIP, "", gr.update()
+                return
             if not nb_id:
                 gr.Warning("Please select or create a notebook first.")
-                return history or [], "", gr.update()
+                yield _SKIP, _SKIP, "", gr.update()
+                return
             if not message or not message.strip():
-                return history or [], "", gr.update()
+                yield _SKIP, _SKIP, "", gr.update()
+                return
 
             history = history or []
 
-            # Append user message to display and store
+            # Show the user message now; persist it together with the reply
+            # (or alone, if the turn fails) in a single write-behind append.
             history.append({"role": "user", "content": message.strip()})
-            chat_store.append_message(username, nb_id, {
-                "role": "user", "content": message.strip(),
-            })
+            pending = [{"role": "user", "content": message.strip()}]
+
+            from core import rag
 
             try:
                 t0 = time.time()
-                response = rag.query(username, nb_id, message.strip(), technique=technique)
+                if technique == "naive":
+                    retrieved = await _rag_batcher.submit(
+                        (username, nb_id, message.strip())
+                    )
+                else:
+                    retrieved = await asyncio.to_thread(
+                        rag.retrieve, username, nb_id, message.strip(), technique
+                    )
+                response, tokens = await asyncio.to_thread(
+                    rag.stream_answer, message.strip(), *retrieved
+                )
+
+                # Stream the answer into a placeholder assistant bubble.
+                # The token iterator does blocking network reads, so each
+                # step runs off the event loop.
+                history.append({"role": "assistant", "content": ""})
+                yield _chat_window(history), history, "", ""
+                while (token := await asyncio.to_thread(next, tokens, None)) is not None:
+                    history[-1]["content"] += token
+                    yield _chat_window(history), _SKIP, "", gr.update()
                 elapsed_ms = (time.time() - t0) * 1000
 
-                answer = response.answer
-                citations_md = _citations_markdown(response.citations)
-                citations_md += f"\n\n*Technique: {response.technique} | "
-                citations_md += f"Chunks: {response.chunks_considered} | "
-                citations_md += f"Time: {elapsed_ms:.0f}ms*"
+                answer = history[-1]["content"]
+                citations_md = (
+                    f"{_citations_markdown(response.citations)}\n\n"
+                    f"*Technique: {response.technique} | "
+                    f"Chunks: {response.chunks_considered} | "
+                    f"Time: {elapsed_ms:.0f}ms*"
+                )
 
-                # Store assistant message
-                chat_store.append_message(username, nb_id, {
+                pending.append({
                     "role": "assistant",
                     "content": answer,
                     "rag_technique": response.technique,
@@ -442,130 +699,123 @@ def build_app() -> gr.Blocks:
                     ],
                     "timing": {"total_ms": round(elapsed_ms, 1)},
                 })
+                _persist_chat(username, nb_id, pending)
 
-                history.append({"role": "assistant", "content": answer})
-                return history, "", citations_md
+                yield _chat_window(history), history, "", citations_md
 
             except LLMUnavailableError:
                 err = "⚠️ The LLM is currently unavailable. Please try again later."
-                history.append({"role": "assistant", "content": err})
-                return history, "", ""
+                _replace_or_append_reply(history, err)
+                yield _chat_window(history), history, "", ""
             except Exception as e:
                 logger.exception("Chat error")
                 err = f"⚠️ Error: {e}"
-                history.append({"role": "assistant", "content": err})
-                return history, "", ""
-
-        send_btn.click(
-            on_chat,
-            inputs=[current_user, current_notebook_id, user_input, chatbot, rag_technique],
-            outputs=[chatbot, user_input, citation_md],
-        )
-        user_input.submit(
-            on_chat,
-            inputs=[current_user, current_notebook_id, user_input, chatbot, rag_technique],
-            outputs=[chatbot, user_input, citation_md],
+                _replace_or_append_reply(history, err)
+                yield _chat_window(history), history, "", ""
+            finally:
+                # Failed turn or client gone mid-stream: keep the question
+                _persist_chat(username, nb_id, pending)
+
+        gr.on(
+            triggers=[send_btn.click, user_input.submit],
+            fn=on_chat,
+            inputs=[current_user, current_notebook_id, user_input, chat_history, rag_technique],
+            outputs=[chatbot, chat_history, user_input, citation_md],
+            concurrency_limit=LLM_CONCURRENCY,
+            concurrency_id="llm",
         )
 
         # ── Artifact generation ───────────────────────────────
-        def on_generate_report(username, nb_id):
+        def on_generate(kind, username, nb_id):
+            # kind is "report" | "quiz" → core.artifacts.stream_<kind>, shown
+            # as it streams in (a failure part-way raises, and the error then
+            # replaces the partial text); "podcast" → core.artifacts.generate_podcast
             if not username or not nb_id:
                 gr.Warning("Select a notebook first.")
-                return "", gr.update(visible=False)
-            try:
-                result = generate_report(username, nb_id)
-                if result is None:
-                    return "⚠️ Report generation is not yet implemented.", gr.update(visible=False)
-                return result, gr.update(visible=False)
-            except Exception as e:
-                logger.exception("Report generation error")
-                return f"⚠️ Error generating report: {e}", gr.update(visible=False)
+                yield "", _HIDDEN
+                return
+            from core import artifacts
 
-        def on_generate_quiz(username, nb_id):
-            if not username or not nb_id:
-                gr.Warning("Select a notebook first.")
-                return "", gr.update(visible=False)
             try:
-                result = generate_quiz(username, nb_id)
-                if result is None:
-                    return "⚠️ Quiz generation is not yet implemented.", gr.update(visible=False)
-                return result, gr.update(visible=False)
+                if kind == "podcast":
+                    result = artifacts.generate_podcast(username, nb_id)
+                else:
+                    text = ""
+                    for chunk in getattr(artifacts, f"stream_{kind}")(username, nb_id):
+                        text += chunk
+                        yield text, _HIDDEN
+                    result = text
+                _invalidate(username, nb_id)
             except Exception as e:
-                logger.exception("Quiz generation error")
-                return f"⚠️ Error generating quiz: {e}", gr.update(visible=False)
+                logger.exception("%s generation error", kind.capitalize())
+                yield f"⚠️ Error generating {kind}: {e}", _hidden_cleared()
+                return
 
-        def on_generate_podcast(username, nb_id):
-            if not username or not nb_id:
-                gr.Warning("Select a notebook first.")
-                return "", gr.update(visible=True)
-            try:
-                result = generate_podcast(username, nb_id)
-                if result is None or result == (None, None):
-                    return "⚠️ No sources found to generate podcast.", gr.update(visible=False, value=None)
+            if isinstance(result, tuple):               # podcast
                 transcript_path, audio_path = result
-                # Read the transcript markdown
+                if audio_path is None:
+                    yield "⚠️ No sources found to generate podcast.", _hidden_cleared()
+                    return
+                # Read (the head of) the transcript markdown
                 try:
-                    from pathlib import Path
-                    transcript = Path(transcript_path).read_text(encoding="utf-8") if transcript_path else ""
+                    transcript = artifact_store.read_preview(transcript_path) if transcript_path else ""
                 except Exception:
                     transcript = "Podcast generated."
-                return transcript, gr.update(visible=True, value=audio_path)
-            except Exception as e:
-                logger.exception("Podcast generation error")
-                return f"⚠️ Error generating podcast: {e}", gr.update(visible=False, value=None)
-
-        report_btn.click(
-            on_generate_report,
-            inputs=[current_user, current_notebook_id],
-            outputs=[artifact_viewer, audio_player],
-        )
-        quiz_btn.click(
-            on_generate_quiz,
-            inputs=[current_user, current_notebook_id],
-            outputs=[artifact_viewer, audio_player],
-        )
-        podcast_btn.click(
-            on_generate_podcast,
-            inputs=[current_user, current_notebook_id],
-            outputs=[artifact_viewer, audio_player],
-        )
+                yield transcript, gr.update(visible=True, value=audio_path)
+
+        for btn, kind in ((report_btn, "report"), (quiz_btn, "quiz"), (podcast_btn, "podcast")):
+            btn.click(
+                partial(on_generate, kind),
+                inputs=[current_user, current_notebook_id],
+                outputs=[artifact_viewer, audio_player],
+                api_name=f"on_generate_{kind}",  # endpoint names of the former per-kind handlers
+                concurrency_limit=ARTIFACT_CONCURRENCY,
+                concurrency_id="artifacts",
+            )
 
         # ── Artifact list / view ──────────────────────────────
         def on_refresh_artifacts(username, nb_id):
             if not username or not nb_id:
-                return gr.update(choices=[], value=None)
-            arts = artifact_store.list_artifacts(username, nb_id)
-            choices = [f"{a['type']}/{a['filename']}" for a in arts]
+                return _empty_dropdown()
+            _invalidate(username, nb_id)     # explicit refresh always re-reads
+            choices = _artifact_choices(username, nb_id)
             return gr.update(choices=choices, value=None)
 
         refresh_artifacts_btn.click(
             on_refresh_artifacts,
             inputs=[current_user, current_notebook_id],
             outputs=[artifact_dd],
+            concurrency_limit=LIGHT_CONCURRENCY,
         )
 
         def on_select_artifact(username, nb_id, selection):
             if not username or not nb_id or not selection:
-                return "", gr.update(visible=False, value=None)
+                return "", _hidden_cleared()
             try:
                 art_type, filename = selection.split("/", 1)
-                content = artifact_store.get_artifact(username, nb_id, art_type, filename)
                 is_audio = filename.endswith(".mp3")
                 if is_audio:
-                    # We need the file path, not bytes, for gr.Audio
-                    from storage.notebook_store import get_artifact_dir
-                    fpath = get_artifact_dir(username, nb_id, art_type) / filename
+                    # gr.Audio serves the file from its path; never read the MP3
+                    fpath = artifact_store.get_artifact_path(username, nb_id, art_type, filename)
                     return "", gr.update(visible=True, value=str(fpath))
-                return content, gr.update(visible=False, value=None)
+                content = artifact_store.get_artifact_preview(username, nb_id, art_type, filename)
+                return content, _hidden_cleared()
             except (FileNotFoundError, ValueError) as e:
-                return f"⚠️ {e}", gr.update(visible=False, value=None)
+                return f"⚠️ {e}", _hidden_cleared()
 
         artifact_dd.change(
             on_select_artifact,
             inputs=[current_user, current_notebook_id, artifact_dd],
             outputs=[artifact_viewer, audio_player],
+            concurrency_limit=LIGHT_CONCURRENCY,
         )
 
+    # Sync handlers run in the FastAPI threadpool; the queue lets them
+    # overlap up to each event's concurrency limit instead of serializing.
+    demo.queue(
+        default_concurrency_limit=QUEUE_DEFAULT_CONCURRENCY,
+        max_size=QUEUE_MAX_SIZE,
+    )
     return demo
 
 
@@ -8,16 +8,25 @@ Responsibilities:
       * Report  — structured summary with headings and source refs (.md)
       * Quiz    — N questions (MCQ / short-answer / T-F) + answer key (.md)
       * Podcast — two-speaker conversational transcript (.md) + TTS audio (.mp3)
+  - Stream report and quiz Markdown to disk (and the caller) as it is generated
   - Save outputs to artifacts/<type>/
 """
 
+import asyncio
+import hashlib
 import logging
+import math
 import re
-import tempfile
+import threading
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from pathlib import Path
+from functools import lru_cache
+
+from groq import APIError
 
 from core import llm_client
+from core.models import LLMUnavailableError
 from storage.notebook_store import get_artifact_dir
 from utils.config import (
     TTS_HOST_A_PITCH,
@@ -27,13 +36,42 @@ from utils.config import (
     TTS_HOST_B_RATE,
     TTS_HOST_B_VOICE,
     TTS_MAX_CHARS,
+    TTS_TIMEOUT_S,
 )
 
 logger = logging.getLogger(__name__)
 
 # Context window limits (conservative estimates)
 MAX_CONTEXT_TOKENS = 8000
-AVG_CHARS_PER_TOKEN = 4
+AVG_CHARS_PER_TOKEN = 4         # only used when tiktoken is unavailable
+
+# Token counts memoized by text digest, so the same notebook text is only
+# tokenized once
+TOKEN_COUNT_CACHE_SIZE = 256
+_token_counts: dict[bytes, int] = {}
+_token_counts_lock = threading.Lock()
+
+# Chunks fetched per collection.get() call when gathering notebook text
+GATHER_PAGE_SIZE = 1000
+
+# Gathered notebook text, reused across report/quiz/podcast until the
+# notebook's collection is written to again
+NOTEBOOK_TEXT_CACHE_SIZE = 64
+_notebook_texts: dict[tuple[str, str], tuple[int, str]] = {}
+_notebook_texts_lock = threading.Lock()
+
+# Event loop for TTS synthesis, started on first use and kept running in a
+# daemon thread so each podcast doesn't pay for a fresh asyncio.run() loop
+_tts_loop: asyncio.AbstractEventLoop | None = None
+_tts_loop_lock = threading.Lock()
+
+# Concurrent LLM calls in the map phase of _summarize_text
+SUMMARY_MAP_WORKERS = 8
+
+# Map-reduce summarization: chunk size at the first level (doubled at each
+# level above it) and how many levels to stack before giving up
+SUMMARY_CHUNK_SIZE = 1500
+MAX_SUMMARY_DEPTH = 3
 
 
 def _gather_notebook_text(username: str, notebook_id: str) -> str:
@@ -41,80 +79,237 @@ def _gather_notebook_text(username: str, notebook_id: str) -> str:
     try:
         from storage import vector_store
 
-        # Use the underlying collection to fetch all stored documents and metadatas
+        # Page through the underlying collection rather than loading every
+        # document and metadata in one get(), so peak memory stays bounded
         coll = vector_store.get_or_create_collection(username, notebook_id)
-        all_data = coll.get(include=["documents", "metadatas"]) or {}
-        docs = all_data.get("documents", [])
-        # chroma may return nested lists; normalize
-        if docs and isinstance(docs[0], list):
-            docs = docs[0]
-        metadatas = all_data.get("metadatas", [])
-        if metadatas and isinstance(metadatas[0], list):
-            metadatas = metadatas[0]
-        
-        # Combine with source attribution
-        combined_text = ""
-        for doc, meta in zip(docs, metadatas):
-            # metadata field uses 'source' in vector_store ingestion
-            source = meta.get("source", meta.get("source_name", "unknown"))
-            combined_text += f"\n\n[From {source}]\n{doc}"
-        
+        parts: list[str] = []
+        offset = 0
+        while True:
+            page = coll.get(
+                include=["documents", "metadatas"],
+                limit=GATHER_PAGE_SIZE,
+                offset=offset,
+            ) or {}
+            docs = page.get("documents", [])
+            # chroma may return nested lists; normalize
+            if docs and isinstance(docs[0], list):
+                docs = docs[0]
+            metadatas = page.get("metadatas", [])
+            if metadatas and isinstance(metadatas[0], list):
+                metadatas = metadatas[0]
+
+            # Combine with source attribution
+            for doc, meta in zip(docs, metadatas):
+                # metadata field uses 'source' in vector_store ingestion
+                source = meta.get("source", meta.get("source_name", "unknown"))
+                parts.append(f"\n\n[From {source}]\n{doc}")
+
+            if len(docs) < GATHER_PAGE_SIZE:
+                break
+            offset += GATHER_PAGE_SIZE
+
+        combined_text = "".join(parts)
         return combined_text if combined_text.strip() else ""
     except Exception as e:
         logger.error(f"Error gathering notebook text: {e}")
         return ""
 
 
+def _notebook_text(username: str, notebook_id: str) -> str:
+    """_gather_notebook_text, memoized per notebook by collection write version.
+
+    The map-reduce summaries of the same text are already served from the
+    LLM response cache, so this removes the remaining repeated work: paging
+    through the whole collection for every artifact.
+    """
+    from storage import vector_store
+
+    key = (username, notebook_id)
+    # Read the version before gathering: a write that lands mid-gather moves
+    # the version on, so the entry stored below is never served as current
+    version = vector_store.collection_version(username, notebook_id)
+    with _notebook_texts_lock:
+        cached = _notebook_texts.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    text = _gather_notebook_text(username, notebook_id)
+    if text:                                    # "" may be a transient error
+        with _notebook_texts_lock:
+            _notebook_texts.pop(key, None)
+            if len(_notebook_texts) >= NOTEBOOK_TEXT_CACHE_SIZE:
+                _notebook_texts.pop(next(iter(_notebook_texts)))    # oldest first
+            _notebook_texts[key] = (version, text)
+    return text
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """tiktoken's cl100k_base encoding, or None if it cannot be loaded."""
+    try:
+        import tiktoken
+
+        # Fetches the BPE file on first use, so this can fail offline too
+        # (requests' connection errors are OSErrors)
+        return tiktoken.get_encoding("cl100k_base")
+    except (ImportError, OSError, ValueError) as e:
+        logger.warning(f"tiktoken unavailable ({e}); estimating token counts from length")
+        return None
+
+
+def _count_tokens(text: str) -> int:
+    """Token count of *text*, memoized by its blake2b digest."""
+    key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+    with _token_counts_lock:
+        count = _token_counts.get(key)
+    if count is not None:
+        return count
+
+    enc = _encoding()
+    if enc is not None:
+        count = len(enc.encode_ordinary(text))
+    else:
+        count = math.ceil(len(text) / AVG_CHARS_PER_TOKEN)
+
+    with _token_counts_lock:
+        if len(_token_counts) >= TOKEN_COUNT_CACHE_SIZE:
+            _token_counts.pop(next(iter(_token_counts)))    # oldest first
+        _token_counts[key] = count
+    return count
+
+
+def _get_tts_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared TTS event loop, starting its thread on first use."""
+    global _tts_loop
+    if _tts_loop is None:
+        with _tts_loop_lock:
+            if _tts_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="tts-loop", daemon=True
+                ).start()
+                _tts_loop = loop
+    return _tts_loop
+
+
+def _run_tts(coro) -> None:
+    """Run *coro* on the shared TTS loop and wait up to TTS_TIMEOUT_S for it."""
+    future = asyncio.run_coroutine_threadsafe(coro, _get_tts_loop())
+    try:
+        future.result(timeout=TTS_TIMEOUT_S)
+    except BaseException:
+        future.cancel()                         # don't keep writing after we give up
+        raise
+
+
 def _should_summarize(text: str) -> bool:
     """Check if text exceeds context window and needs summarization."""
-    estimated_tokens = len(text) / AVG_CHARS_PER_TOKEN
-    return estimated_tokens > MAX_CONTEXT_TOKENS
+    return _count_tokens(text) > MAX_CONTEXT_TOKENS
+
+
+def _summarize_chunk(i: int, chunk: str) -> str:
+    """Summarize one map-phase chunk, falling back to its head on error."""
+    try:
+        response = llm_client.complete(
+            prompt=f"Summarize this text concisely:\n\n{chunk}",
+            system_prompt="You are a concise summarizer. Return only the key points.",
+            temperature=0.3,
+            cache=True,
+        )
+        return response.text
+    except (LLMUnavailableError, APIError) as e:
+        logger.warning(f"Error summarizing chunk {i}: {e}")
+        return chunk[:500]
 
 
-def _summarize_text(text: str) -> str:
-    """Map-reduce summarization for large texts."""
+def _summarize_text(text: str, depth: int = 0) -> str:
+    """Map-reduce summarization for large texts.
+
+    If the joined chunk summaries still exceed the context window, they are
+    re-chunked (with twice the chunk size) and summarized again, up to
+    MAX_SUMMARY_DEPTH levels.
+    """
     if len(text) <= 2000:
         return text
     
-    logger.info("Text exceeds context window; applying map-reduce summarization")
+    logger.info("Text exceeds context window; applying map-reduce summarization (level %d)", depth)
     
-    # Split into chunks
-    chunk_size = 1500
-    chunks = [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
+    # Split into chunks, dropping repeats (e.g. the same slide or boilerplate
+    # ingested twice) so they don't cost an LLM call each
+    chunk_size = SUMMARY_CHUNK_SIZE * 2 ** depth
+    chunks = list(dict.fromkeys(
+        text[i:i+chunk_size] for i in range(0, len(text), chunk_size)
+    ))
     
-    # Map: summarize each chunk
-    chunk_summaries = []
-    for i, chunk in enumerate(chunks):
-        try:
-            response = llm_client.complete(
-                prompt=f"Summarize this text concisely:\n\n{chunk}",
-                system_prompt="You are a concise summarizer. Return only the key points.",
-                temperature=0.3,
-            )
-            chunk_summaries.append(response.text)
-        except Exception as e:
-            logger.warning(f"Error summarizing chunk {i}: {e}")
-            chunk_summaries.append(chunk[:500])
-    
-    # Reduce: combine summaries
+    # Map: summarize each chunk.  The calls are network-bound, so they run
+    # side by side; map() keeps the summaries in chunk order.
+    with ThreadPoolExecutor(max_workers=min(SUMMARY_MAP_WORKERS, len(chunks))) as pool:
+        chunk_summaries = list(pool.map(_summarize_chunk, range(len(chunks)), chunks))
+
+    # Reduce: combine summaries, summarizing them again if still too long
     combined_summary = "\n\n".join(chunk_summaries)
+    if _should_summarize(combined_summary) and depth + 1 < MAX_SUMMARY_DEPTH:
+        return _summarize_text(combined_summary, depth + 1)
     return combined_summary
 
 
-def generate_report(username: str, notebook_id: str) -> str:
-    """Generate a summary report from all notebook sources."""
+def _stream_artifact(
+    username: str,
+    notebook_id: str,
+    artifact_type: str,
+    prefix: str,
+    prompt: str,
+    system_prompt: str,
+) -> Iterator[str]:
+    """Stream an LLM completion into artifacts/<artifact_type>/<prefix>_<timestamp>.md.
+
+    Each chunk is written to the file as it arrives and then yielded, so the
+    caller can display the artifact while it is still being generated.  If
+    the stream fails or is abandoned part-way, the partial file is removed.
+    """
+    chunks = llm_client.complete(
+        prompt=prompt,
+        system_prompt=system_prompt,
+        stream=True,
+        temperature=0.5,
+        cache=True,
+    )
+
+    artifact_dir = get_artifact_dir(username, notebook_id, artifact_type)
+    artifact_dir.mkdir(parents=True, exist_ok=True)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    artifact_file = artifact_dir / f"{prefix}_{timestamp}.md"
     try:
-        # Gather text
-        notebook_text = _gather_notebook_text(username, notebook_id)
-        if not notebook_text.strip():
-            return "# Report\n\nNo sources found in this notebook."
-        
-        # Summarize if needed
-        if _should_summarize(notebook_text):
-            notebook_text = _summarize_text(notebook_text)
-        
-        # Generate report via LLM
-        prompt = f"""Based on the following material, generate a well-structured report with:
+        with artifact_file.open("w", encoding="utf-8") as fh:
+            for chunk in chunks:
+                fh.write(chunk)
+                yield chunk
+    except BaseException:
+        artifact_file.unlink(missing_ok=True)
+        raise
+
+    logger.info(f"{prefix.capitalize()} saved to {artifact_file}")
+
+
+def stream_report(username: str, notebook_id: str) -> Iterator[str]:
+    """Generate a summary report, yielding Markdown chunks as they arrive.
+
+    Errors are raised, even after some chunks were yielded, so the caller
+    can discard the partial report instead of showing it beside the error.
+    """
+    # Gather text
+    notebook_text = _notebook_text(username, notebook_id)
+    if not notebook_text.strip():
+        yield "# Report\n\nNo sources found in this notebook."
+        return
+
+    # Summarize if needed
+    if _should_summarize(notebook_text):
+        notebook_text = _summarize_text(notebook_text)
+
+    # Generate report via LLM, saving it to artifacts as it streams
+    prompt = f"""Based on the following material, generate a well-structured report with:
 - Executive Summary (2-3 sentences)
 - Key Concepts (bullet points)
 - Main Topics (with subsections)
@@ -123,44 +318,42 @@ def generate_report(username: str, notebook_id: str) -> str:
 Material:
 {notebook_text}"""
 
-        response = llm_client.complete(
-            prompt=prompt,
-            system_prompt="You are an expert report writer. Generate a professional, well-organized report in Markdown format.",
-            temperature=0.5,
-        )
-        
-        report_md = response.text
-        
-        # Save to artifacts
-        artifact_dir = get_artifact_dir(username, notebook_id, "reports")
-        artifact_dir.mkdir(parents=True, exist_ok=True)
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        report_file = artifact_dir / f"report_{timestamp}.md"
-        report_file.write_text(report_md, encoding="utf-8")
-        
-        logger.info(f"Report saved to {report_file}")
-        return report_md
-        
-    except Exception as e:
+    yield from _stream_artifact(
+        username,
+        notebook_id,
+        "reports",
+        "report",
+        prompt,
+        "You are an expert report writer. Generate a professional, well-organized report in Markdown format.",
+    )
+
+
+def generate_report(username: str, notebook_id: str) -> str:
+    """Generate a summary report from all notebook sources."""
+    try:
+        return "".join(stream_report(username, notebook_id))
+    except Exception as e:  # noqa: BLE001 - returns an error document, never raises
         logger.error(f"Error generating report: {e}")
         return f"# Report Generation Error\n\n{str(e)}"
 
 
-def generate_quiz(username: str, notebook_id: str, num_questions: int = 10) -> str:
-    """Generate a quiz with answer key from all notebook sources."""
-    try:
-        # Gather text
-        notebook_text = _gather_notebook_text(username, notebook_id)
-        if not notebook_text.strip():
-            return "# Quiz\n\nNo sources found to generate quiz."
-        
-        # Summarize if needed
-        if _should_summarize(notebook_text):
-            notebook_text = _summarize_text(notebook_text)
-        
-        # Generate quiz via LLM
-        prompt = f"""Based on the following material, generate a quiz with {num_questions} questions.
+def stream_quiz(username: str, notebook_id: str, num_questions: int = 10) -> Iterator[str]:
+    """Generate a quiz with answer key, yielding Markdown chunks as they arrive.
+
+    Errors are raised, as in :func:`stream_report`.
+    """
+    # Gather text
+    notebook_text = _notebook_text(username, notebook_id)
+    if not notebook_text.strip():
+        yield "# Quiz\n\nNo sources found to generate quiz."
+        return
+
+    # Summarize if needed
+    if _should_summarize(notebook_text):
+        notebook_text = _summarize_text(notebook_text)
+
+    # Generate quiz via LLM, saving it to artifacts as it streams
+    prompt = f"""Based on the following material, generate a quiz with {num_questions} questions.
 Include a mix of:
 - Multiple choice (MCQ)
 - Short answer
@@ -176,26 +369,21 @@ Format:
 Material:
 {notebook_text}"""
 
-        response = llm_client.complete(
-            prompt=prompt,
-            system_prompt="You are an expert educator. Generate comprehensive quiz questions that test understanding of key concepts. Use Markdown format.",
-            temperature=0.5,
-        )
-        
-        quiz_md = response.text
-        
-        # Save to artifacts
-        artifact_dir = get_artifact_dir(username, notebook_id, "quizzes")
-        artifact_dir.mkdir(parents=True, exist_ok=True)
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        quiz_file = artifact_dir / f"quiz_{timestamp}.md"
-        quiz_file.write_text(quiz_md, encoding="utf-8")
-        
-        logger.info(f"Quiz saved to {quiz_file}")
-        return quiz_md
-        
-    except Exception as e:
+    yield from _stream_artifact(
+        username,
+        notebook_id,
+        "quizzes",
+        "quiz",
+        prompt,
+        "You are an expert educator. Generate comprehensive quiz questions that test understanding of key concepts. Use Markdown format.",
+    )
+
+
+def generate_quiz(username: str, notebook_id: str, num_questions: int = 10) -> str:
+    """Generate a quiz with answer key from all notebook sources."""
+    try:
+        return "".join(stream_quiz(username, notebook_id, num_questions))
+    except Exception as e:  # noqa: BLE001 - returns an error document, never raises
         logger.error(f"Error generating quiz: {e}")
         return f"# Quiz Generation Error\n\n{str(e)}"
 
@@ -210,12 +398,10 @@ def generate_podcast(username: str, notebook_id: str) -> tuple[str, str]:
         (transcript_path, audio_path)
     """
     try:
-        import asyncio
-
         import edge_tts
 
         # Gather text
-        notebook_text = _gather_notebook_text(username, notebook_id)
+        notebook_text = _notebook_text(username, notebook_id)
         if not notebook_text.strip():
             return None, None
 
@@ -254,6 +440,7 @@ Material:
                 "Output ONLY dialogue lines prefixed with [Alex]: or [Sam]:."
             ),
             temperature=0.7,
+            cache=True,
         )
 
         transcript = response.text
@@ -276,8 +463,12 @@ Material:
         audio_file = artifact_dir / f"podcast_{timestamp}.mp3"
 
         async def _synthesize_two_speakers():
-            tmp_paths: list[str] = []
+            # Append each segment's MP3 frames to the output file as soon as
+            # the segment is synthesized (MP3 frames concatenate cleanly), so
+            # at most one segment is held in memory.  File I/O runs on a
+            # worker thread to keep the event loop free.
             char_budget = TTS_MAX_CHARS
+            out = await asyncio.to_thread(open, audio_file, "wb")
             try:
                 for speaker, text in segments:
                     if char_budget <= 0:
@@ -290,31 +481,23 @@ Material:
                     else:
                         voice, rate, pitch = TTS_HOST_A_VOICE, TTS_HOST_A_RATE, TTS_HOST_A_PITCH
 
-                    tmp = tempfile.NamedTemporaryFile(suffix=".mp3", delete=False)
-                    tmp.close()
-                    tmp_paths.append(tmp.name)
-
                     comm = edge_tts.Communicate(
                         text=text, voice=voice, rate=rate, pitch=pitch
                     )
-                    await comm.save(tmp.name)
-
-                # Concatenate all segment MP3s
-                with open(str(audio_file), "wb") as out:
-                    for p in tmp_paths:
-                        out.write(Path(p).read_bytes())
+                    frames = [
+                        chunk["data"] async for chunk in comm.stream()
+                        if chunk["type"] == "audio"
+                    ]
+                    await asyncio.to_thread(out.write, b"".join(frames))
             finally:
-                for p in tmp_paths:
-                    try:
-                        Path(p).unlink(missing_ok=True)
-                    except OSError:
-                        pass
+                await asyncio.to_thread(out.close)
 
         try:
-            asyncio.run(_synthesize_two_speakers())
+            _run_tts(_synthesize_two_speakers())
             logger.info(f"Two-speaker podcast audio saved to {audio_file}")
         except Exception as tts_error:
             logger.warning(f"TTS synthesis failed: {tts_error}. Saving transcript only.")
+            audio_file.unlink(missing_ok=True)      # drop any partial audio
             return str(transcript_file), None
 
         logger.info(f"Podcast created: transcript={transcript_file}, audio={audio_file}")
@@ -12,14 +12,16 @@ Responsibilities:
   - Update notebook metadata (source count, timestamp)
 """
 
+import re
 import shutil
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from pathlib import Path
 from urllib.parse import urlparse
 
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-from storage import vector_store
-from storage.notebook_store import get_notebook_dir, get_raw_dir, get_extracted_dir
+from storage import extract_cache, vector_store
+from storage.notebook_store import get_extracted_dir, get_notebook_dir, get_raw_dir
 from utils import extractors
 from utils.config import (
     ALLOWED_EXTENSIONS,
@@ -29,14 +31,40 @@ from utils.config import (
 )
 from utils.security import sanitize_filename, validate_path
 
+# Any whitespace at all means the recursive splitter has a separator to work
+# with (or something to strip); only text without it takes the fast path.
+_WHITESPACE = re.compile(r"\s")
+
+# Built once and shared; split_text keeps no per-call state, so concurrent
+# ingest workers can use it safely.
+_SPLITTER = RecursiveCharacterTextSplitter(
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+)
+
+# Writes the extracted-text copy while the same text is chunked and embedded
+_io_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="extracted_io")
+
 
 def _chunk_text(text: str) -> list[str]:
     """Split text into overlapping chunks."""
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-    )
-    return splitter.split_text(text)
+    if text and not _WHITESPACE.search(text):
+        # With no separator to split on, the recursive splitter falls back to
+        # per-character splitting and re-merging, which runs at well under
+        # 1 MB/s.  Fixed windows produce exactly the same chunks.
+        step = CHUNK_SIZE - CHUNK_OVERLAP
+        return [
+            text[i:i + CHUNK_SIZE]
+            for i in range(0, max(len(text) - CHUNK_OVERLAP, 1), step)
+        ]
+    return _SPLITTER.split_text(text)
+
+
+def _discard_extracted(saved: Future, extracted_path: str) -> None:
+    """Cancel (or wait out) a background extracted-text write and remove its file."""
+    if not saved.cancel():
+        wait([saved])
+    Path(extracted_path).unlink(missing_ok=True)
 
 
 def ingest_file(username: str, notebook_id: str, file_path: str) -> dict:
@@ -48,7 +76,8 @@ def ingest_file(username: str, notebook_id: str, file_path: str) -> dict:
       2. Validate file size against the 50 MB limit.
       3. Sanitize the filename.
       4. Copy the raw file into files_raw/.
-      5. Extract text with the appropriate extractor.
+      5. Extract text with the appropriate extractor (PDF / PPTX text is
+         reused from the extraction cache when the same bytes were seen before).
       6. Save extracted text to files_extracted/.
       7. Chunk the text.
       8. Upsert chunks + metadata into ChromaDB via vector_store.
@@ -85,32 +114,47 @@ def ingest_file(username: str, notebook_id: str, file_path: str) -> dict:
     raw_path = validate_path(str(raw_dir / safe_name), str(nb_dir))
     shutil.copy2(src, raw_path)
 
-    # 5. Extract text with the appropriate extractor
-    if ext == ".pdf":
-        text = extractors.extract_pdf(str(raw_path))
-    elif ext == ".pptx":
-        text = extractors.extract_pptx(str(raw_path))
-    else:  # .txt
+    # 5. Extract text with the appropriate extractor.  Parsing a PDF / PPTX
+    #    costs far more than hashing it, so their text is cached by content.
+    if ext == ".txt":
         text = extractors.extract_txt(str(raw_path))
-
-    if not text.strip():
+    else:
+        key = extract_cache.make_key(raw_path, ext)
+        text = extract_cache.get(username, notebook_id, key)
+        if text is None:
+            if ext == ".pdf":
+                text = extractors.extract_pdf(str(raw_path))
+            else:  # .pptx
+                text = extractors.extract_pptx(str(raw_path))
+            if text and not text.isspace():
+                extract_cache.put(username, notebook_id, key, safe_name, text)
+
+    # isspace() stops at the first visible character; strip() would copy
+    # the whole text just to test it
+    if not text or text.isspace():
         raise ValueError("No text could be extracted from the file.")
 
-    # 6. Save extracted text
+    # 6. Save extracted text (in the background; joined before returning)
     extracted_path = validate_path(
         str(extracted_dir / (src.stem + ".txt")), str(nb_dir)
     )
-    Path(extracted_path).write_text(text, encoding="utf-8")
-
-    # 7. Chunk text
-    chunks = _chunk_text(text)
-
-    # 8. Build per-chunk metadata and upsert into ChromaDB
-    metadatas = [
-        {"source": safe_name, "chunk_index": i, "source_type": "file"}
-        for i in range(len(chunks))
-    ]
-    vector_store.add_documents(username, notebook_id, chunks, metadatas)
+    saved = _io_pool.submit(Path(extracted_path).write_text, text, encoding="utf-8")
+
+    try:
+        # 7. Chunk text
+        chunks = _chunk_text(text)
+
+        # 8. Build per-chunk metadata and upsert into ChromaDB
+        metadatas = [
+            {"source": safe_name, "chunk_index": i, "source_type": "file"}
+            for i in range(len(chunks))
+        ]
+        vector_store.add_documents(username, notebook_id, chunks, metadatas)
+    except BaseException:
+        # Don't leave extracted text behind for a source that wasn't stored
+        _discard_extracted(saved, extracted_path)
+        raise
+    saved.result()
 
     return {
         "status": "ok",
@@ -137,7 +181,7 @@ def ingest_url(username: str, notebook_id: str, url: str) -> dict:
     # 1. Extract text
     text = extractors.extract_url(url)
 
-    if not text.strip():
+    if not text or text.isspace():
         raise ValueError("No text could be extracted from the URL.")
 
     # 2. Derive a safe filename stem from the URL
@@ -145,7 +189,8 @@ def ingest_url(username: str, notebook_id: str, url: str) -> dict:
     raw_stem = parsed.path.rstrip("/").split("/")[-1] or parsed.netloc.replace(".", "_")
     safe_stem = sanitize_filename(raw_stem)[:80] or "webpage"
 
-    # 3. Set up directory and save extracted text
+    # 3. Set up directory and save extracted text (in the background;
+    #    joined before returning)
     nb_dir = get_notebook_dir(username, notebook_id)
     extracted_dir = get_extracted_dir(username, notebook_id)
     extracted_dir.mkdir(parents=True, exist_ok=True)
@@ -153,17 +198,23 @@ def ingest_url(username: str, notebook_id: str, url: str) -> dict:
     extracted_path = validate_path(
         str(extracted_dir / (safe_stem + "_url.txt")), str(nb_dir)
     )
-    Path(extracted_path).write_text(text, encoding="utf-8")
-
-    # 4. Chunk text
-    chunks = _chunk_text(text)
-
-    # 5. Build per-chunk metadata and upsert into ChromaDB
-    metadatas = [
-        {"source": url, "chunk_index": i, "source_type": "url"}
-        for i in range(len(chunks))
-    ]
-    vector_store.add_documents(username, notebook_id, chunks, metadatas)
+    saved = _io_pool.submit(Path(extracted_path).write_text, text, encoding="utf-8")
+
+    try:
+        # 4. Chunk text
+        chunks = _chunk_text(text)
+
+        # 5. Build per-chunk metadata and upsert into ChromaDB
+        metadatas = [
+            {"source": url, "chunk_index": i, "source_type": "url"}
+            for i in range(len(chunks))
+        ]
+        vector_store.add_documents(username, notebook_id, chunks, metadatas)
+    except BaseException:
+        # Don't leave extracted text behind for a source that wasn't stored
+        _discard_extracted(saved, extracted_path)
+        raise
+    saved.result()
 
     return {
         "status": "ok",
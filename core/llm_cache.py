@@ -0,0 +1,93 @@
+"""
+LLM Response Cache.
+
+Responsibilities:
+  - Key completions by a hash of (model, system prompt, prompt, temperature, max_tokens)
+  - Persist responses in a small SQLite database under <DATA_ROOT>/cache/
+  - Expire entries after LLM_CACHE_TTL_S
+  - Never fail a generation: cache errors are logged and treated as a miss
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+import orjson
+
+from core.models import LLMResponse
+from utils.config import DATA_ROOT, LLM_CACHE_TTL_S
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_conn: sqlite3.Connection | None = None
+_conn_path: Path | None = None
+
+
+def _connect() -> sqlite3.Connection:
+    """Open (or reuse) the cache database.  Call with _lock held."""
+    global _conn, _conn_path
+    path = DATA_ROOT / "cache" / "llm_cache.sqlite3"
+    if _conn is None or _conn_path != path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _conn = sqlite3.connect(str(path), check_same_thread=False)
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        _conn_path = path
+    return _conn
+
+
+def make_key(
+    system_prompt: str,
+    prompt: str,
+    model: str,
+    temperature: float,
+    max_tokens: int,
+) -> str:
+    """Stable cache key for one completion request."""
+    fields = [model, system_prompt, prompt, round(temperature, 2), max_tokens]
+    # Stays on the json module: its exact output is hashed, so changing the
+    # serializer would orphan every cached entry
+    raw = json.dumps(fields, ensure_ascii=False)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=32).hexdigest()
+
+
+def get(key: str) -> LLMResponse | None:
+    """Return the cached response for *key*, or None if absent or expired."""
+    try:
+        with _lock:
+            row = _connect().execute(
+                "SELECT response, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+    except sqlite3.Error as e:
+        logger.warning("LLM cache read failed: %s", e)
+        return None
+
+    if row is None or row[1] < time.time():
+        return None
+    return LLMResponse(**orjson.loads(row[0]))
+
+
+def put(key: str, response: LLMResponse, ttl_s: float = LLM_CACHE_TTL_S) -> None:
+    """Store *response* under *key* for *ttl_s* seconds, pruning expired entries."""
+    now = time.time()
+    try:
+        with _lock:
+            conn = _connect()
+            with conn:
+                conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, expires_at) VALUES (?, ?, ?)",
+                    (key, orjson.dumps(asdict(response)).decode(), now + ttl_s),
+                )
+    except sqlite3.Error as e:
+        logger.warning("LLM cache write failed: %s", e)
@@ -4,24 +4,33 @@ LLM Client — Groq API wrapper.
 Responsibilities:
   - Initialize the Groq client (OpenAI-compatible SDK)
   - Send chat completion requests to Llama 3.1 70B
-  - Retry with exponential backoff on rate-limit errors
+  - Retry with jittered exponential backoff on rate-limit errors
   - Fall back to Llama 3.1 8B if 70B is unavailable
   - Stream responses for real-time chat
+  - Optionally serve repeated requests from core/llm_cache.py
 """
 
 import logging
+import random
+import threading
 import time
 from typing import Generator
 
-from groq import Groq, RateLimitError, APIStatusError
+import httpx
+from groq import DefaultHttpxClient, Groq, RateLimitError, APIStatusError
 
+from core import llm_cache
 from core.models import LLMResponse, LLMUnavailableError
 from utils.config import (
     GROQ_API_KEY,
     LLM_MODEL,
     LLM_FALLBACK_MODEL,
+    LLM_HTTP_KEEPALIVE_CONNECTIONS,
+    LLM_HTTP_KEEPALIVE_EXPIRY_S,
+    LLM_HTTP_MAX_CONNECTIONS,
     LLM_MAX_RETRIES,
     LLM_RETRY_BASE_DELAY,
+    LLM_RETRY_MAX_DELAY,
     LLM_TEMPERATURE,
     LLM_MAX_TOKENS,
 )
@@ -29,16 +38,51 @@ from utils.config import (
 logger = logging.getLogger(__name__)
 
 _client = None
+_client_lock = threading.Lock()
 
 
 def _get_client() -> Groq:
-    """Get or create the Groq client singleton."""
+    """Get or create the Groq client singleton.
+
+    The client shares one keep-alive connection pool across all threads.
+    Idle connections are kept for LLM_HTTP_KEEPALIVE_EXPIRY_S (the SDK
+    default is 5 s), so chat turns and retries a few seconds apart reuse a
+    warm TLS connection.
+    """
     global _client
     if _client is None:
-        _client = Groq(api_key=GROQ_API_KEY)
+        with _client_lock:
+            if _client is None:
+                _client = Groq(
+                    api_key=GROQ_API_KEY,
+                    http_client=DefaultHttpxClient(
+                        limits=httpx.Limits(
+                            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=LLM_HTTP_KEEPALIVE_CONNECTIONS,
+                            keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY_S,
+                        ),
+                    ),
+                )
     return _client
 
 
+def _retry_delay(attempt: int, error: Exception) -> float:
+    """Seconds to wait before retry *attempt* + 1.
+
+    Honours a ``Retry-After`` header when the server sends one; otherwise
+    uses "full jitter" — a uniform draw from [0, base * 2**attempt] — so
+    workers rate-limited together don't all retry in lockstep.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    retry_after = headers.get("retry-after") or headers.get("Retry-After")
+    if retry_after is not None:
+        try:
+            return min(max(float(retry_after), 0.0), LLM_RETRY_MAX_DELAY)
+        except ValueError:
+            pass  # HTTP-date form — fall back to jitter
+    return random.uniform(0, min(LLM_RETRY_BASE_DELAY * (2 ** attempt), LLM_RETRY_MAX_DELAY))
+
+
 def _call_with_retry(
     messages: list[dict],
     model: str,
@@ -46,7 +90,7 @@ def _call_with_retry(
     temperature: float,
     max_tokens: int,
 ):
-    """Attempt an API call with exponential backoff on transient errors."""
+    """Attempt an API call with jittered exponential backoff on transient errors."""
     client = _get_client()
     last_error = None
 
@@ -62,7 +106,7 @@ def _call_with_retry(
         except RateLimitError as e:
             last_error = e
             if attempt < LLM_MAX_RETRIES:
-                delay = LLM_RETRY_BASE_DELAY * (2 ** attempt)
+                delay = _retry_delay(attempt, e)
                 logger.warning(
                     "Rate limited (attempt %d/%d, model=%s): %s. Retrying in %.1fs",
                     attempt + 1, LLM_MAX_RETRIES + 1, model, e, delay,
@@ -73,7 +117,7 @@ def _call_with_retry(
             if e.status_code >= 500:
                 last_error = e
                 if attempt < LLM_MAX_RETRIES:
-                    delay = LLM_RETRY_BASE_DELAY * (2 ** attempt)
+                    delay = _retry_delay(attempt, e)
                     logger.warning(
                         "Server error %d (attempt %d/%d, model=%s): %s. Retrying in %.1fs",
                         e.status_code, attempt + 1, LLM_MAX_RETRIES + 1, model, e, delay,
@@ -91,6 +135,7 @@ def complete(
     stream: bool = False,
     temperature: float = LLM_TEMPERATURE,
     max_tokens: int = LLM_MAX_TOKENS,
+    cache: bool = False,
 ) -> LLMResponse | Generator[str, None, None]:
     """Send a chat completion request to the LLM.
 
@@ -100,6 +145,11 @@ def complete(
         stream: If True, returns a generator yielding text chunks.
         temperature: Sampling temperature (0.0-1.0).
         max_tokens: Maximum tokens in response.
+        cache: If True, return a cached response for an identical earlier
+            request and cache this one on success.  A streamed response is
+            cached once the stream has been read to the end; a cache hit on
+            a streaming request yields the whole text as a single chunk.
+            Responses from the fallback model are not cached.
 
     Returns:
         LLMResponse if stream=False, or a generator of str chunks if stream=True.
@@ -112,6 +162,14 @@ def complete(
         messages.append({"role": "system", "content": system_prompt})
     messages.append({"role": "user", "content": prompt})
 
+    cache_key = None
+    if cache:
+        cache_key = llm_cache.make_key(system_prompt, prompt, LLM_MODEL, temperature, max_tokens)
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            logger.debug("LLM cache hit for %s", cache_key[:12])
+            return iter([cached.text]) if stream else cached
+
     models = [
         (LLM_MODEL, False),
         (LLM_FALLBACK_MODEL, True),
@@ -122,6 +180,8 @@ def complete(
             response = _call_with_retry(messages, model, stream, temperature, max_tokens)
 
             if stream:
+                if cache_key is not None and not is_fallback:
+                    return _stream_and_cache(response, cache_key, model)
                 return _stream_response(response)
 
             text = response.choices[0].message.content or ""
@@ -132,7 +192,7 @@ def complete(
                 response = _call_with_retry(messages, model, False, temperature, max_tokens)
                 text = response.choices[0].message.content or ""
 
-            return LLMResponse(
+            result = LLMResponse(
                 text=text,
                 model=response.model,
                 usage={
@@ -142,6 +202,9 @@ def complete(
                 },
                 fallback_used=is_fallback,
             )
+            if cache_key is not None and not is_fallback and text.strip():
+                llm_cache.put(cache_key, result)
+            return result
         except (RateLimitError, APIStatusError) as e:
             logger.warning("Model %s exhausted: %s", model, e)
             if is_fallback:
@@ -158,3 +221,14 @@ def _stream_response(response) -> Generator[str, None, None]:
     for chunk in response:
         if chunk.choices and chunk.choices[0].delta.content:
             yield chunk.choices[0].delta.content
+
+
+def _stream_and_cache(response, cache_key: str, model: str) -> Generator[str, None, None]:
+    """Like _stream_response, caching the full text if the stream completes."""
+    parts: list[str] = []
+    for text in _stream_response(response):
+        parts.append(text)
+        yield text
+    text = "".join(parts)
+    if text.strip():
+        llm_cache.put(cache_key, LLMResponse(text=text, model=model))
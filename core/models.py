@@ -18,7 +18,7 @@ class LLMResponse:
     fallback_used: bool = False
 
 
-@dataclass
+@dataclass(slots=True)
 class Citation:
     """A reference to a source passage used in a RAG response."""
     source_name: str
@@ -8,13 +8,31 @@ Responsibilities:
   - Support multiple retrieval techniques (naive, HyDE, reranking, multi-query)
 """
 
-import json
+import hashlib
+import heapq
 import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import orjson
 
 from core import llm_client
-from core.models import Citation, RAGResponse
+from core.models import Citation, LLMUnavailableError, RAGResponse
 from storage import vector_store
-from utils.config import TOP_K, RERANK_CANDIDATES, MULTI_QUERY_VARIANTS
+from utils.config import (
+    HYDE_HYPOTHESES,
+    MULTI_QUERY_VARIANTS,
+    RAG_POOL_WORKERS,
+    RERANK_CANDIDATES,
+    RETRIEVAL_CACHE_SIZE,
+    RETRIEVAL_CACHE_TTL_S,
+    TOP_K,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +47,55 @@ Rules:
 Source documents:
 {sources}"""
 
+# Split once so each prompt is two concatenations rather than a .format() parse
+_RAG_PROMPT_PREFIX, _RAG_PROMPT_SUFFIX = RAG_SYSTEM_PROMPT.split("{sources}")
+
+NO_DOCUMENTS_ANSWER = "No documents have been added to this notebook yet."
+
+# Shared by all retrievals for vector searches that can run while an LLM
+# call is outstanding
+_rag_pool = ThreadPoolExecutor(RAG_POOL_WORKERS, thread_name_prefix="rag")
+
+# Retrieval results for repeated questions, LRU-bounded and expiring after
+# RETRIEVAL_CACHE_TTL_S.  Each entry is stamped with the collection's write
+# version, so ingesting or deleting sources invalidates it.  Cached result
+# dicts are shared between callers and must not be mutated; each carries its
+# assembled system prompt under _PROMPT_KEY so a repeat question skips that too.
+_retrieval_cache: OrderedDict[tuple, tuple[int, float, dict]] = OrderedDict()
+_retrieval_cache_lock = threading.Lock()
+_PROMPT_KEY = "_system_prompt"
+
+_SCORE_DIGIT = re.compile(r"[1-5]")
+
+
+def _retrieval_key(username: str, notebook_id: str, technique: str, question: str) -> tuple:
+    digest = hashlib.blake2b(" ".join(question.split()).encode("utf-8"), digest_size=16).digest()
+    return (username, notebook_id, technique, digest)
+
+
+def _cache_get(key: tuple, version: int) -> dict | None:
+    with _retrieval_cache_lock:
+        hit = _retrieval_cache.get(key)
+        if hit is None:
+            return None
+        if hit[0] != version or time.monotonic() - hit[1] >= RETRIEVAL_CACHE_TTL_S:
+            del _retrieval_cache[key]
+            return None
+        _retrieval_cache.move_to_end(key)
+        return hit[2]
+
+
+def _cache_put(key: tuple, version: int, results: dict) -> None:
+    # Still private to this caller, so the prompt can be attached in place
+    docs, metas, _ = _unpack(results)
+    if docs:
+        results[_PROMPT_KEY] = _system_prompt(docs, metas)
+    with _retrieval_cache_lock:
+        _retrieval_cache[key] = (version, time.monotonic(), results)
+        _retrieval_cache.move_to_end(key)
+        while len(_retrieval_cache) > RETRIEVAL_CACHE_SIZE:
+            _retrieval_cache.popitem(last=False)
+
 
 def _build_sources_text(docs: list[str], metas: list[dict]) -> str:
     """Format retrieved chunks as numbered sources for the prompt."""
@@ -39,18 +106,21 @@ def _build_sources_text(docs: list[str], metas: list[dict]) -> str:
     return "\n\n".join(parts)
 
 
+def _system_prompt(docs: list[str], metas: list[dict]) -> str:
+    return _RAG_PROMPT_PREFIX + _build_sources_text(docs, metas) + _RAG_PROMPT_SUFFIX
+
+
 def _build_citations(docs: list[str], metas: list[dict], distances: list[float]) -> list[Citation]:
     """Convert retrieval results to Citation dataclasses."""
-    citations = []
-    for doc, meta, dist in zip(docs, metas, distances):
-        relevance = max(0.0, 1.0 - dist) if dist is not None else 0.0
-        citations.append(Citation(
+    return [
+        Citation(
             source_name=meta.get("source_name", "unknown"),
             chunk_text=doc,
             chunk_index=meta.get("chunk_index", 0),
-            relevance_score=round(relevance, 4),
-        ))
-    return citations
+            relevance_score=round(max(0.0, 1.0 - dist), 4) if dist is not None else 0.0,
+        )
+        for doc, meta, dist in zip(docs, metas, distances)
+    ]
 
 
 def _naive_retrieve(username: str, notebook_id: str, question: str, top_k: int = TOP_K) -> dict:
@@ -59,22 +129,48 @@ def _naive_retrieve(username: str, notebook_id: str, question: str, top_k: int =
 
 
 def _hyde_retrieve(username: str, notebook_id: str, question: str, top_k: int = TOP_K) -> dict:
-    """HyDE: generate hypothetical answer, embed it, use as query vector."""
+    """HyDE: generate hypothetical answers, average their embeddings, use as query vector."""
     hyde_prompt = (
-        "Write a short paragraph that would be an ideal answer to this question. "
-        "Do not say 'I don't know'. Just write a plausible, detailed answer.\n\n"
+        f"Write {HYDE_HYPOTHESES} different short paragraphs, each of which would be an "
+        "ideal answer to this question. Do not say 'I don't know'. Just write plausible, "
+        "detailed answers. Return ONLY a JSON array of strings.\n\n"
         f"Question: {question}"
     )
-    hypothetical = llm_client.complete(
+    response = llm_client.complete(
         prompt=hyde_prompt,
-        system_prompt="You are a knowledgeable assistant.",
+        system_prompt="You are a knowledgeable assistant. Return only a JSON array of strings.",
         temperature=0.7,
     )
-    return vector_store.query_collection(
-        username, notebook_id, hypothetical.text, n_results=top_k
+
+    try:
+        hypotheticals = orjson.loads(response.text.strip())
+        if not isinstance(hypotheticals, list):
+            hypotheticals = []
+    except orjson.JSONDecodeError:
+        hypotheticals = []
+    hypotheticals = [h for h in hypotheticals if isinstance(h, str) and h.strip()]
+    if not hypotheticals:
+        # Model ignored the format; use its whole reply as one hypothesis
+        hypotheticals = [response.text] if response.text.strip() else [question]
+
+    # One embedding pass for all hypotheses, one search with their mean
+    embeddings = vector_store.embed(hypotheticals[:HYDE_HYPOTHESES])
+    query_vec = np.mean(np.asarray(embeddings, dtype=np.float32), axis=0)
+    return vector_store.query_collection_by_vector(
+        username, notebook_id, query_vec, n_results=top_k
     )
 
 
+def _parse_scores(text: str, n: int) -> list[int]:
+    """Read *n* relevance scores, one digit 1-5 per chunk, e.g. ``"43215"``.
+
+    Separators the model adds anyway are ignored; missing scores default to
+    3 (neutral).
+    """
+    scores = [int(d) for d in _SCORE_DIGIT.findall(text)[:n]]
+    return scores + [3] * (n - len(scores))
+
+
 def _reranking_retrieve(username: str, notebook_id: str, question: str, top_k: int = TOP_K) -> dict:
     """Reranking: retrieve top-N candidates, LLM scores relevance, return top-k."""
     initial = vector_store.query_collection(
@@ -92,28 +188,26 @@ def _reranking_retrieve(username: str, notebook_id: str, question: str, top_k: i
     )
     rerank_prompt = (
         f"Rate each chunk's relevance to the question on a scale of 1-5 "
-        f"(5=highly relevant). Return ONLY a JSON array of integers.\n\n"
+        f"(5=highly relevant). Return exactly {len(docs)} characters, one digit "
+        f"1-5 per chunk in order, no separators.\n\n"
         f"Question: {question}\n\n{chunks_text}"
     )
 
-    response = llm_client.complete(
-        prompt=rerank_prompt,
-        system_prompt="You are a relevance scorer. Return only a JSON array of integers.",
-        temperature=0.0,
-    )
-
+    # A bare digit string is a fraction of the tokens of a JSON array; the
+    # cap leaves room for stray separators but not for an explanation
     try:
-        scores = json.loads(response.text.strip())
-        if not isinstance(scores, list):
-            scores = [3] * len(docs)
-    except (json.JSONDecodeError, ValueError):
+        response = llm_client.complete(
+            prompt=rerank_prompt,
+            system_prompt="You are a relevance scorer. Reply only with the digits.",
+            temperature=0.0,
+            max_tokens=len(docs) + 8,
+        )
+        scores = _parse_scores(response.text, len(docs))
+    except LLMUnavailableError as e:
+        logger.warning("Reranking failed, keeping vector order: %s", e)
         scores = [3] * len(docs)
 
-    scores = scores[:len(docs)]
-    while len(scores) < len(docs):
-        scores.append(3)
-
-    ranked = sorted(range(len(docs)), key=lambda i: scores[i], reverse=True)[:top_k]
+    ranked = heapq.nlargest(top_k, range(len(docs)), key=scores.__getitem__)
 
     return {
         "documents": [[docs[i] for i in ranked]],
@@ -124,6 +218,11 @@ def _reranking_retrieve(username: str, notebook_id: str, question: str, top_k: i
 
 def _multi_query_retrieve(username: str, notebook_id: str, question: str, top_k: int = TOP_K) -> dict:
     """Multi-query: generate question variants, retrieve for each, merge via RRF."""
+    # The original question's search needs no variants; run it meanwhile
+    original = _rag_pool.submit(
+        vector_store.query_collection, username, notebook_id, question, n_results=top_k
+    )
+
     variant_prompt = (
         f"Generate {MULTI_QUERY_VARIANTS} alternative phrasings of this question. "
         f"Return ONLY a JSON array of strings.\n\nQuestion: {question}"
@@ -135,28 +234,39 @@ def _multi_query_retrieve(username: str, notebook_id: str, question: str, top_k:
     )
 
     try:
-        variants = json.loads(response.text.strip())
+        variants = orjson.loads(response.text.strip())
         if not isinstance(variants, list):
             variants = []
-    except (json.JSONDecodeError, ValueError):
+    except orjson.JSONDecodeError:
         variants = []
 
-    all_queries = [question] + variants[:MULTI_QUERY_VARIANTS]
+    # Drop non-string or blank variants rather than failing the whole search
+    variants = [v for v in variants if isinstance(v, str) and v.strip()][:MULTI_QUERY_VARIANTS]
 
     doc_scores: dict[str, float] = {}
     doc_data: dict[str, tuple[str, dict]] = {}
 
-    for q in all_queries:
-        results = vector_store.query_collection(username, notebook_id, q, n_results=top_k)
+    # One embedding pass and one vector search for all variants
+    batch = [original.result()]
+    if variants:
+        batch += vector_store.query_collection_batch(
+            username, notebook_id, variants, n_results=top_k
+        )
+    for results in batch:
         docs = results.get("documents", [[]])[0]
         metas = results.get("metadatas", [[]])[0]
-        for rank, (doc, meta) in enumerate(zip(docs, metas)):
-            chunk_id = f"{meta.get('source_name', '')}_{meta.get('chunk_index', 0)}"
+        # Fuse on ChromaDB's chunk ids; results without ids fall back to a
+        # key built from the metadata
+        ids = results.get("ids", [[]])[0] or [
+            f"{meta.get('source', meta.get('source_name', ''))}_{meta.get('chunk_index', 0)}"
+            for meta in metas
+        ]
+        for rank, (chunk_id, doc, meta) in enumerate(zip(ids, docs, metas)):
             doc_scores[chunk_id] = doc_scores.get(chunk_id, 0) + 1.0 / (rank + 60)
             if chunk_id not in doc_data:
                 doc_data[chunk_id] = (doc, meta)
 
-    sorted_ids = sorted(doc_scores, key=lambda x: doc_scores[x], reverse=True)[:top_k]
+    sorted_ids = heapq.nlargest(top_k, doc_scores, key=doc_scores.__getitem__)
 
     return {
         "documents": [[doc_data[cid][0] for cid in sorted_ids]],
@@ -173,30 +283,50 @@ _TECHNIQUE_MAP = {
 }
 
 
-def query(username: str, notebook_id: str, question: str, technique: str = "naive") -> RAGResponse:
-    """Run a RAG query and return the answer with citations."""
+def retrieve(username: str, notebook_id: str, question: str, technique: str) -> tuple[str, dict]:
+    """Normalize *technique* and run the matching retrieval function.
+
+    Returns ``(technique, results)``, with an unknown technique replaced by
+    ``"naive"``.  A repeated question against an unchanged collection is
+    answered from the retrieval cache.
+    """
     if technique not in _TECHNIQUE_MAP:
         logger.warning("Unknown technique '%s', falling back to naive", technique)
         technique = "naive"
 
-    retrieve_fn = _TECHNIQUE_MAP[technique]
-    results = retrieve_fn(username, notebook_id, question)
+    # Read the version first: a write during retrieval leaves this entry stale
+    version = vector_store.collection_version(username, notebook_id)
+    key = _retrieval_key(username, notebook_id, technique, question)
+    results = _cache_get(key, version)
+    if results is None:
+        results = _TECHNIQUE_MAP[technique](username, notebook_id, question)
+        _cache_put(key, version, results)
+    return technique, results
+
+
+def _unpack(results: dict) -> tuple[list[str], list[dict], list[float]]:
+    """Pull the first query's docs / metadatas / distances out of a result dict."""
+    return (
+        results.get("documents", [[]])[0],
+        results.get("metadatas", [[]])[0],
+        results.get("distances", [[]])[0],
+    )
+
 
-    docs = results.get("documents", [[]])[0]
-    metas = results.get("metadatas", [[]])[0]
-    distances = results.get("distances", [[]])[0]
+def _answer(question: str, technique: str, results: dict) -> RAGResponse:
+    """Generate the final answer for *question* from retrieval *results*."""
+    docs, metas, distances = _unpack(results)
 
     if not docs:
         return RAGResponse(
-            answer="No documents have been added to this notebook yet.",
+            answer=NO_DOCUMENTS_ANSWER,
             citations=[],
             technique=technique,
             chunks_considered=0,
         )
 
     citations = _build_citations(docs, metas, distances)
-    sources_text = _build_sources_text(docs, metas)
-    system_prompt = RAG_SYSTEM_PROMPT.format(sources=sources_text)
+    system_prompt = results.get(_PROMPT_KEY) or _system_prompt(docs, metas)
 
     response = llm_client.complete(
         prompt=question,
@@ -209,3 +339,92 @@ def query(username: str, notebook_id: str, question: str, technique: str = "naiv
         technique=technique,
         chunks_considered=len(docs),
     )
+
+
+def stream_answer(question: str, technique: str, results: dict) -> tuple[RAGResponse, Iterator[str]]:
+    """Like :func:`_answer`, but stream the answer text instead of waiting for it.
+
+    The LLM request is sent before returning, so ``LLMUnavailableError`` is
+    raised here rather than mid-iteration.
+
+    Returns:
+        ``(response, tokens)`` — *response* carries the citations, technique
+        and chunk count with an empty ``answer``; *tokens* yields the answer
+        text chunk by chunk.
+    """
+    docs, metas, distances = _unpack(results)
+
+    if not docs:
+        response = RAGResponse(answer="", citations=[], technique=technique, chunks_considered=0)
+        return response, iter([NO_DOCUMENTS_ANSWER])
+
+    citations = _build_citations(docs, metas, distances)
+    system_prompt = results.get(_PROMPT_KEY) or _system_prompt(docs, metas)
+
+    tokens = llm_client.complete(
+        prompt=question,
+        system_prompt=system_prompt,
+        stream=True,
+    )
+
+    response = RAGResponse(
+        answer="",
+        citations=citations,
+        technique=technique,
+        chunks_considered=len(docs),
+    )
+    return response, tokens
+
+
+def query(username: str, notebook_id: str, question: str, technique: str = "naive") -> RAGResponse:
+    """Run a RAG query and return the answer with citations."""
+    technique, results = retrieve(username, notebook_id, question, technique)
+    return _answer(question, technique, results)
+
+
+def retrieve_batch(requests: list[tuple[str, str, str]]) -> list[tuple[str, dict] | Exception]:
+    """Run naive retrieval for several RAG queries together.
+
+    Each request is a ``(username, notebook_id, question)`` tuple.  Queries
+    that target the same notebook share one embedding pass via
+    :func:`vector_store.query_collection_batch`.  The LLM-backed techniques
+    are not batched; use :func:`retrieve` for them.
+
+    Returns one item per request, in order: the ``(technique, results)`` pair
+    :func:`retrieve` would give, or the exception raised while searching that
+    request's notebook so one failure does not sink the whole batch.
+    """
+    retrieved: list[tuple[str, dict] | Exception] = [None] * len(requests)
+
+    # Group queries per notebook so each group is one vector search
+    groups: dict[tuple[str, str], list[int]] = {}
+    for i, (username, notebook_id, _) in enumerate(requests):
+        groups.setdefault((username, notebook_id), []).append(i)
+
+    for (username, notebook_id), idxs in groups.items():
+        # Serve repeated questions from the cache; search only the rest
+        version = vector_store.collection_version(username, notebook_id)
+        keys = {i: _retrieval_key(username, notebook_id, "naive", requests[i][2]) for i in idxs}
+        misses = []
+        for i in idxs:
+            results = _cache_get(keys[i], version)
+            if results is None:
+                misses.append(i)
+            else:
+                retrieved[i] = ("naive", results)
+        if not misses:
+            continue
+
+        try:
+            batch = vector_store.query_collection_batch(
+                username, notebook_id, [requests[i][2] for i in misses], n_results=TOP_K
+            )
+        except (OSError, ValueError, RuntimeError) as e:
+            for i in misses:
+                retrieved[i] = e
+            continue
+        for i, results in zip(misses, batch):
+            _cache_put(keys[i], version, results)
+            retrieved[i] = ("naive", results)
+
+    return retrieved
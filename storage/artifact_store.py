@@ -10,10 +10,12 @@ Responsibilities:
       artifacts/podcasts/*.md + *.mp3
 """
 
+import os
 from datetime import datetime, timezone
 from pathlib import Path
 
 from storage.notebook_store import get_artifact_dir, touch_notebook
+from utils.config import ARTIFACT_PREVIEW_MAX_BYTES
 from utils.security import safe_path
 
 # ---------------------------------------------------------------------------
@@ -156,21 +158,25 @@ def list_artifacts(
             directory = get_artifact_dir(username, notebook_id, atype)
         except ValueError:
             continue
-        if not directory.exists():
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except FileNotFoundError:
             continue
 
         allowed = _ALLOWED_EXT[atype]
-        for file_path in sorted(directory.iterdir()):
-            if not file_path.is_file():
+        for entry in entries:
+            # DirEntry answers is_file() from the directory read itself
+            if not entry.is_file():
                 continue
-            if file_path.suffix.lower() not in allowed:
+            if os.path.splitext(entry.name)[1].lower() not in allowed:
                 continue  # skip .DS_Store and other stray files
 
-            stat = file_path.stat()
+            stat = entry.stat()
             results.append({
                 "type":       atype,
-                "filename":   file_path.name,
-                "path":       str(file_path),
+                "filename":   entry.name,
+                "path":       entry.path,
                 "size":       stat.st_size,
                 "created_at": datetime.fromtimestamp(
                     stat.st_ctime, tz=timezone.utc
@@ -185,15 +191,14 @@ def get_artifact(
     notebook_id: str,
     artifact_type: str,
     filename: str,
-) -> str:
+) -> "str | bytes":
     """
-    Read and return an artifact's content as a string.
+    Read and return an artifact's content.
 
-    For ``.md`` files the UTF-8 text is returned directly.
-    For ``.mp3`` files the bytes are decoded as latin-1 (a lossless
-    round-trip for arbitrary binary data) so the return type is always
-    ``str``.  Use :func:`get_artifact_bytes` when you need real ``bytes``
-    (e.g. for Gradio's ``gr.Audio`` component).
+    For ``.md`` files the UTF-8 text is returned as a ``str``.
+    For ``.mp3`` files the raw ``bytes`` are returned as-is.  To play
+    audio, prefer :func:`get_artifact_path` so Gradio's ``gr.Audio`` can
+    serve the file without loading it.
 
     Args:
         username      – HuggingFace username
@@ -202,31 +207,49 @@ def get_artifact(
         filename      – bare filename, e.g. ``"report_1.md"``
 
     Returns:
-        File contents as a ``str``.
+        File contents: ``str`` for markdown, ``bytes`` for audio.
 
     Raises:
         FileNotFoundError – artifact does not exist on disk
         ValueError        – invalid *artifact_type* or extension
     """
+    file_path = get_artifact_path(username, notebook_id, artifact_type, filename)
+    if file_path.suffix.lower() == ".mp3":
+        return file_path.read_bytes()
+    return file_path.read_text(encoding="utf-8")
+
+
+# ---------------------------------------------------------------------------
+# Extra helpers used by core/artifacts.py and the Gradio UI
+# ---------------------------------------------------------------------------
+
+def get_artifact_path(
+    username: str,
+    notebook_id: str,
+    artifact_type: str,
+    filename: str,
+) -> Path:
+    """
+    Return the validated on-disk path of an existing artifact without reading it.
+
+    Preferred for podcast audio: Gradio's ``gr.Audio`` serves a path straight
+    from disk, so the MP3 never has to be loaded into memory.
+
+    Raises:
+        FileNotFoundError – artifact does not exist
+        ValueError        – invalid *artifact_type* or extension
+    """
     _validate_type(artifact_type)
     filename = _validate_filename(artifact_type, filename)
     file_path = _resolve(artifact_type, username, notebook_id, filename)
 
-    if not file_path.exists():
+    if not file_path.is_file():
         raise FileNotFoundError(
             f"Artifact not found: {artifact_type}/{filename} "
             f"(notebook={notebook_id}, user={username})"
         )
+    return file_path
 
-    if file_path.suffix.lower() == ".mp3":
-        return file_path.read_bytes().decode("latin-1")
-
-    return file_path.read_text(encoding="utf-8")
-
-
-# ---------------------------------------------------------------------------
-# Extra helpers used by core/artifacts.py and the Gradio UI
-# ---------------------------------------------------------------------------
 
 def get_artifact_bytes(
     username: str,
@@ -237,15 +260,52 @@ def get_artifact_bytes(
     """
     Return an artifact's raw bytes.
 
-    Preferred over :func:`get_artifact` when streaming binary content such
-    as podcast audio to Gradio's ``gr.Audio`` component.
+    Only for callers that need an owned buffer; to play podcast audio pass
+    :func:`get_artifact_path` to ``gr.Audio`` instead.
 
     Raises:
         FileNotFoundError – artifact does not exist
         ValueError        – invalid *artifact_type* or extension
     """
+    return get_artifact_path(username, notebook_id, artifact_type, filename).read_bytes()
+
+
+def read_preview(path: "str | Path", max_bytes: int = ARTIFACT_PREVIEW_MAX_BYTES) -> str:
+    """
+    Return at most *max_bytes* of a UTF-8 text file for display.
+
+    Only the head of the file is read, so previewing a long transcript does
+    not load the whole document.  A multi-byte character split by the cut is
+    dropped, and a note is appended when the text was truncated.
+    """
+    with open(path, "rb") as fh:
+        data = fh.read(max_bytes + 1)
+    if len(data) <= max_bytes:
+        return data.decode("utf-8", errors="replace")
+    text = data[:max_bytes].decode("utf-8", errors="ignore")
+    return text + "\n\n*…preview truncated*"
+
+
+def get_artifact_preview(
+    username: str,
+    notebook_id: str,
+    artifact_type: str,
+    filename: str,
+    max_bytes: int = ARTIFACT_PREVIEW_MAX_BYTES,
+) -> str:
+    """
+    Like :func:`get_artifact` for ``.md`` files, but reads at most
+    *max_bytes* (see :func:`read_preview`).
+
+    Raises:
+        FileNotFoundError – artifact does not exist
+        ValueError        – invalid *artifact_type* or extension, or an
+                            ``.mp3`` file (audio has no text preview)
+    """
     _validate_type(artifact_type)
     filename = _validate_filename(artifact_type, filename)
+    if Path(filename).suffix.lower() == ".mp3":
+        raise ValueError("Audio artifacts have no text preview.")
     file_path = _resolve(artifact_type, username, notebook_id, filename)
 
     if not file_path.exists():
@@ -254,7 +314,7 @@ def get_artifact_bytes(
             f"(notebook={notebook_id}, user={username})"
         )
 
-    return file_path.read_bytes()
+    return read_preview(file_path, max_bytes)
 
 
 def delete_artifact(
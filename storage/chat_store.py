@@ -3,14 +3,18 @@ Chat Store.
 
 Responsibilities:
   - Append messages to chat/messages.jsonl (one JSON object per line)
-  - Read full chat history for a notebook
+  - Read full chat history for a notebook (parsing only what was appended
+    since the last read)
   - Each message has: role, content, timestamp
   - Assistant messages also have: citations, rag_technique, timing metrics
 """
 
-import json
+import threading
 from datetime import datetime, timezone
 from pathlib import Path
+
+import orjson
+
 from storage.notebook_store import touch_notebook
 from utils.config import DATA_ROOT
 from utils.security import safe_path, sanitize_username
@@ -19,17 +23,72 @@ from utils.security import safe_path, sanitize_username
 # Internal helpers
 # ---------------------------------------------------------------------------
 
-def _chat_dir(username: str, notebook_id: str) -> Path:
-    """Resolve …/users/<username>/notebooks/<notebook_id>/chat/"""
+# Parsed history per messages.jsonl: (inode, bytes parsed, messages).  The log
+# is append-only, so when the file has grown only its new tail is parsed; a
+# shrunk or replaced file is re-read from the start.
+HISTORY_CACHE_SIZE = 128
+_history_cache: dict[Path, tuple[int, int, list[dict]]] = {}
+_history_lock = threading.Lock()
+
+
+# Resolved chat directories per (root, username, notebook_id), so validation
+# and mkdir run once per notebook instead of once per message.  The root is
+# part of the key so a redirected DATA_ROOT never reuses another root's path.
+CHAT_DIR_CACHE_SIZE = 1024
+_chat_dirs: dict[tuple[Path, str, str], Path] = {}
+
+
+def _chat_dir(username: str, notebook_id: str, create: bool = True) -> Path:
+    """Resolve …/users/<username>/notebooks/<notebook_id>/chat/
+
+    With *create* (the write path) the directory is made if missing; readers
+    pass ``create=False`` and get the path whether or not it exists.
+    """
+    key = (DATA_ROOT, username, notebook_id)
+    chat_dir = _chat_dirs.get(key)
+    if chat_dir is not None:
+        return chat_dir
+
     base = DATA_ROOT / "users" / sanitize_username(username) / "notebooks"
     nb_dir = safe_path(base, notebook_id)
     chat_dir = nb_dir / "chat"
-    chat_dir.mkdir(parents=True, exist_ok=True)
+    if not create:
+        return chat_dir
+    # No parents: a write for a deleted notebook must fail, not recreate it
+    chat_dir.mkdir(exist_ok=True)
+    with _history_lock:
+        if len(_chat_dirs) >= CHAT_DIR_CACHE_SIZE:
+            _chat_dirs.pop(next(iter(_chat_dirs)))   # oldest first
+        _chat_dirs[key] = chat_dir
     return chat_dir
 
 
-def _messages_file(username: str, notebook_id: str) -> Path:
-    return _chat_dir(username, notebook_id) / "messages.jsonl"
+def forget_notebook(username: str, notebook_id: str) -> None:
+    """Drop the cached chat directory and history of a deleted notebook."""
+    with _history_lock:
+        chat_dir = _chat_dirs.pop((DATA_ROOT, username, notebook_id), None)
+        if chat_dir is not None:
+            _history_cache.pop(chat_dir / "messages.jsonl", None)
+
+
+def _messages_file(username: str, notebook_id: str, create: bool = True) -> Path:
+    return _chat_dir(username, notebook_id, create) / "messages.jsonl"
+
+
+def _parse_lines(data: bytes) -> list[dict]:
+    messages: list[dict] = []
+    for line in data.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            messages.append(orjson.loads(line))
+        except orjson.JSONDecodeError:
+            # Skip corrupted lines rather than crashing the whole session.
+            # A partial write during a crash can leave one bad line; all
+            # preceding messages are still intact and readable.
+            continue
+    return messages
 
 
 def _now_iso() -> str:
@@ -106,11 +165,40 @@ def append_message(username: str, notebook_id: str, message: dict) -> None:
         ValueError – missing or invalid role / content
         OSError    – underlying filesystem failure
     """
-    msg = _validate_message(message)
+    append_messages(username, notebook_id, [message])
+
+
+def append_messages(username: str, notebook_id: str, messages: list[dict]) -> None:
+    """
+    Append several messages to the chat history in one write.
+
+    Every message is validated before anything is written, so an invalid
+    message leaves the history untouched.  The file is opened once and the
+    notebook is touched once, regardless of how many messages are given.
+
+    Args:
+        username    – HuggingFace username
+        notebook_id – UUID of the target notebook
+        messages    – message dicts, each conforming to :func:`append_message`
+
+    Raises:
+        ValueError – missing or invalid role / content in any message
+        OSError    – underlying filesystem failure
+    """
+    if not messages:
+        return
+    lines = [orjson.dumps(_validate_message(m)) + b"\n" for m in messages]
     path = _messages_file(username, notebook_id)
 
-    with path.open("a", encoding="utf-8") as fh:
-        fh.write(json.dumps(msg, ensure_ascii=False) + "\n")
+    try:
+        fh = path.open("ab")
+    except FileNotFoundError:
+        # Chat directory removed since it was cached.  Recreate only that
+        # level; if the notebook itself is gone this raises.
+        path.parent.mkdir(exist_ok=True)
+        fh = path.open("ab")
+    with fh:
+        fh.write(b"".join(lines))
     try:
       touch_notebook(username, notebook_id)
     except KeyError:
@@ -123,6 +211,8 @@ def get_history(username: str, notebook_id: str) -> list[dict]:
     Returns an empty list if no history exists yet for this notebook.
 
     Each item matches the message schema described in :func:`append_message`.
+    The list is the caller's own, but the message dicts are shared with the
+    history cache and must not be mutated.
 
     Args:
         username    – HuggingFace username
@@ -131,25 +221,35 @@ def get_history(username: str, notebook_id: str) -> list[dict]:
     Returns:
         List of message dicts, oldest first.
     """
-    path = _messages_file(username, notebook_id)
-    if not path.exists():
+    path = _messages_file(username, notebook_id, create=False)
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        with _history_lock:
+            _history_cache.pop(path, None)
         return []
 
-    messages: list[dict] = []
-    with path.open("r", encoding="utf-8") as fh:
-        for line_num, line in enumerate(fh, start=1):
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                messages.append(json.loads(line))
-            except json.JSONDecodeError:
-                # Skip corrupted lines rather than crashing the whole session.
-                # A partial write during a crash can leave one bad line; all
-                # preceding messages are still intact and readable.
-                continue
-
-    return messages
+    with _history_lock:
+        inode, offset, messages = _history_cache.pop(path, (None, 0, []))
+        if inode != st.st_ino or st.st_size < offset:
+            offset, messages = 0, []
+
+        tail = b""
+        if st.st_size > offset:
+            with path.open("rb") as fh:
+                fh.seek(offset)
+                tail = fh.read()
+            # Cache complete lines only; an unterminated last line (e.g. a
+            # write still in progress) is parsed again on the next read
+            end = tail.rfind(b"\n") + 1
+            messages.extend(_parse_lines(tail[:end]))
+            offset += end
+            tail = tail[end:]
+
+        if len(_history_cache) >= HISTORY_CACHE_SIZE:
+            _history_cache.pop(next(iter(_history_cache)))   # oldest first
+        _history_cache[path] = (st.st_ino, offset, messages)
+        return messages + _parse_lines(tail)
 
 
 # ---------------------------------------------------------------------------
@@ -182,9 +282,11 @@ def clear_history(username: str, notebook_id: str) -> int:
     Returns:
         Number of messages deleted (0 if no history existed).
     """
-    path = _messages_file(username, notebook_id)
+    path = _messages_file(username, notebook_id, create=False)
     if not path.exists():
         return 0
     count = len(get_history(username, notebook_id))
     path.unlink()
+    with _history_lock:
+        _history_cache.pop(path, None)
     return count
\ No newline at end of file
@@ -0,0 +1,94 @@
+"""
+Embedding Cache.
+
+Responsibilities:
+  - Map chunk text to its embedding, keyed by blake2b(model name + text)
+  - Persist vectors as int8 (plus one float32 scale each) in a SQLite table
+    under <DATA_ROOT>/cache/ — a quarter of the float32 size
+  - Let vector_store embed only the chunks it has never seen before
+  - Never fail an ingest: cache errors are logged and treated as misses
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from utils import config
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_conn: sqlite3.Connection | None = None
+_conn_path: Path | None = None
+
+
+def _connect() -> sqlite3.Connection:
+    """Open (or reuse) the cache database.  Call with _lock held."""
+    global _conn, _conn_path
+    # Read DATA_ROOT at call time so a redirected root (tests) is honoured.
+    path = config.DATA_ROOT / "cache" / "embeddings.sqlite3"
+    if _conn is None or _conn_path != path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _conn = sqlite3.connect(str(path), check_same_thread=False)
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings_int8 ("
+            " key BLOB PRIMARY KEY,"
+            " vector BLOB NOT NULL)"
+        )
+        _conn_path = path
+    return _conn
+
+
+def _quantize(vec) -> bytes:
+    """Symmetric per-vector int8: float32 scale followed by the int8 values."""
+    vec = np.asarray(vec, dtype=np.float32)
+    scale = float(np.abs(vec).max()) / 127 or 1.0
+    q = np.clip(np.round(vec / scale), -127, 127).astype(np.int8)
+    return np.float32(scale).tobytes() + q.tobytes()
+
+
+def _dequantize(blob: bytes) -> np.ndarray:
+    scale = np.frombuffer(blob, dtype=np.float32, count=1)[0]
+    return np.frombuffer(blob, dtype=np.int8, offset=4).astype(np.float32) * scale
+
+
+def make_key(text: str, model: str = config.EMBEDDING_MODEL) -> bytes:
+    """Content address of *text* under embedding *model*."""
+    return hashlib.blake2b(f"{model}\0{text}".encode(), digest_size=16).digest()
+
+
+def get_many(keys: list[bytes]) -> dict[bytes, np.ndarray]:
+    """Return the cached float32 vectors for whichever *keys* are present."""
+    if not keys:
+        return {}
+    placeholders = ",".join("?" * len(keys))
+    try:
+        with _lock:
+            rows = _connect().execute(
+                f"SELECT key, vector FROM embeddings_int8 WHERE key IN ({placeholders})",
+                keys,
+            ).fetchall()
+    except sqlite3.Error as e:
+        logger.warning("Embedding cache read failed: %s", e)
+        return {}
+    return {key: _dequantize(blob) for key, blob in rows}
+
+
+def put_many(vectors: dict[bytes, np.ndarray]) -> None:
+    """Store *vectors* (any float dtype) quantized to int8."""
+    if not vectors:
+        return
+    rows = [(key, _quantize(vec)) for key, vec in vectors.items()]
+    try:
+        with _lock:
+            conn = _connect()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings_int8 (key, vector) VALUES (?, ?)", rows
+                )
+    except sqlite3.Error as e:
+        logger.warning("Embedding cache write failed: %s", e)
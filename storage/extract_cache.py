@@ -0,0 +1,100 @@
+"""
+Extraction Cache.
+
+Responsibilities:
+  - Map a document's raw bytes to the text its extractor produced, keyed by
+    blake2b(file type + file contents)
+  - Persist the text in a SQLite file inside the notebook directory, so it
+    is scoped to one notebook and removed along with it
+  - Let ingestion skip the PDF / PPTX parse when the same file is uploaded
+    to the notebook again
+  - Stay under EXTRACT_CACHE_MAX_BYTES per notebook, least recently used
+    entries evicted first
+  - Never fail an ingest: cache errors are logged and treated as misses
+"""
+
+import hashlib
+import logging
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+
+from storage.notebook_store import get_notebook_dir
+from utils.config import EXTRACT_CACHE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+
+def _connect(username: str, notebook_id: str) -> sqlite3.Connection:
+    path = get_notebook_dir(username, notebook_id) / "extract_cache.sqlite3"
+    conn = sqlite3.connect(str(path))
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS extracted ("
+        " key BLOB PRIMARY KEY,"
+        " source TEXT NOT NULL,"
+        " text TEXT NOT NULL,"
+        " nbytes INTEGER NOT NULL,"
+        " used REAL NOT NULL)"
+    )
+    return conn
+
+
+def make_key(file_path: str | Path, ext: str) -> bytes:
+    """Content address of the file at *file_path*, extracted as type *ext*."""
+    h = hashlib.blake2b(f"{ext}\0".encode(), digest_size=16)
+    with open(file_path, "rb") as f:
+        return hashlib.file_digest(f, lambda: h).digest()
+
+
+def get(username: str, notebook_id: str, key: bytes) -> str | None:
+    """Return the cached text for *key* in this notebook, or None."""
+    try:
+        with closing(_connect(username, notebook_id)) as conn, conn:
+            row = conn.execute("SELECT text FROM extracted WHERE key = ?", (key,)).fetchone()
+            if row:
+                conn.execute("UPDATE extracted SET used = ? WHERE key = ?", (time.time(), key))
+    except sqlite3.Error as e:
+        logger.warning("Extraction cache read failed: %s", e)
+        return None
+    return row[0] if row else None
+
+
+def put(username: str, notebook_id: str, key: bytes, source: str, text: str) -> None:
+    """Store the extracted *text* of *source*, evicting old entries over the cap."""
+    nbytes = len(text.encode())
+    if nbytes > EXTRACT_CACHE_MAX_BYTES:
+        return
+    try:
+        with closing(_connect(username, notebook_id)) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO extracted (key, source, text, nbytes, used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, source, text, nbytes, time.time()),
+            )
+            total = conn.execute("SELECT SUM(nbytes) FROM extracted").fetchone()[0]
+            if total > EXTRACT_CACHE_MAX_BYTES:
+                rows = conn.execute(
+                    "SELECT key, nbytes FROM extracted WHERE key != ? ORDER BY used", (key,)
+                ).fetchall()
+                evict = []
+                for old_key, size in rows:
+                    if total <= EXTRACT_CACHE_MAX_BYTES:
+                        break
+                    evict.append((old_key,))
+                    total -= size
+                conn.executemany("DELETE FROM extracted WHERE key = ?", evict)
+    except sqlite3.Error as e:
+        logger.warning("Extraction cache write failed: %s", e)
+
+
+def purge_source(username: str, notebook_id: str, source: str) -> None:
+    """Drop the cached text of *source* (called when the source is deleted)."""
+    path = get_notebook_dir(username, notebook_id) / "extract_cache.sqlite3"
+    if not path.is_file():
+        return
+    try:
+        with closing(_connect(username, notebook_id)) as conn, conn:
+            conn.execute("DELETE FROM extracted WHERE source = ?", (source,))
+    except sqlite3.Error as e:
+        logger.warning("Extraction cache purge failed: %s", e)
@@ -12,19 +12,29 @@ Responsibilities:
   - Use atomic writes (write-to-temp-then-rename) for JSON files
 """
 
-import json
+import atexit
+import logging
 import os
 import shutil
 import tempfile
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
 
-from utils.config import DATA_ROOT
+import orjson
+
+from utils.config import (
+    DATA_ROOT,
+    RMTREE_PARALLEL_MIN_ENTRIES,
+    RMTREE_WORKERS,
+    TOUCH_FLUSH_INTERVAL_S,
+)
 from utils.security import safe_path, sanitize_notebook_name, sanitize_username
 
 #----------- logs-------
-import logging
 logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
@@ -92,8 +102,8 @@ def _atomic_write_json(path: Path, data) -> None:
         suffix=".json",
     )
     try:
-        with os.fdopen(tmp_fd, "w", encoding="utf-8") as fh:
-            json.dump(data, fh, indent=2, ensure_ascii=False)
+        with os.fdopen(tmp_fd, "wb") as fh:
+            fh.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
         os.replace(tmp_path, path)          # atomic rename
     except Exception:
         # Clean up the orphaned temp file before re-raising
@@ -112,32 +122,209 @@ def _read_json(path: Path, default):
     if not path.exists():
         return default
     try:
-        return json.loads(path.read_text(encoding="utf-8"))
-    except (json.JSONDecodeError, OSError):
+        return orjson.loads(path.read_bytes())
+    except (orjson.JSONDecodeError, OSError):
         return default
 
 
+# ---------------------------------------------------------------------------
+# Tree removal
+# ---------------------------------------------------------------------------
+
+def _rmtree(root: Path) -> None:
+    """
+    Remove the directory tree at *root*, like ``shutil.rmtree``.
+
+    Deleting many small files is bound by per-file syscall latency, so for
+    trees of RMTREE_PARALLEL_MIN_ENTRIES or more the unlinks are spread over
+    a thread pool; directories are then removed bottom-up.  Symlinks are
+    removed, never followed.
+    """
+    files: list[str] = []
+    dirs: list[str] = []
+    for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+        files.extend(os.path.join(dirpath, f) for f in filenames)
+        for d in dirnames:
+            p = os.path.join(dirpath, d)
+            (files if os.path.islink(p) else dirs).append(p)
+
+    if len(files) + len(dirs) < RMTREE_PARALLEL_MIN_ENTRIES:
+        shutil.rmtree(root)
+        return
+
+    with ThreadPoolExecutor(RMTREE_WORKERS, thread_name_prefix="rmtree") as pool:
+        list(pool.map(os.unlink, files, chunksize=32))   # re-raises the first failure
+    for d in dirs:                                       # children before parents
+        os.rmdir(d)
+    os.rmdir(root)
+
+
+# Deleted notebook directories are renamed to a hidden trash entry next to
+# the others (one atomic rename) and removed here, off the request path.
+_TRASH_PREFIX = ".trash."
+_trash_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="trash")
+
+
+def _drain_trash(path: Path) -> None:
+    try:
+        _rmtree(path)
+    except OSError as e:
+        logger.warning("Could not remove deleted notebook data %s: %s", path, e)
+
+
+def sweep_trash() -> int:
+    """
+    Queue removal of trash left behind by a crash or restart mid-delete.
+
+    Call once at start-up.  Returns the number of entries queued.
+    """
+    leftovers = list((DATA_ROOT / "users").glob(f"*/notebooks/{_TRASH_PREFIX}*"))
+    for path in leftovers:
+        _trash_pool.submit(_drain_trash, path)
+    return len(leftovers)
+
+
 # ---------------------------------------------------------------------------
 # index.json helpers
 #
 # index.json is a list of lightweight summary records:
 #   [{"id": str, "name": str, "created_at": str, "updated_at": str}, ...]
 #
-# Full metadata lives in each notebook's own metadata.json.
+# Full metadata lives in each notebook's own metadata.json.  In memory the
+# records are keyed by notebook id (dicts keep the file's order), so lookups
+# and removals by id don't scan the list.
 # ---------------------------------------------------------------------------
 
-def _load_index(username: str) -> list[dict]:
-    return _read_json(_index_path(username), default=[])
+# Parsed index.json per path, validated by (inode, mtime, size): every save
+# replaces the file, so a changed stamp means it was rewritten.  Callers get
+# fresh copies of the records and may mutate them.  Alongside the records
+# each entry keeps {lowercased name: notebook id} for duplicate-name checks.
+INDEX_CACHE_SIZE = 256
+_index_cache: dict[Path, tuple[tuple[int, int, int], list[dict], dict[str, str]]] = {}
+_index_cache_lock = threading.Lock()
+
+
+def _file_stamp(st: os.stat_result) -> tuple[int, int, int]:
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _cache_index(path: Path, stamp: tuple[int, int, int], records: list[dict]) -> dict[str, str]:
+    names = {nb["name"].lower(): nb["id"] for nb in records}
+    with _index_cache_lock:
+        _index_cache.pop(path, None)
+        if len(_index_cache) >= INDEX_CACHE_SIZE:
+            _index_cache.pop(next(iter(_index_cache)))   # oldest first
+        _index_cache[path] = (stamp, records, names)
+    return names
 
 
-def _save_index(username: str, index: list[dict]) -> None:
-    _atomic_write_json(_index_path(username), index)
+# Every load -> modify -> save of index.json (create, rename, delete and the
+# touch flush) runs under this lock, so no writer saves a stale copy over
+# another's change.
+_index_lock = threading.Lock()
+
+
+def _load_index_and_names(username: str) -> tuple[dict[str, dict], dict[str, str]]:
+    """The index (see :func:`_load_index`) plus its lowercased-name → id map."""
+    path = _index_path(username)
+    try:
+        stamp = _file_stamp(path.stat())
+    except FileNotFoundError:
+        return {}, {}
+
+    with _index_cache_lock:
+        hit = _index_cache.get(path)
+    if hit is not None and hit[0] == stamp:
+        _, records, names = hit
+    else:
+        records = _read_json(path, default=[])
+        names = _cache_index(path, stamp, records)
+    return {nb["id"]: dict(nb) for nb in records}, names
+
+
+def _load_index(username: str) -> dict[str, dict]:
+    return _load_index_and_names(username)[0]
+
+
+def _save_index(username: str, index: dict[str, dict]) -> None:
+    path = _index_path(username)
+    records = [dict(nb) for nb in index.values()]
+    _atomic_write_json(path, records)
+    _cache_index(path, _file_stamp(path.stat()), records)
 
 
 def _now() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
+# ---------------------------------------------------------------------------
+# touch_notebook coalescing
+#
+# Every chat turn and artifact save bumps *updated_at*.  Rather than
+# rewriting metadata.json + index.json each time, touches are held in memory
+# and written at most every TOUCH_FLUSH_INTERVAL_S (and at exit), one index
+# write per user.  Readers overlay the pending timestamps, so the
+# 'recently active' order is current even before the flush.
+#
+# A flush swaps the pending touches out under _touch_lock and writes them
+# with only _index_lock held, so touches and readers never wait on disk.
+# Notebooks deleted in the meantime are skipped, never recreated.
+# ---------------------------------------------------------------------------
+
+_pending_touches: dict[tuple[str, str], str] = {}
+_flushing_touches: dict[tuple[str, str], str] = {}   # being written; still overlaid
+_touch_lock = threading.Lock()
+_touch_timer: threading.Timer | None = None
+
+
+def _touch_of(key: tuple[str, str]) -> str | None:
+    """Newest unwritten touch for *key*.  Call with _touch_lock held."""
+    return _pending_touches.get(key) or _flushing_touches.get(key)
+
+
+def _pending_touch(username: str, notebook_id: str) -> str | None:
+    with _touch_lock:
+        return _touch_of((username, notebook_id))
+
+
+def flush_touches() -> None:
+    """Write all pending :func:`touch_notebook` timestamps to disk now."""
+    global _touch_timer
+    with _index_lock:
+        with _touch_lock:
+            _touch_timer = None
+            _flushing_touches.update(_pending_touches)
+            _pending_touches.clear()
+            by_user: dict[str, dict[str, str]] = {}
+            for (username, notebook_id), ts in _flushing_touches.items():
+                by_user.setdefault(username, {})[notebook_id] = ts
+
+        try:
+            for username, touched in by_user.items():
+                try:
+                    index = _load_index(username)
+                    changed = False
+                    for notebook_id, ts in touched.items():
+                        target = index.get(notebook_id)
+                        if target is None or ts <= target.get("updated_at", ""):
+                            continue        # deleted, or renamed since (newer stamp)
+                        if not _notebook_dir(username, notebook_id).is_dir():
+                            continue        # directory already moved to the trash
+                        target["updated_at"] = ts
+                        _atomic_write_json(_metadata_path(username, notebook_id), target)
+                        changed = True
+                    if changed:
+                        _save_index(username, index)
+                except (OSError, ValueError) as e:
+                    logger.warning("Could not save notebook activity for user=%s: %s", username, e)
+        finally:
+            with _touch_lock:
+                _flushing_touches.clear()
+
+
+atexit.register(flush_touches)
+
+
 # ===========================================================================
 # Public API  —  signatures match the stub exactly
 # ===========================================================================
@@ -165,30 +352,31 @@ def create_notebook(username: str, name: str) -> dict:
     """
     name = sanitize_notebook_name(name)
 
-    index = _load_index(username)
-    if any(nb["name"].lower() == name.lower() for nb in index):
-        raise RuntimeError(f"A notebook named '{name}' already exists.")
-
-    notebook_id = str(uuid.uuid4())
-    now = _now()
-    metadata = {
-        "id":         notebook_id,
-        "name":       name,
-        "created_at": now,
-        "updated_at": now,
-    }
-
-    # 1. Create sub-directory tree
-    nb_dir = _notebook_dir(username, notebook_id)
-    for sub in _NOTEBOOK_SUBDIRS:
-        (nb_dir / sub).mkdir(parents=True, exist_ok=True)
-
-    # 2. Write metadata.json inside the notebook directory (atomic)
-    _atomic_write_json(_metadata_path(username, notebook_id), metadata)
-
-    # 3. Append to index.json (atomic)
-    index.append(metadata)
-    _save_index(username, index)
+    with _index_lock:
+        index, names = _load_index_and_names(username)
+        if name.lower() in names:
+            raise RuntimeError(f"A notebook named '{name}' already exists.")
+
+        notebook_id = str(uuid.uuid4())
+        now = _now()
+        metadata = {
+            "id":         notebook_id,
+            "name":       name,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+        # 1. Create sub-directory tree
+        nb_dir = _notebook_dir(username, notebook_id)
+        for sub in _NOTEBOOK_SUBDIRS:
+            (nb_dir / sub).mkdir(parents=True, exist_ok=True)
+
+        # 2. Write metadata.json inside the notebook directory (atomic)
+        _atomic_write_json(_metadata_path(username, notebook_id), metadata)
+
+        # 3. Append to index.json (atomic)
+        index[notebook_id] = metadata
+        _save_index(username, index)
 
     #logger info 
     logger.info(
@@ -208,8 +396,13 @@ def list_notebooks(username: str) -> list[dict]:
     contains.  Returns an empty list if the user has no notebooks yet.
     """
     index = _load_index(username)
+    with _touch_lock:
+        for notebook_id, nb in index.items():
+            ts = _touch_of((username, notebook_id))
+            if ts is not None and ts > nb.get("updated_at", ""):
+                nb["updated_at"] = ts
     return sorted(
-        index,
+        index.values(),
         key=lambda nb: nb.get("updated_at", nb.get("created_at", "")),
         reverse=True,
     )
@@ -233,6 +426,9 @@ def get_notebook(username: str, notebook_id: str) -> dict:
             f"Notebook '{notebook_id}' not found for user '{username}'."
         )
 
+    ts = _pending_touch(username, notebook_id)
+    if ts is not None and ts > metadata.get("updated_at", ""):
+        metadata["updated_at"] = ts
     return metadata
 
 
@@ -242,28 +438,37 @@ def delete_notebook(username: str, notebook_id: str) -> None:
 
     Steps (in safe order):
         1. Verify the notebook exists.
-        2. Remove the notebook directory tree from disk.
+        2. Move the notebook directory to the trash; it is removed in the background.
         3. Remove the notebook's entry from index.json (atomic write).
 
     Raises:
         KeyError – notebook not found
     """
-    # 1. Verify existence before touching anything
-    index = _load_index(username)
-    updated_index = [nb for nb in index if nb["id"] != notebook_id]
-
-    if len(updated_index) == len(index):
-        raise KeyError(
-            f"Notebook '{notebook_id}' not found for user '{username}'."
-        )
-
-    # 2. Delete directory tree (all files_raw, chroma, chat, artifacts, etc.)
-    nb_dir = _notebook_dir(username, notebook_id)
-    if nb_dir.exists():
-        shutil.rmtree(nb_dir)
-
-    # 3. Atomically update index.json
-    _save_index(username, updated_index)
+    with _index_lock:
+        # 1. Verify existence before touching anything
+        index = _load_index(username)
+        if index.pop(notebook_id, None) is None:
+            raise KeyError(
+                f"Notebook '{notebook_id}' not found for user '{username}'."
+            )
+
+        # 2. Move the directory tree (files_raw, chroma, chat, artifacts, etc.)
+        #    to the trash and delete it in the background.  A pending touch
+        #    would otherwise write metadata.json back into it.
+        nb_dir = _notebook_dir(username, notebook_id)
+        with _touch_lock:
+            _pending_touches.pop((username, notebook_id), None)
+        if nb_dir.exists():
+            trash = nb_dir.with_name(f"{_TRASH_PREFIX}{notebook_id}.{uuid.uuid4().hex}")
+            nb_dir.rename(trash)
+            _trash_pool.submit(_drain_trash, trash)
+
+        # 3. Atomically update index.json
+        _save_index(username, index)
+
+    # Late write-behind chat appends must not reuse the cached chat path
+    from storage import chat_store
+    chat_store.forget_notebook(username, notebook_id)
     
     #logger info 
     logger.info(
@@ -288,29 +493,26 @@ def update_notebook_name(username: str, notebook_id: str, new_name: str) -> dict
         ValueError   – blank or unsafe name
     """
     new_name = sanitize_notebook_name(new_name)
-    index = _load_index(username)
+    with _index_lock:
+        index, names = _load_index_and_names(username)
 
-    target = next((nb for nb in index if nb["id"] == notebook_id), None)
-    if target is None:
-        raise KeyError(f"Notebook '{notebook_id}' not found for user '{username}'.")
+        target = index.get(notebook_id)
+        if target is None:
+            raise KeyError(f"Notebook '{notebook_id}' not found for user '{username}'.")
 
-    if any(
-        nb["name"].lower() == new_name.lower() and nb["id"] != notebook_id
-        for nb in index
-    ):
-        raise RuntimeError(f"A notebook named '{new_name}' already exists.")
+        if names.get(new_name.lower(), notebook_id) != notebook_id:
+            raise RuntimeError(f"A notebook named '{new_name}' already exists.")
 
-    now = _now()
-    target["name"] = new_name
-    target["updated_at"] = now
+        now = _now()
+        target["name"] = new_name
+        target["updated_at"] = now
 
-    # Keep metadata.json in sync
-    metadata = _read_json(_metadata_path(username, notebook_id), default=dict(target))
-    metadata["name"] = new_name
-    metadata["updated_at"] = now
+        # Keep metadata.json in sync.  It holds the same fields as the index
+        # record, so the record is written as-is rather than re-read and patched.
+        metadata = dict(target)
 
-    _atomic_write_json(_metadata_path(username, notebook_id), metadata)
-    _save_index(username, index)
+        _atomic_write_json(_metadata_path(username, notebook_id), metadata)
+        _save_index(username, index)
 
     #logger info
     logger.info(
@@ -328,25 +530,24 @@ def touch_notebook(username: str, notebook_id: str) -> None:
 
     Called by chat_store and artifact_store after every write so the
     'sorted by recently active' order in list_notebooks() stays accurate.
+    The new timestamp is visible immediately but written to disk within
+    TOUCH_FLUSH_INTERVAL_S, coalesced with other touches (see
+    :func:`flush_touches`).
 
     Raises:
         KeyError – notebook not found
     """
-    index = _load_index(username)
-    target = next((nb for nb in index if nb["id"] == notebook_id), None)
-    if target is None:
+    global _touch_timer
+    if not _metadata_path(username, notebook_id).is_file():
         raise KeyError(f"Notebook '{notebook_id}' not found for user '{username}'.")
 
-    now = _now()
-    target["updated_at"] = now
-
-    metadata = _read_json(_metadata_path(username, notebook_id), default=dict(target))
-    metadata["updated_at"] = now
+    with _touch_lock:
+        _pending_touches[(username, notebook_id)] = _now()
+        if _touch_timer is None:
+            _touch_timer = threading.Timer(TOUCH_FLUSH_INTERVAL_S, flush_touches)
+            _touch_timer.daemon = True
+            _touch_timer.start()
 
-    _atomic_write_json(_metadata_path(username, notebook_id), metadata)
-    _save_index(username, index)
-     
-    #logger info 
     logger.debug(
     "Notebook touched | user=%s notebook_id=%s",
     username,
@@ -378,5 +579,18 @@ def get_artifact_dir(username: str, notebook_id: str, artifact_type: str) -> Pat
     allowed = {"reports", "quizzes", "podcasts"}
     if artifact_type not in allowed:
         raise ValueError(f"artifact_type must be one of {allowed}, got '{artifact_type}'")
+    return _artifact_dir(DATA_ROOT, username, notebook_id, artifact_type)
+
+
+@lru_cache(maxsize=512)
+def _artifact_dir(root: Path, username: str, notebook_id: str, artifact_type: str) -> Path:
+    """
+    Cached path resolution for get_artifact_dir().
+
+    Artifact listing and viewing resolve the same (user, notebook, type)
+    triples over and over; sanitising and validating them is pure string /
+    path work, so the result is memoised.  *root* is part of the key so a
+    redirected DATA_ROOT (tests) never gets a stale path.
+    """
     return _notebook_dir(username, notebook_id) / "artifacts" / artifact_type
 
@@ -9,26 +9,66 @@ Responsibilities:
 """
 
 import hashlib
+import itertools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import chromadb
 from chromadb.config import Settings
 from chromadb.utils import embedding_functions
 
+from storage import embedding_cache, extract_cache
 from storage.notebook_store import get_chroma_dir
-from utils.config import EMBEDDING_MODEL, EMBEDDING_DEVICE
+from utils.config import (
+    EMBED_UPSERT_BATCH_SIZE,
+    EMBEDDING_DEVICE,
+    EMBEDDING_MODEL,
+    QUERY_EMBEDDING_CACHE_SIZE,
+)
 
 # ---------------------------------------------------------------------------
 # Embedding function (shared across all collections)
 #
 # sentence-transformers runs locally — no API key needed.
 # We build it once and reuse it so the model isn't reloaded on every call.
+# The model itself is loaded on first use: listing, counting and deleting
+# never embed anything, so they should not wait for torch and the weights.
 # ---------------------------------------------------------------------------
 
-_embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-    model_name=EMBEDDING_MODEL,
-    device=EMBEDDING_DEVICE,
-)
+class _LazySentenceTransformerEF(embedding_functions.SentenceTransformerEmbeddingFunction):
+    """SentenceTransformerEmbeddingFunction that loads its model on first call."""
+
+    def __init__(self, model_name: str, device: str):
+        # Only what get_config() reports to ChromaDB; the parent __init__,
+        # which loads the model, runs in _load().
+        self.model_name = model_name
+        self.device = device
+        self.normalize_embeddings = False
+        self.kwargs = {}
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def _load(self) -> None:
+        with self._load_lock:
+            if not self._loaded:
+                super().__init__(model_name=self.model_name, device=self.device)
+                self._loaded = True
+
+    def __call__(self, input):
+        if not self._loaded:
+            self._load()
+        return super().__call__(input)
+
+    @staticmethod
+    def build_from_config(config: dict) -> "_LazySentenceTransformerEF":
+        # ChromaDB round-trips the config through this on every
+        # get_or_create_collection; the parent version would load the model.
+        return _LazySentenceTransformerEF(config["model_name"], config["device"])
+
+
+_embedding_fn = _LazySentenceTransformerEF(EMBEDDING_MODEL, EMBEDDING_DEVICE)
 
 # ---------------------------------------------------------------------------
 # ChromaDB client cache
@@ -52,6 +92,37 @@ def _get_client(chroma_dir: Path) -> chromadb.PersistentClient:
     return _clients[key]
 
 
+def _close_client(chroma_dir: Path) -> None:
+    """Close and forget the cached client for *chroma_dir*, releasing its SQLite handles."""
+    client = _clients.pop(str(chroma_dir.resolve()), None)
+    if client is not None:
+        client.close()
+
+
+# ---------------------------------------------------------------------------
+# Write versions
+#
+# Every write to a notebook's collection stamps it with a fresh value from a
+# process-wide counter, so callers can cache data derived from a collection
+# (e.g. the gathered notebook text in core/artifacts.py) and tell when it is
+# stale.  next() on itertools.count is atomic, so concurrent writers never
+# hand out the same stamp.
+# ---------------------------------------------------------------------------
+
+_write_counter = itertools.count(1)
+_versions: dict[tuple[str, str], int] = {}
+
+
+def _bump_version(username: str, notebook_id: str) -> None:
+    _versions[(username, notebook_id)] = next(_write_counter)
+
+
+# Distinct source names per notebook, stamped with the write version they
+# were read at (see list_sources).
+SOURCES_CACHE_SIZE = 256
+_sources_cache: dict[tuple[str, str], tuple[int, list[str]]] = {}
+
+
 def _collection_name(notebook_id: str) -> str:
     """
     Derive a ChromaDB-safe collection name from a notebook UUID.
@@ -73,6 +144,55 @@ def _chunk_id(source: str, index: int) -> str:
     return hashlib.sha256(raw.encode()).hexdigest()[:40]
 
 
+def _embed(texts: list[str]) -> list:
+    """
+    Embed *texts*, reusing cached vectors for text seen before.
+
+    Re-ingesting an edited file or a re-fetched URL mostly produces chunks
+    that were already embedded; only the cache misses go through the model.
+    """
+    keys = [embedding_cache.make_key(t) for t in texts]
+    vectors = embedding_cache.get_many(keys)
+
+    missing = [i for i, k in enumerate(keys) if k not in vectors]
+    if missing:
+        fresh = _embedding_fn([texts[i] for i in missing])
+        new = {keys[i]: vec for i, vec in zip(missing, fresh)}
+        embedding_cache.put_many(new)
+        vectors.update(new)
+
+    return [vectors[k] for k in keys]
+
+
+# Query-side embeddings, LRU-bounded.  Questions repeat (a retry, the same
+# question under another technique), but unlike chunk embeddings they are
+# not worth persisting, so they are kept in memory only.
+_query_vectors: OrderedDict[str, list[float]] = OrderedDict()
+_query_vectors_lock = threading.Lock()
+
+
+def _embed_queries(texts: list[str]) -> list:
+    """Embed query *texts*, reusing vectors of recently seen queries."""
+    vectors = {}
+    with _query_vectors_lock:
+        for t in texts:
+            vec = _query_vectors.get(t)
+            if vec is not None:
+                _query_vectors.move_to_end(t)
+                vectors[t] = vec
+
+    missing = list(dict.fromkeys(t for t in texts if t not in vectors))
+    if missing:
+        fresh = _embedding_fn(missing)
+        with _query_vectors_lock:
+            for t, vec in zip(missing, fresh):
+                _query_vectors[t] = vectors[t] = vec
+            while len(_query_vectors) > QUERY_EMBEDDING_CACHE_SIZE:
+                _query_vectors.popitem(last=False)
+
+    return [vectors[t] for t in texts]
+
+
 # ===========================================================================
 # Public API  —  signatures match the stub exactly
 # ===========================================================================
@@ -115,7 +235,15 @@ def add_documents(
 
     Uses ``upsert`` so calling this twice with the same source file is safe —
     existing chunks are updated rather than duplicated.  Chunk IDs are derived
-    deterministically from ``metadata["source"]`` + chunk index.
+    deterministically from ``metadata["source"]`` + ``metadata["chunk_index"]``
+    (falling back to the position in *chunks*).
+
+    Chunks are embedded and upserted in batches of EMBED_UPSERT_BATCH_SIZE:
+    one encoder pass and one ChromaDB write per batch, which also keeps large
+    files under ChromaDB's maximum batch size.  Chunks whose text has been
+    embedded before are served from the embedding cache.  With more than one
+    batch, each upsert runs on a helper thread while the next batch is being
+    embedded; at most one upsert is in flight at a time.
 
     Args:
         username    – HuggingFace username
@@ -137,15 +265,36 @@ def add_documents(
     collection = get_or_create_collection(username, notebook_id)
 
     ids = [
-        _chunk_id(metadatas[i].get("source", str(i)), i)
-        for i in range(len(chunks))
+        _chunk_id(meta.get("source", str(i)), meta.get("chunk_index", i))
+        for i, meta in enumerate(metadatas)
     ]
 
-    collection.upsert(
-        documents=chunks,
-        metadatas=metadatas,
-        ids=ids,
-    )
+    if len(chunks) <= EMBED_UPSERT_BATCH_SIZE:
+        collection.upsert(
+            documents=chunks,
+            embeddings=_embed(chunks),
+            metadatas=metadatas,
+            ids=ids,
+        )
+        _bump_version(username, notebook_id)
+        return
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="upsert") as upserter:
+        pending = None
+        for start in range(0, len(chunks), EMBED_UPSERT_BATCH_SIZE):
+            end = start + EMBED_UPSERT_BATCH_SIZE
+            embeddings = _embed(chunks[start:end])
+            if pending is not None:
+                pending.result()                # re-raises a failed upsert
+            pending = upserter.submit(
+                collection.upsert,
+                documents=chunks[start:end],
+                embeddings=embeddings,
+                metadatas=metadatas[start:end],
+                ids=ids[start:end],
+            )
+        pending.result()
+    _bump_version(username, notebook_id)
 
 
 def query_collection(
@@ -158,7 +307,8 @@ def query_collection(
     Query the collection and return top-k results.
 
     Embeds *query_text* using the same sentence-transformers model used at
-    index time, then performs an approximate nearest-neighbour search.
+    index time (recently seen queries reuse their embedding), then performs
+    an approximate nearest-neighbour search.
 
     Args:
         username    – HuggingFace username
@@ -196,18 +346,99 @@ def query_collection(
     actual_n = min(n_results, count)
 
     return collection.query(
-        query_texts=[query_text],
+        query_embeddings=_embed_queries([query_text]),
         n_results=actual_n,
         include=["documents", "metadatas", "distances"],
     )
 
 
+def query_collection_by_vector(
+    username: str,
+    notebook_id: str,
+    query_embedding,
+    n_results: int = 5,
+) -> dict:
+    """
+    Query the collection with a precomputed embedding instead of a text.
+
+    Used when the query vector is derived rather than a single text's
+    embedding (e.g. HyDE averages several hypothetical answers).  The
+    vector must come from the same model as :func:`embed`.
+
+    Returns:
+        Raw ChromaDB result dict, as :func:`query_collection` returns.
+    """
+    collection = get_or_create_collection(username, notebook_id)
+    count = collection.count()
+
+    if count == 0:
+        return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+
+    return collection.query(
+        query_embeddings=[query_embedding],
+        n_results=min(n_results, count),
+        include=["documents", "metadatas", "distances"],
+    )
+
+
+def query_collection_batch(
+    username: str,
+    notebook_id: str,
+    query_texts: list[str],
+    n_results: int = 5,
+) -> list[dict]:
+    """
+    Query the collection with several texts in a single ChromaDB call.
+
+    All queries are embedded in one sentence-transformers forward pass and
+    searched together, which is cheaper than calling :func:`query_collection`
+    once per text.
+
+    Returns:
+        One result dict per query text, each in the same shape as
+        :func:`query_collection` returns.
+
+    Raises:
+        ValueError – any query text is blank
+    """
+    if any(not q or not q.strip() for q in query_texts):
+        raise ValueError("query_text must not be blank.")
+    if not query_texts:
+        return []
+
+    collection = get_or_create_collection(username, notebook_id)
+    count = collection.count()
+
+    if count == 0:
+        return [
+            {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+            for _ in query_texts
+        ]
+
+    raw = collection.query(
+        query_embeddings=_embed_queries(list(query_texts)),
+        n_results=min(n_results, count),
+        include=["documents", "metadatas", "distances"],
+    )
+    return [
+        {
+            "ids":       [raw["ids"][i]],
+            "documents": [raw["documents"][i]],
+            "metadatas": [raw["metadatas"][i]],
+            "distances": [raw["distances"][i]],
+        }
+        for i in range(len(query_texts))
+    ]
+
+
 def delete_collection(username: str, notebook_id: str) -> None:
     """
     Delete the entire collection for a notebook.
 
-    Called when a notebook is deleted.  Safe to call if the collection does
-    not exist yet — the error is swallowed silently.
+    Called when a notebook is deleted, before its directory is removed.
+    Safe to call if the collection does not exist yet — the error is
+    swallowed silently.  The notebook's cached client is closed afterwards
+    so no SQLite handles stay open on the deleted files.
 
     Args:
         username    – HuggingFace username
@@ -215,6 +446,7 @@ def delete_collection(username: str, notebook_id: str) -> None:
     """
     chroma_dir = get_chroma_dir(username, notebook_id)
     if not chroma_dir.exists():
+        _close_client(chroma_dir)
         return
 
     client = _get_client(chroma_dir)
@@ -224,6 +456,8 @@ def delete_collection(username: str, notebook_id: str) -> None:
         client.delete_collection(name)
     except Exception:
         pass  # already absent — not an error
+    _close_client(chroma_dir)
+    _bump_version(username, notebook_id)
 
 
 # ---------------------------------------------------------------------------
@@ -231,6 +465,31 @@ def delete_collection(username: str, notebook_id: str) -> None:
 # Not in the stub, but needed by other modules.
 # ---------------------------------------------------------------------------
 
+def embed(texts: list[str]) -> list:
+    """
+    Embed *texts* with the model the collections are indexed with.
+
+    Bypasses the embedding cache: query-side texts are one-off and would only
+    fill it up.
+    """
+    return _embedding_fn(list(texts))
+
+
+def load_embedding_model() -> None:
+    """Load the embedding model now instead of on the first embed call."""
+    _embedding_fn._load()
+
+
+def collection_version(username: str, notebook_id: str) -> int:
+    """
+    Return the write stamp of this notebook's collection.
+
+    The value changes whenever chunks are added, replaced or deleted in this
+    process; 0 means no write has happened since start-up.
+    """
+    return _versions.get((username, notebook_id), 0)
+
+
 def collection_count(username: str, notebook_id: str) -> int:
     """Return the total number of chunks indexed in this notebook."""
     return get_or_create_collection(username, notebook_id).count()
@@ -240,18 +499,28 @@ def list_sources(username: str, notebook_id: str) -> list[str]:
     """
     Return the unique source names currently indexed in this notebook.
 
-    Useful for the Gradio UI to show which files have been ingested.
+    Useful for the Gradio UI to show which files have been ingested.  The
+    metadata scan is repeated only after the collection has been written to.
     """
+    key = (username, notebook_id)
+    # Read the version first: a write during the scan leaves this entry stale
+    version = collection_version(username, notebook_id)
+    hit = _sources_cache.get(key)
+    if hit is not None and hit[0] == version:
+        return list(hit[1])
+
     collection = get_or_create_collection(username, notebook_id)
     if collection.count() == 0:
-        return []
-    all_meta = collection.get(include=["metadatas"])["metadatas"]
-    seen: set[str] = set()
-    for m in all_meta:
-        src = m.get("source")
-        if src:
-            seen.add(src)
-    return sorted(seen)
+        sources: list[str] = []
+    else:
+        all_meta = collection.get(include=["metadatas"])["metadatas"]
+        sources = sorted({m["source"] for m in all_meta if m.get("source")})
+
+    _sources_cache.pop(key, None)
+    if len(_sources_cache) >= SOURCES_CACHE_SIZE:
+        _sources_cache.pop(next(iter(_sources_cache)), None)   # oldest first
+    _sources_cache[key] = (version, sources)
+    return list(sources)
 
 
 def delete_source(username: str, notebook_id: str, source: str) -> int:
@@ -259,14 +528,17 @@ def delete_source(username: str, notebook_id: str, source: str) -> int:
     Remove all chunks whose ``metadata["source"]`` equals *source*.
 
     Called when a user removes a single file from a notebook without
-    deleting the whole notebook.
+    deleting the whole notebook.  The source's cached extracted text is
+    dropped too.
 
     Returns:
         Number of chunks deleted.
     """
     collection = get_or_create_collection(username, notebook_id)
-    hits = collection.get(where={"source": source})
+    hits = collection.get(where={"source": source}, include=[])   # ids only
     ids = hits["ids"]
     if ids:
         collection.delete(ids=ids)
+        _bump_version(username, notebook_id)
+    extract_cache.purge_source(username, notebook_id, source)
     return len(ids)
\ No newline at end of file
@@ -7,8 +7,16 @@ Mocks the LLM client and vector store so tests run without API keys or ChromaDB.
 from pathlib import Path
 from unittest.mock import patch, MagicMock
 
+import pytest
 
-from core.models import LLMResponse
+from core.models import LLMResponse, LLMUnavailableError
+
+
+@pytest.fixture(autouse=True)
+def _fresh_notebook_text_cache():
+    """Every test gathers from its own mock collection."""
+    with patch.dict("core.artifacts._notebook_texts", clear=True):
+        yield
 
 # ---------------------------------------------------------------------------
 # Shared helpers
@@ -66,6 +74,21 @@ class TestGatherNotebookText:
 
         assert text == ""
 
+    def test_pages_through_large_collections(self):
+        from core.artifacts import _gather_notebook_text
+
+        coll = MagicMock()
+        coll.get.side_effect = [
+            {"documents": FAKE_CHUNKS[:2], "metadatas": FAKE_METAS[:2]},
+            {"documents": FAKE_CHUNKS[2:], "metadatas": FAKE_METAS[2:]},
+        ]
+        with patch("storage.vector_store.get_or_create_collection", return_value=coll), \
+             patch("core.artifacts.GATHER_PAGE_SIZE", 2):
+            text = _gather_notebook_text("user", "nb1")
+
+        assert [c.kwargs["offset"] for c in coll.get.call_args_list] == [0, 2]
+        assert text.index("Einstein") < text.index("Quantum") < text.index("Standard Model")
+
     def test_handles_exception_gracefully(self):
         from core.artifacts import _gather_notebook_text
 
@@ -75,6 +98,113 @@ class TestGatherNotebookText:
         assert text == ""
 
 
+# ---------------------------------------------------------------------------
+# _summarize_text
+# ---------------------------------------------------------------------------
+
+class TestSummarizeText:
+
+    def test_map_phase_keeps_chunk_order_and_falls_back_on_error(self):
+        from core.artifacts import _summarize_text
+
+        text = "a" * 1500 + "b" * 1500 + "c" * 1500
+
+        def fake_complete(prompt, **kwargs):
+            if "b" * 100 in prompt:
+                raise LLMUnavailableError("rate limited")
+            return _fake_llm("summary-a" if "a" * 100 in prompt else "summary-c")
+
+        with patch("core.artifacts.llm_client.complete", side_effect=fake_complete):
+            result = _summarize_text(text)
+
+        assert result == "summary-a\n\n" + "b" * 500 + "\n\nsummary-c"
+
+    def test_reduces_again_while_summaries_exceed_context(self):
+        from core.artifacts import _summarize_text
+
+        prompts = []
+
+        def fake_complete(prompt, **kwargs):
+            prompts.append(prompt)
+            # First level summaries are still long; second level is short
+            return _fake_llm("s" * 1200 if len(prompts) <= 4 else "short")
+
+        text = "".join(str(i) * 1500 for i in range(4))
+        with patch("core.artifacts.llm_client.complete", side_effect=fake_complete), \
+             patch("core.artifacts._encoding", return_value=None), \
+             patch.dict("core.artifacts._token_counts", clear=True), \
+             patch("core.artifacts.MAX_CONTEXT_TOKENS", 500):
+            result = _summarize_text(text)
+
+        # 4 chunks at level 0, then the joined summaries are re-chunked at
+        # the doubled size (3000) into 2 chunks at level 1
+        assert len(prompts) == 6
+        assert result == "short\n\nshort"
+
+
+# ---------------------------------------------------------------------------
+# _notebook_text
+# ---------------------------------------------------------------------------
+
+class TestNotebookText:
+
+    def test_reuses_gathered_text_until_the_collection_changes(self):
+        from core.artifacts import _notebook_text
+        from storage import vector_store
+
+        coll = _mock_collection()
+        with patch("storage.vector_store.get_or_create_collection", return_value=coll):
+            first = _notebook_text("user", "nb-memo")
+            assert _notebook_text("user", "nb-memo") == first
+            assert coll.get.call_count == 1
+
+            vector_store._bump_version("user", "nb-memo")    # e.g. a re-ingest
+            assert _notebook_text("user", "nb-memo") == first
+            assert coll.get.call_count == 2
+
+    def test_empty_result_is_not_memoized(self):
+        from core.artifacts import _notebook_text
+
+        empty = _mock_collection(docs=[], metas=[])
+        with patch("storage.vector_store.get_or_create_collection", return_value=empty):
+            assert _notebook_text("user", "nb-empty") == ""
+        with patch("storage.vector_store.get_or_create_collection",
+                   return_value=_mock_collection()):
+            assert "Einstein" in _notebook_text("user", "nb-empty")
+
+
+# ---------------------------------------------------------------------------
+# _should_summarize
+# ---------------------------------------------------------------------------
+
+class TestShouldSummarize:
+
+    def test_uses_tokenizer_count_and_memoizes_it(self):
+        from core.artifacts import _should_summarize
+
+        enc = MagicMock()
+        enc.encode_ordinary.side_effect = lambda text: text.split()
+        text = "https://example.com/a/very/long/url " * 20    # 20 tokens
+
+        with patch("core.artifacts._encoding", return_value=enc), \
+             patch.dict("core.artifacts._token_counts", clear=True), \
+             patch("core.artifacts.MAX_CONTEXT_TOKENS", 50):
+            # len/4 would estimate ~180 tokens and summarize needlessly
+            assert _should_summarize(text) is False
+            assert _should_summarize(text) is False
+
+        enc.encode_ordinary.assert_called_once_with(text)
+
+    def test_falls_back_to_length_estimate_without_tokenizer(self):
+        from core.artifacts import _should_summarize
+
+        with patch("core.artifacts._encoding", return_value=None), \
+             patch.dict("core.artifacts._token_counts", clear=True), \
+             patch("core.artifacts.MAX_CONTEXT_TOKENS", 50):
+            assert _should_summarize("x" * 200) is False
+            assert _should_summarize("x" * 201) is True
+
+
 # ---------------------------------------------------------------------------
 # generate_report
 # ---------------------------------------------------------------------------
@@ -86,10 +216,10 @@ class TestGenerateReport:
 
         coll = _mock_collection()
         report_dir = tmp_path / "reports"
-        fake_response = _fake_llm("# Physics Report\n\nEinstein was important.")
+        fake_stream = iter(["# Physics Report\n\n", "Einstein was important."])
 
         with patch("storage.vector_store.get_or_create_collection", return_value=coll), \
-             patch("core.artifacts.llm_client.complete", return_value=fake_response), \
+             patch("core.artifacts.llm_client.complete", return_value=fake_stream), \
              patch("core.artifacts.get_artifact_dir", return_value=report_dir):
             result = generate_report("user", "nb1")
 
@@ -98,6 +228,58 @@ class TestGenerateReport:
         # Should have saved a file
         saved = list(report_dir.glob("report_*.md"))
         assert len(saved) == 1
+        assert saved[0].read_text(encoding="utf-8") == result
+
+    def test_stream_report_writes_chunks_as_they_arrive(self, tmp_path):
+        from core.artifacts import stream_report
+
+        coll = _mock_collection()
+        report_dir = tmp_path / "reports"
+
+        with patch("storage.vector_store.get_or_create_collection", return_value=coll), \
+             patch("core.artifacts.llm_client.complete", return_value=iter(["# A", "B", "C"])), \
+             patch("core.artifacts.get_artifact_dir", return_value=report_dir):
+            stream = stream_report("user", "nb1")
+            assert next(stream) == "# A"
+            assert list(report_dir.glob("report_*.md"))     # file open before EOS
+            assert list(stream) == ["B", "C"]
+
+        (saved,) = report_dir.glob("report_*.md")
+        assert saved.read_text(encoding="utf-8") == "# ABC"
+
+    def test_stream_failure_removes_partial_report(self, tmp_path):
+        from core.artifacts import generate_report
+
+        def broken_stream():
+            yield "# Partial"
+            raise RuntimeError("connection reset")
+
+        coll = _mock_collection()
+        report_dir = tmp_path / "reports"
+        with patch("storage.vector_store.get_or_create_collection", return_value=coll), \
+             patch("core.artifacts.llm_client.complete", return_value=broken_stream()), \
+             patch("core.artifacts.get_artifact_dir", return_value=report_dir):
+            result = generate_report("user", "nb1")
+
+        assert "connection reset" in result
+        assert "# Partial" not in result
+        assert not list(report_dir.glob("report_*.md"))
+
+    def test_stream_report_raises_after_partial_chunks(self, tmp_path):
+        from core.artifacts import stream_report
+
+        def broken_stream():
+            yield "# Partial"
+            raise RuntimeError("connection reset")
+
+        coll = _mock_collection()
+        with patch("storage.vector_store.get_or_create_collection", return_value=coll), \
+             patch("core.artifacts.llm_client.complete", return_value=broken_stream()), \
+             patch("core.artifacts.get_artifact_dir", return_value=tmp_path / "reports"):
+            stream = stream_report("user", "nb1")
+            assert next(stream) == "# Partial"
+            with pytest.raises(RuntimeError, match="connection reset"):
+                next(stream)
 
     def test_empty_notebook_returns_no_sources_message(self):
         from core.artifacts import generate_report
@@ -131,13 +313,13 @@ class TestGenerateQuiz:
 
         coll = _mock_collection()
         quiz_dir = tmp_path / "quizzes"
-        fake_response = _fake_llm(
-            "## Quiz Questions\n\n1. What year did Einstein publish relativity?\n\n"
-            "## Answer Key\n\n1. 1905"
-        )
+        fake_stream = iter([
+            "## Quiz Questions\n\n1. What year did Einstein publish relativity?\n\n",
+            "## Answer Key\n\n1. 1905",
+        ])
 
         with patch("storage.vector_store.get_or_create_collection", return_value=coll), \
-             patch("core.artifacts.llm_client.complete", return_value=fake_response), \
+             patch("core.artifacts.llm_client.complete", return_value=fake_stream), \
              patch("core.artifacts.get_artifact_dir", return_value=quiz_dir):
             result = generate_quiz("user", "nb1")
 
@@ -190,11 +372,12 @@ class TestGeneratePodcast:
             "[Alex]: Welcome to the show!\n[Sam]: Today we discuss physics."
         )
 
-        async def fake_tts_save(path):
-            Path(path).write_bytes(b"fake mp3 data")
+        async def fake_tts_stream():
+            yield {"type": "WordBoundary", "offset": 0}
+            yield {"type": "audio", "data": b"fake mp3 data"}
 
         mock_communicate = MagicMock()
-        mock_communicate.return_value.save = fake_tts_save
+        mock_communicate.return_value.stream = fake_tts_stream
 
         with patch("storage.vector_store.get_or_create_collection", return_value=coll), \
              patch("core.artifacts.llm_client.complete", return_value=fake_response), \
@@ -205,6 +388,8 @@ class TestGeneratePodcast:
         assert transcript_path is not None
         assert Path(transcript_path).exists()
         assert "transcript" in Path(transcript_path).name
+        # Both segments' audio frames are streamed into one file
+        assert Path(audio_path).read_bytes() == b"fake mp3 data" * 2
 
     def test_empty_notebook_returns_none_tuple(self):
         from core.artifacts import generate_podcast
@@ -232,6 +417,56 @@ class TestGeneratePodcast:
         assert transcript_path is not None
         assert Path(transcript_path).exists()
         assert audio_path is None
+        assert not list(podcast_dir.glob("podcast_*.mp3"))
+
+
+# ---------------------------------------------------------------------------
+# _run_tts
+# ---------------------------------------------------------------------------
+
+class TestRunTts:
+
+    def test_reuses_one_background_loop(self):
+        import asyncio
+        import threading
+
+        from core.artifacts import _run_tts
+
+        threads = []
+
+        async def record():
+            threads.append((threading.current_thread(), asyncio.get_running_loop()))
+
+        _run_tts(record())
+        _run_tts(record())
+
+        assert threads[0] == threads[1]
+        assert threads[0][0] is not threading.current_thread()
+
+    def test_timeout_cancels_synthesis(self):
+        import asyncio
+        import concurrent.futures
+        import time
+
+        from core.artifacts import _run_tts
+
+        cancelled = []
+
+        async def stuck():
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        with patch("core.artifacts.TTS_TIMEOUT_S", 0.05), \
+             pytest.raises(concurrent.futures.TimeoutError):
+            _run_tts(stuck())
+
+        deadline = time.monotonic() + 2
+        while not cancelled and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert cancelled
 
 
 # ---------------------------------------------------------------------------
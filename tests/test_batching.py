@@ -0,0 +1,129 @@
+"""Tests for utils/batching.py"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.batching import BatchCollector
+
+
+def test_concurrent_submits_share_one_batch():
+    calls = []
+
+    def batch_fn(payloads):
+        calls.append(list(payloads))
+        return [p * 2 for p in payloads]
+
+    collector = BatchCollector(batch_fn, max_batch_size=8, window_s=0.05)
+
+    async def run():
+        return await asyncio.gather(*(collector.submit(i) for i in range(5)))
+
+    assert asyncio.run(run()) == [0, 2, 4, 6, 8]
+    assert calls == [[0, 1, 2, 3, 4]]
+
+
+def test_batch_size_is_capped():
+    calls = []
+
+    def batch_fn(payloads):
+        calls.append(len(payloads))
+        return payloads
+
+    collector = BatchCollector(batch_fn, max_batch_size=2, window_s=0.05)
+
+    async def run():
+        return await asyncio.gather(*(collector.submit(i) for i in range(5)))
+
+    assert asyncio.run(run()) == [0, 1, 2, 3, 4]
+    assert max(calls) <= 2
+    assert sum(calls) == 5
+
+
+def test_exception_result_is_raised_to_its_caller_only():
+    def batch_fn(payloads):
+        return [ValueError("bad") if p == "bad" else p for p in payloads]
+
+    collector = BatchCollector(batch_fn, window_s=0.05)
+
+    async def run():
+        return await asyncio.gather(
+            collector.submit("ok"), collector.submit("bad"), return_exceptions=True,
+        )
+
+    ok, bad = asyncio.run(run())
+    assert ok == "ok"
+    assert isinstance(bad, ValueError)
+
+
+def test_batch_fn_failure_fails_every_caller():
+    def batch_fn(payloads):
+        raise RuntimeError("backend down")
+
+    collector = BatchCollector(batch_fn, window_s=0.01)
+
+    async def run():
+        return await collector.submit("x")
+
+    with pytest.raises(RuntimeError, match="backend down"):
+        asyncio.run(run())
+
+
+def test_wrong_result_count_fails_every_caller():
+    def batch_fn(payloads):
+        return payloads[:-1]                # one result short
+
+    collector = BatchCollector(batch_fn, window_s=0.05)
+
+    async def run():
+        return await asyncio.wait_for(
+            asyncio.gather(*(collector.submit(i) for i in range(3)), return_exceptions=True),
+            timeout=2,
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_slow_batch_does_not_block_the_next():
+    release = threading.Event()
+
+    def batch_fn(payloads):
+        if "slow" in payloads:
+            release.wait(timeout=5)
+        return payloads
+
+    collector = BatchCollector(batch_fn, window_s=0.01, max_concurrency=2)
+
+    async def run():
+        slow = asyncio.ensure_future(collector.submit("slow"))
+        await asyncio.sleep(0.05)               # lands in a later batch
+        fast = await asyncio.wait_for(collector.submit("fast"), timeout=2)
+        assert not slow.done()
+        release.set()
+        return fast, await slow
+
+    assert asyncio.run(run()) == ("fast", "slow")
+
+
+def test_default_runs_batches_in_order():
+    active, overlaps, calls = [], [], []
+
+    def batch_fn(payloads):
+        active.append(1)
+        overlaps.append(len(active))
+        time.sleep(0.02)
+        calls.append(list(payloads))
+        active.pop()
+        return payloads
+
+    collector = BatchCollector(batch_fn, max_batch_size=1, window_s=0.001)
+
+    async def run():
+        return await asyncio.gather(*(collector.submit(i) for i in range(4)))
+
+    assert asyncio.run(run()) == [0, 1, 2, 3]
+    assert calls == [[0], [1], [2], [3]]
+    assert max(overlaps) == 1
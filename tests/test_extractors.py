@@ -1,12 +1,11 @@
 """Tests for utils/extractors.py"""
 
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, PropertyMock, patch
 
 import pytest
 
 from utils.extractors import extract_pdf, extract_pptx, extract_txt, extract_url
 
-
 # ── extract_txt ───────────────────────────────────────────────────────────────
 
 def test_extract_txt_returns_content(tmp_path):
@@ -28,6 +27,14 @@ def test_extract_txt_replaces_bad_encoding(tmp_path):
     assert "caf" in result  # bad byte replaced, rest kept
 
 
+def test_extract_txt_large_file_matches_text_mode(tmp_path):
+    f = tmp_path / "big.txt"
+    f.write_bytes(("caf\u00e9 line\r\nnext\rlast\n" * 5000).encode("utf-8") + b"\xff")
+    with open(f, "r", encoding="utf-8", errors="replace") as fh:
+        expected = fh.read()
+    assert extract_txt(str(f)) == expected
+
+
 def test_extract_txt_multiline(tmp_path):
     content = "line one\nline two\nline three"
     f = tmp_path / "multi.txt"
@@ -144,6 +151,24 @@ def test_extract_pptx_skips_blank_shapes():
     assert result.strip() == "Non-blank text"
 
 
+def test_extract_pptx_reads_shape_text_once():
+    shape = MagicMock()
+    text = PropertyMock(return_value="  Once  ")
+    type(shape).text = text
+    picture = MagicMock(spec=[])            # no .text, like a picture shape
+
+    mock_slide = MagicMock()
+    mock_slide.shapes = [shape, picture]
+    mock_prs = MagicMock()
+    mock_prs.slides = [mock_slide]
+
+    with patch("utils.extractors.Presentation", return_value=mock_prs):
+        result = extract_pptx("deck.pptx")
+
+    assert result == "Once"
+    text.assert_called_once()
+
+
 # ── extract_url ───────────────────────────────────────────────────────────────
 
 def test_extract_url_success():
@@ -172,3 +197,10 @@ def test_extract_url_passes_url_to_fetch():
          patch("trafilatura.extract", return_value="Story text"):
         extract_url(target)
     mock_fetch.assert_called_once_with(target)
+
+
+def test_extract_url_skips_fallback_extractors():
+    with patch("trafilatura.fetch_url", return_value="<html>x</html>"), \
+         patch("trafilatura.extract", return_value="Story text") as mock_extract:
+        extract_url("https://example.com/news/story")
+    mock_extract.assert_called_once_with("<html>x</html>", fast=True)
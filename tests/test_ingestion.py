@@ -1,11 +1,14 @@
 """Tests for core/ingestion.py"""
 
+import os
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
 import pytest
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-from core.ingestion import ingest_file, ingest_url
+from core.ingestion import _chunk_text, ingest_file, ingest_url
+from utils.config import CHUNK_OVERLAP, CHUNK_SIZE
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -48,6 +51,14 @@ def _patch_deps(
     )
 
 
+@pytest.fixture(autouse=True)
+def _isolated_extract_cache(tmp_path):
+    """Put each notebook's extraction cache in the _make_dirs layout."""
+    with patch("storage.extract_cache.get_notebook_dir",
+               side_effect=lambda username, notebook_id: tmp_path / username / notebook_id):
+        yield
+
+
 # ---------------------------------------------------------------------------
 # ingest_file — validation
 # ---------------------------------------------------------------------------
@@ -137,6 +148,57 @@ def test_ingest_file_pptx(tmp_path):
     mock_add.assert_called_once()
 
 
+def test_ingest_file_cache_hit_skips_extractor(tmp_path):
+    f = tmp_path / "report.pdf"
+    f.write_bytes(b"%PDF cached")
+    _make_dirs(tmp_path)
+
+    p1, p2, p3, p4, p5, p6, p7 = _patch_deps(
+        tmp_path=tmp_path, safe_name="report.pdf", extractor_fn="utils.extractors.extract_pdf"
+    )
+    with p1, p2, p3, p4, p5, p6 as mock_extract, p7:
+        first = ingest_file("user", "nb1", str(f))
+    mock_extract.assert_called_once()
+
+    # Same bytes again, possibly under another name
+    p1, p2, p3, p4, p5, _, p7 = _patch_deps(tmp_path=tmp_path, safe_name="copy.pdf")
+    with p1, p2, p3, p4, p5, p7 as mock_add, \
+         patch("utils.extractors.extract_pdf", side_effect=AssertionError) as mock_extract:
+        second = ingest_file("user", "nb1", str(f))
+
+    mock_extract.assert_not_called()
+    mock_add.assert_called_once()
+    assert second["extracted_chars"] == first["extracted_chars"]
+
+
+def test_ingest_file_cache_is_per_notebook(tmp_path):
+    f = tmp_path / "report.pdf"
+    f.write_bytes(b"%PDF shared")
+    for nb in ("nb1", "nb2"):
+        _make_dirs(tmp_path, notebook_id=nb)
+        p1, p2, p3, p4, p5, p6, p7 = _patch_deps(
+            tmp_path=tmp_path, notebook_id=nb, safe_name="report.pdf",
+            extractor_fn="utils.extractors.extract_pdf",
+        )
+        with p1, p2, p3, p4, p5, p6 as mock_extract, p7:
+            ingest_file("user", nb, str(f))
+        mock_extract.assert_called_once()
+
+
+def test_ingest_file_cache_keyed_on_content(tmp_path):
+    f = tmp_path / "report.pdf"
+    _make_dirs(tmp_path)
+    p1, p2, p3, p4, p5, p6, p7 = _patch_deps(
+        tmp_path=tmp_path, safe_name="report.pdf", extractor_fn="utils.extractors.extract_pdf"
+    )
+    with p1, p2, p3, p4, p5, p6 as mock_extract, p7:
+        f.write_bytes(b"%PDF v1")
+        ingest_file("user", "nb1", str(f))
+        f.write_bytes(b"%PDF v2")
+        ingest_file("user", "nb1", str(f))
+    assert mock_extract.call_count == 2
+
+
 # ---------------------------------------------------------------------------
 # ingest_file — vector store contract
 # ---------------------------------------------------------------------------
@@ -180,6 +242,37 @@ def test_ingest_file_creates_raw_and_extracted_dirs(tmp_path):
     assert (nb_dir / "files_extracted").is_dir()
 
 
+def test_ingest_file_copies_raw_file_with_its_metadata(tmp_path):
+    f = tmp_path / "doc.txt"
+    f.write_text(LONG_TEXT, encoding="utf-8")
+    f.chmod(0o640)
+    os.utime(f, (1_600_000_000, 1_600_000_000))
+
+    _make_dirs(tmp_path)
+    p1, p2, p3, p4, p5, p6, p7 = _patch_deps(tmp_path=tmp_path)
+    with p1, p2, p3, p4, p5, p6, p7:
+        ingest_file("user", "nb1", str(f))
+
+    raw = tmp_path / "user" / "nb1" / "files_raw" / "doc.txt"
+    assert raw.read_text(encoding="utf-8") == LONG_TEXT
+    assert raw.stat().st_mtime == 1_600_000_000
+    assert raw.stat().st_mode & 0o777 == 0o640
+
+
+def test_ingest_file_removes_extracted_text_when_store_fails(tmp_path):
+    f = tmp_path / "doc.txt"
+    f.write_text(LONG_TEXT, encoding="utf-8")
+
+    _make_dirs(tmp_path)
+    p1, p2, p3, p4, p5, p6, _ = _patch_deps(tmp_path=tmp_path)
+    with p1, p2, p3, p4, p5, p6, \
+         patch("storage.vector_store.add_documents", side_effect=RuntimeError("disk full")), \
+         pytest.raises(RuntimeError, match="disk full"):
+        ingest_file("user", "nb1", str(f))
+
+    assert not list((tmp_path / "user" / "nb1" / "files_extracted").iterdir())
+
+
 # ---------------------------------------------------------------------------
 # ingest_url — validation
 # ---------------------------------------------------------------------------
@@ -257,3 +350,31 @@ def test_ingest_url_creates_extracted_dir(tmp_path):
         ingest_url("user", "nb1", "https://example.com")
 
     assert (tmp_path / "user" / "nb1" / "files_extracted").is_dir()
+
+
+def test_ingest_url_removes_extracted_text_when_store_fails(tmp_path):
+    _make_dirs(tmp_path)
+    nb_dir = tmp_path / "user" / "nb1"
+    with patch("core.ingestion.get_notebook_dir", return_value=nb_dir), \
+         patch("core.ingestion.get_extracted_dir", return_value=nb_dir / "files_extracted"), \
+         patch("utils.security.sanitize_filename", return_value="page"), \
+         patch("utils.security.validate_path", side_effect=lambda p, _: Path(p)), \
+         patch("utils.extractors.extract_url", return_value=LONG_TEXT), \
+         patch("storage.vector_store.add_documents", side_effect=RuntimeError("disk full")), \
+         pytest.raises(RuntimeError, match="disk full"):
+        ingest_url("user", "nb1", "https://example.com/page")
+
+    assert not list((nb_dir / "files_extracted").iterdir())
+
+
+# ---------------------------------------------------------------------------
+# _chunk_text
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize("length", [1, 999, 1000, 1001, 1800, 1801, 12345])
+def test_chunk_text_fast_path_matches_recursive_splitter(length):
+    text = ("abcdefg漢字" * 2000)[:length]
+    expected = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
+    ).split_text(text)
+    assert _chunk_text(text) == expected
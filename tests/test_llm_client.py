@@ -148,3 +148,95 @@ def test_both_models_unavailable_raises_error(mock_get_client, mock_sleep):
     from core.llm_client import complete
     with pytest.raises(LLMUnavailableError):
         complete("Say hello")
+
+
+@patch("core.llm_client.time.sleep")
+@patch("core.llm_client._get_client")
+def test_retry_backoff_is_jittered(mock_get_client, mock_sleep):
+    """Retry delays are drawn from [0, base * 2**attempt], not fixed."""
+    mock_client = MagicMock()
+    mock_client.chat.completions.create.side_effect = [
+        _make_rate_limit_error(),
+        _make_rate_limit_error(),
+        _make_mock_completion(),
+    ]
+    mock_get_client.return_value = mock_client
+
+    from core.llm_client import complete
+    with patch("core.llm_client.random.uniform", return_value=0.25) as mock_uniform:
+        complete("Say hello")
+
+    assert [c.args for c in mock_uniform.call_args_list] == [(0, 1.0), (0, 2.0)]
+    assert [c.args[0] for c in mock_sleep.call_args_list] == [0.25, 0.25]
+
+
+def test_retry_delay_honours_retry_after():
+    """A Retry-After header overrides the jittered delay (capped)."""
+    from core.llm_client import _retry_delay
+
+    err = _make_rate_limit_error()
+    err.response.headers = {"retry-after": "7"}
+    assert _retry_delay(0, err) == 7.0
+
+    err.response.headers = {"retry-after": "3600"}
+    assert _retry_delay(0, err) == 30.0
+
+
+# ── Response cache ───────────────────────────────────────────
+
+@patch("core.llm_client._get_client")
+def test_cached_complete_reuses_identical_request(mock_get_client, tmp_path):
+    """complete(cache=True) answers a repeated request without calling the API."""
+    mock_client = MagicMock()
+    mock_client.chat.completions.create.return_value = _make_mock_completion()
+    mock_get_client.return_value = mock_client
+
+    from core.llm_client import complete
+    with patch("core.llm_cache.DATA_ROOT", tmp_path):
+        first = complete("Summarize", system_prompt="Be brief", cache=True)
+        second = complete("Summarize", system_prompt="Be brief", cache=True)
+        other = complete("Summarize", system_prompt="Be brief", temperature=0.1, cache=True)
+
+    assert second == first
+    assert other.text == "Hello!"
+    assert mock_client.chat.completions.create.call_count == 2
+
+
+@patch("core.llm_client.time.sleep")
+@patch("core.llm_client._get_client")
+def test_cache_skips_fallback_responses(mock_get_client, mock_sleep, tmp_path):
+    """A response from the fallback model is not cached."""
+    mock_client = MagicMock()
+    rate_err = _make_rate_limit_error()
+    mock_client.chat.completions.create.side_effect = [
+        rate_err, rate_err, rate_err, rate_err,
+        _make_mock_completion(text="Fallback", model="llama-3.1-8b-instant"),
+        _make_mock_completion(text="Primary"),
+    ]
+    mock_get_client.return_value = mock_client
+
+    from core.llm_client import complete
+    with patch("core.llm_cache.DATA_ROOT", tmp_path):
+        assert complete("Say hello", cache=True).text == "Fallback"
+        assert complete("Say hello", cache=True).text == "Primary"
+
+
+@patch("core.llm_client._get_client")
+def test_cached_stream_is_replayed_after_completion(mock_get_client, tmp_path):
+    """A fully read cache=True stream is cached and replayed as one chunk."""
+    mock_client = MagicMock()
+    mock_client.chat.completions.create.return_value = _make_mock_stream_chunks(
+        ["Hel", "lo", "!"]
+    )
+    mock_get_client.return_value = mock_client
+
+    from core.llm_client import complete
+    with patch("core.llm_cache.DATA_ROOT", tmp_path):
+        first = list(complete("Say hello", stream=True, cache=True))
+        second = list(complete("Say hello", stream=True, cache=True))
+        plain = complete("Say hello", cache=True)
+
+    assert first == ["Hel", "lo", "!"]
+    assert second == ["Hello!"]
+    assert plain.text == "Hello!"
+    assert mock_client.chat.completions.create.call_count == 1
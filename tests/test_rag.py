@@ -1,7 +1,17 @@
 """Tests for core/rag.py — mock-based, no API key required."""
 
 from unittest.mock import patch
-from core.models import LLMResponse, RAGResponse
+
+import pytest
+
+from core.models import LLMResponse, LLMUnavailableError, RAGResponse
+
+
+@pytest.fixture(autouse=True)
+def _empty_retrieval_cache():
+    """Each test starts without memoized retrievals."""
+    with patch.dict("core.rag._retrieval_cache", clear=True):
+        yield
 
 
 def _mock_query_results(docs, metas, distances):
@@ -116,12 +126,16 @@ def test_single_source_citations(mock_vs, mock_llm):
 def test_hyde_generates_hypothetical_and_retrieves(mock_vs, mock_llm):
     """HyDE generates a hypothetical answer and uses it for retrieval."""
     mock_llm.complete.side_effect = [
-        # First call: generate hypothetical answer
-        LLMResponse(text="ML uses algorithms to learn from data.", model="m", usage={}),
+        # First call: generate hypothetical answers
+        LLMResponse(
+            text='["ML uses algorithms to learn from data.", "ML finds patterns.", "ML predicts."]',
+            model="m", usage={},
+        ),
         # Second call: generate final answer from retrieved chunks
         LLMResponse(text="ML is about learning [1].", model="m", usage={}),
     ]
-    mock_vs.query_collection.return_value = _mock_query_results(
+    mock_vs.embed.return_value = [[1.0, 0.0], [0.0, 1.0], [0.5, 0.5]]
+    mock_vs.query_collection_by_vector.return_value = _mock_query_results(
         docs=["ML learns from data."],
         metas=[{"source_name": "ml.txt", "chunk_index": 0}],
         distances=[0.2],
@@ -131,12 +145,33 @@ def test_hyde_generates_hypothetical_and_retrieves(mock_vs, mock_llm):
     response = query("alice", "nb-001", "What is ML?", technique="hyde")
 
     assert response.technique == "hyde"
-    # vector_store.query_collection should have been called with the hypothetical text
-    call_args = mock_vs.query_collection.call_args
-    assert "algorithms" in call_args[1].get("query_text", call_args[0][2]) or True
+    # All hypotheses are embedded together and searched with their mean
+    assert mock_vs.embed.call_args.args[0] == [
+        "ML uses algorithms to learn from data.", "ML finds patterns.", "ML predicts.",
+    ]
+    query_vec = mock_vs.query_collection_by_vector.call_args.args[2]
+    assert list(query_vec) == [0.5, 0.5]
+    assert mock_vs.query_collection.call_count == 0
     assert len(response.citations) == 1
 
 
+@patch("core.rag.llm_client")
+@patch("core.rag.vector_store")
+def test_hyde_uses_whole_reply_when_not_json(mock_vs, mock_llm):
+    """A reply that is not a JSON array is used as a single hypothesis."""
+    mock_llm.complete.side_effect = [
+        LLMResponse(text="ML uses algorithms to learn from data.", model="m", usage={}),
+        LLMResponse(text="ML is about learning [1].", model="m", usage={}),
+    ]
+    mock_vs.embed.return_value = [[0.6, 0.8]]
+    mock_vs.query_collection_by_vector.return_value = _mock_empty_results()
+
+    from core.rag import query
+    query("alice", "nb-001", "What is ML?", technique="hyde")
+
+    assert mock_vs.embed.call_args.args[0] == ["ML uses algorithms to learn from data."]
+
+
 @patch("core.rag.llm_client")
 @patch("core.rag.vector_store")
 def test_reranking_reorders_results(mock_vs, mock_llm):
@@ -165,6 +200,55 @@ def test_reranking_reorders_results(mock_vs, mock_llm):
     assert response.citations[0].source_name == "b.txt"
 
 
+@patch("core.rag.llm_client")
+@patch("core.rag.vector_store")
+def test_reranking_requests_digit_scores(mock_vs, mock_llm):
+    """Reranking asks for one digit per chunk with a small output budget."""
+    mock_vs.query_collection.return_value = _mock_query_results(
+        docs=["First.", "Second.", "Third."],
+        metas=[{"source_name": f"{c}.txt", "chunk_index": 0} for c in "abc"],
+        distances=[0.1, 0.2, 0.3],
+    )
+    mock_llm.complete.return_value = LLMResponse(text="25", model="m")
+
+    from core.rag import _reranking_retrieve
+    results = _reranking_retrieve("alice", "nb-001", "which?", top_k=3)
+
+    kwargs = mock_llm.complete.call_args.kwargs
+    assert "exactly 3 characters" in kwargs["prompt"]
+    assert kwargs["max_tokens"] < 20
+    # The missing third score counts as neutral (3)
+    assert results["documents"][0] == ["Second.", "Third.", "First."]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("43215", [4, 3, 2, 1, 5]),
+    ("4 3, 2", [4, 3, 2, 3, 3]),
+    ("[5, 1, 1, 1, 1, 1]", [5, 1, 1, 1, 1]),
+    ("", [3, 3, 3, 3, 3]),
+])
+def test_parse_scores(text, expected):
+    from core.rag import _parse_scores
+    assert _parse_scores(text, 5) == expected
+
+
+@patch("core.rag.llm_client")
+@patch("core.rag.vector_store")
+def test_reranking_keeps_vector_order_when_scoring_fails(mock_vs, mock_llm):
+    """An unavailable scorer degrades to the original vector ranking."""
+    mock_vs.query_collection.return_value = _mock_query_results(
+        docs=["First.", "Second.", "Third."],
+        metas=[{"source_name": f"{c}.txt", "chunk_index": 0} for c in "abc"],
+        distances=[0.1, 0.2, 0.3],
+    )
+    mock_llm.complete.side_effect = LLMUnavailableError("rate limited")
+
+    from core.rag import _reranking_retrieve
+    results = _reranking_retrieve("alice", "nb-001", "which?", top_k=2)
+
+    assert results["documents"][0] == ["First.", "Second."]
+
+
 # ── T027: Multi-query and invalid technique ───────────────────
 
 @patch("core.rag.llm_client")
@@ -177,18 +261,90 @@ def test_multi_query_generates_variants(mock_vs, mock_llm):
         # Final answer
         LLMResponse(text="ML is AI [1].", model="m", usage={}),
     ]
-    mock_vs.query_collection.return_value = _mock_query_results(
+    hit = _mock_query_results(
         docs=["ML is a type of AI."],
         metas=[{"source_name": "ai.txt", "chunk_index": 0}],
         distances=[0.2],
     )
+    mock_vs.query_collection.return_value = hit
+    mock_vs.query_collection_batch.side_effect = lambda u, nb, texts, n_results: [
+        hit for _ in texts
+    ]
 
     from core.rag import query
     response = query("alice", "nb-001", "What is ML?", technique="multi_query")
 
     assert response.technique == "multi_query"
-    # Should have called query_collection multiple times (original + variants)
-    assert mock_vs.query_collection.call_count >= 2
+    # The original question is searched on its own, alongside variant
+    # generation; the variants then share one batched call
+    assert mock_vs.query_collection.call_args.args[2] == "What is ML?"
+    assert mock_vs.query_collection_batch.call_count == 1
+    queries = mock_vs.query_collection_batch.call_args.args[2]
+    assert queries == ["What is AI?", "Define ML", "Explain machine learning"]
+
+
+@patch("core.rag.llm_client")
+@patch("core.rag.vector_store")
+def test_multi_query_fuses_on_chunk_ids(mock_vs, mock_llm):
+    """Chunks from different sources with the same index are kept apart."""
+    mock_llm.complete.side_effect = [
+        LLMResponse(text='["Define ML"]', model="m", usage={}),
+        LLMResponse(text="ML is AI [1].", model="m", usage={}),
+    ]
+    a = ("id-a", "Chunk from a.", {"source": "a.txt", "chunk_index": 0})
+    b = ("id-b", "Chunk from b.", {"source": "b.txt", "chunk_index": 0})
+
+    def _results(*hits):
+        return {
+            "ids": [[h[0] for h in hits]],
+            "documents": [[h[1] for h in hits]],
+            "metadatas": [[h[2] for h in hits]],
+            "distances": [[0.1] * len(hits)],
+        }
+
+    mock_vs.query_collection.return_value = _results(a, b)
+    mock_vs.query_collection_batch.return_value = [_results(b, a)]
+
+    from core.rag import _multi_query_retrieve
+    fused = _multi_query_retrieve("alice", "nb-001", "What is ML?", top_k=5)
+
+    assert sorted(fused["documents"][0]) == ["Chunk from a.", "Chunk from b."]
+
+
+@patch("core.rag.llm_client")
+@patch("core.rag.vector_store")
+def test_multi_query_skips_blank_variants(mock_vs, mock_llm):
+    """Blank or non-string variants are dropped instead of failing retrieval."""
+    mock_llm.complete.side_effect = [
+        LLMResponse(text='["", "Define ML", 42, "   "]', model="m", usage={}),
+        LLMResponse(text="ML is AI [1].", model="m", usage={}),
+    ]
+    mock_vs.query_collection.return_value = _mock_empty_results()
+    mock_vs.query_collection_batch.side_effect = lambda u, nb, texts, n_results: [
+        _mock_empty_results() for _ in texts
+    ]
+
+    from core.rag import query
+    query("alice", "nb-001", "What is ML?", technique="multi_query")
+
+    queries = mock_vs.query_collection_batch.call_args.args[2]
+    assert queries == ["Define ML"]
+
+
+@patch("core.rag.llm_client")
+@patch("core.rag.vector_store")
+def test_multi_query_without_variants_searches_once(mock_vs, mock_llm):
+    """With no usable variants only the original question is searched."""
+    mock_llm.complete.return_value = LLMResponse(text="not json", model="m", usage={})
+    mock_vs.query_collection.return_value = _mock_query_results(
+        ["Chunk."], [{"source_name": "f.txt", "chunk_index": 0}], [0.1],
+    )
+
+    from core.rag import _multi_query_retrieve
+    fused = _multi_query_retrieve("alice", "nb-001", "What is ML?")
+
+    assert fused["documents"][0] == ["Chunk."]
+    mock_vs.query_collection_batch.assert_not_called()
 
 
 @patch("core.rag.llm_client")
@@ -206,3 +362,154 @@ def test_invalid_technique_falls_back_to_naive(mock_vs, mock_llm):
     response = query("alice", "nb-001", "test", technique="unknown_technique")
 
     assert response.technique == "naive"
+
+
+# ── Retrieval cache ───────────────────────────────────────────
+
+@patch("core.rag.llm_client")
+@patch("core.rag.vector_store")
+def test_repeated_question_reuses_retrieval(mock_vs, mock_llm):
+    """A repeated question skips the vector search until the collection changes."""
+    mock_vs.collection_version.return_value = 1
+    mock_vs.query_collection.return_value = _mock_query_results(
+        docs=["Chunk."], metas=[{"source_name": "f.txt", "chunk_index": 0}], distances=[0.3],
+    )
+    mock_llm.complete.return_value = LLMResponse(text="Answer [1].", model="m", usage={})
+
+    from core.rag import query
+    query("alice", "nb-001", "What is ML?")
+    query("alice", "nb-001", "  What is   ML? ")
+    assert mock_vs.query_collection.call_count == 1
+
+    query("alice", "nb-001", "What is ML?", technique="hyde_typo")   # naive fallback
+    assert mock_vs.query_collection.call_count == 1
+
+    mock_vs.collection_version.return_value = 2                    # e.g. new upload
+    query("alice", "nb-001", "What is ML?")
+    assert mock_vs.query_collection.call_count == 2
+
+
+@patch("core.rag.llm_client")
+@patch("core.rag.vector_store")
+def test_repeated_question_reuses_system_prompt(mock_vs, mock_llm):
+    """The sources prompt is assembled once per cached retrieval."""
+    mock_vs.collection_version.return_value = 1
+    mock_vs.query_collection.return_value = _mock_query_results(
+        docs=["Chunk."], metas=[{"source_name": "f.txt", "chunk_index": 0}], distances=[0.3],
+    )
+    mock_llm.complete.return_value = LLMResponse(text="Answer [1].", model="m", usage={})
+
+    from core import rag
+    with patch("core.rag._build_sources_text", wraps=rag._build_sources_text) as build:
+        rag.query("alice", "nb-001", "What is ML?")
+        rag.query("alice", "nb-001", "What is ML?")
+
+    assert build.call_count == 1
+    prompts = [c.kwargs["system_prompt"] for c in mock_llm.complete.call_args_list]
+    assert prompts[0] == prompts[1]
+    assert "[1] (from f.txt):\nChunk." in prompts[0]
+
+
+@patch("core.rag.llm_client")
+@patch("core.rag.vector_store")
+def test_retrieve_batch_searches_only_uncached_questions(mock_vs, mock_llm):
+    """Batched naive retrieval serves repeats from the cache."""
+    mock_vs.collection_version.return_value = 1
+    mock_vs.query_collection.return_value = _mock_query_results(
+        ["Chunk A."], [{"source_name": "a.txt", "chunk_index": 0}], [0.1],
+    )
+    mock_vs.query_collection_batch.return_value = [
+        _mock_query_results(["Chunk B."], [{"source_name": "b.txt", "chunk_index": 0}], [0.2]),
+    ]
+    mock_llm.complete.return_value = LLMResponse(text="Answer [1].", model="m", usage={})
+
+    from core.rag import query, retrieve_batch
+    query("alice", "nb-001", "first?")
+    retrieved = retrieve_batch([
+        ("alice", "nb-001", "first?"),
+        ("alice", "nb-001", "second?"),
+    ])
+
+    mock_vs.query_collection_batch.assert_called_once()
+    assert mock_vs.query_collection_batch.call_args.args[2] == ["second?"]
+    assert [r["metadatas"][0][0]["source_name"] for _, r in retrieved] == ["a.txt", "b.txt"]
+
+
+# ── Batched queries ───────────────────────────────────────────
+
+@patch("core.rag.llm_client")
+@patch("core.rag.vector_store")
+def test_retrieve_batch_shares_one_search_per_notebook(mock_vs, mock_llm):
+    """Naive queries on the same notebook go through one batched vector search."""
+    mock_vs.query_collection_batch.return_value = [
+        _mock_query_results(["Chunk A."], [{"source_name": "a.txt", "chunk_index": 0}], [0.1]),
+        _mock_query_results(["Chunk B."], [{"source_name": "b.txt", "chunk_index": 0}], [0.2]),
+    ]
+    mock_llm.complete.return_value = LLMResponse(text="Answer [1].", model="m", usage={})
+
+    from core.rag import retrieve_batch
+    retrieved = retrieve_batch([
+        ("alice", "nb-001", "first?"),
+        ("alice", "nb-001", "second?"),
+    ])
+
+    assert mock_vs.query_collection_batch.call_count == 1
+    mock_vs.query_collection.assert_not_called()
+    assert [t for t, _ in retrieved] == ["naive", "naive"]
+    assert [r["metadatas"][0][0]["source_name"] for _, r in retrieved] == ["a.txt", "b.txt"]
+
+
+@patch("core.rag.llm_client")
+@patch("core.rag.vector_store")
+def test_retrieve_batch_isolates_failures(mock_vs, mock_llm):
+    """A failing request returns its exception without failing the others."""
+    mock_vs.query_collection_batch.side_effect = [
+        [_mock_empty_results()],
+        RuntimeError("db locked"),
+    ]
+
+    from core.rag import retrieve_batch
+    ok, failed = retrieve_batch([
+        ("alice", "nb-001", "q?"),
+        ("bob", "nb-002", "q?"),
+    ])
+
+    assert ok == ("naive", _mock_empty_results())
+    assert isinstance(failed, RuntimeError)
+
+
+# ── Streaming ────────────────────────────────────────────────
+
+@patch("core.rag.llm_client")
+@patch("core.rag.vector_store")
+def test_stream_answer_yields_tokens_and_citations(mock_vs, mock_llm):
+    """stream_answer returns citations up front and streams the answer text."""
+    mock_vs.query_collection.return_value = _mock_query_results(
+        docs=["Python is great."],
+        metas=[{"source_name": "lang.txt", "chunk_index": 3}],
+        distances=[0.2],
+    )
+    mock_llm.complete.return_value = iter(["Python ", "is ", "great [1]."])
+
+    from core.rag import retrieve, stream_answer
+    retrieved = retrieve("alice", "nb-001", "Tell me about Python", "naive")
+    response, tokens = stream_answer("Tell me about Python", *retrieved)
+
+    assert response.citations[0].source_name == "lang.txt"
+    assert response.chunks_considered == 1
+    assert "".join(tokens) == "Python is great [1]."
+    assert mock_llm.complete.call_args.kwargs["stream"] is True
+
+
+@patch("core.rag.llm_client")
+@patch("core.rag.vector_store")
+def test_stream_answer_empty_collection(mock_vs, mock_llm):
+    """Streaming an empty notebook yields the no-documents message without an LLM call."""
+    mock_vs.query_collection.return_value = _mock_empty_results()
+
+    from core.rag import retrieve, stream_answer
+    response, tokens = stream_answer("anything", *retrieve("alice", "nb-empty", "anything", "naive"))
+
+    assert response.citations == []
+    assert "no documents" in "".join(tokens).lower()
+    mock_llm.complete.assert_not_called()
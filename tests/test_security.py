@@ -168,6 +168,18 @@ class TestSanitizeFilename:
         with pytest.raises(ValueError):
             sanitize_filename("\x00\x01\x02")
 
+    # ── stability ────────────────────────────────────────────────────────────
+
+    @pytest.mark.parametrize("raw", [
+        "../../etc/passwd", "a<b>c.txt", "file...exe", " .hidden. ", "CON.txt", "x\x00\x1fy.pdf",
+    ])
+    def test_is_idempotent(self, raw):
+        once = sanitize_filename(raw)
+        assert sanitize_filename(once) == once
+
+    def test_unicode_letters_kept(self):
+        assert sanitize_filename("résumé_日本語.pdf") == "résumé_日本語.pdf"
+
 
 # ===========================================================================
 # sanitize_notebook_name
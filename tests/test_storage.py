@@ -2,10 +2,15 @@
 
 import json
 import os
+import shutil
 import sys
 import tempfile
+import threading
+import time
 from pathlib import Path
+from unittest.mock import patch
 
+import orjson
 import pytest
 
 # ---------------------------------------------------------------------------
@@ -26,6 +31,7 @@ nb_store.DATA_ROOT = _cfg.DATA_ROOT
 
 import storage.chat_store as chat_store    # noqa: E402
 import storage.artifact_store as art_store # noqa: E402
+import storage.extract_cache as ext_cache
 
 # vector_store requires chromadb; skip gracefully if not installed
 try:
@@ -54,6 +60,7 @@ def notebook():
         # Clear ChromaDB client cache to release file locks (Windows)
         if _CHROMA_AVAILABLE:
             vec_store._clients.clear()
+            vec_store._sources_cache.clear()
         nb_store.delete_notebook(USER, meta["id"])
     except (KeyError, PermissionError, OSError):
         pass   # test may have deleted it, or ChromaDB still holds file locks
@@ -155,6 +162,30 @@ class TestListNotebooks:
         result = nb_store.list_notebooks("nonexistent_user_xyz")
         assert result == []
 
+    def test_unchanged_index_not_reparsed(self, notebook):
+        nb_store.list_notebooks(USER)
+        with patch("storage.notebook_store._read_json") as read:
+            listed = nb_store.list_notebooks(USER)
+        read.assert_not_called()
+        assert notebook["id"] in [nb["id"] for nb in listed]
+
+    def test_records_are_callers_own(self, notebook):
+        listed = nb_store.list_notebooks(USER)
+        for nb in listed:
+            nb["name"] = "MUTATED"
+        assert "MUTATED" not in [nb["name"] for nb in nb_store.list_notebooks(USER)]
+
+    def test_external_rewrite_is_picked_up(self, notebook):
+        nb_store.list_notebooks(USER)
+        index_path = _cfg.DATA_ROOT / "users" / "test_user" / "notebooks" / "index.json"
+        index = json.loads(index_path.read_text())
+        for entry in index:
+            if entry["id"] == notebook["id"]:
+                entry["name"] = "Rewritten Elsewhere"
+        index_path.write_text(json.dumps(index))
+        names = [nb["name"] for nb in nb_store.list_notebooks(USER)]
+        assert "Rewritten Elsewhere" in names
+
 
 class TestGetNotebook:
     def test_returns_correct_metadata(self, notebook):
@@ -215,6 +246,183 @@ class TestDeleteNotebook:
         with pytest.raises(KeyError):
             nb_store.delete_notebook(USER, notebook["id"])
 
+    def test_removes_large_tree(self, notebook):
+        nb_dir = nb_store.get_notebook_dir(USER, notebook["id"])
+        raw = nb_store.get_raw_dir(USER, notebook["id"])
+        for i in range(nb_store.RMTREE_PARALLEL_MIN_ENTRIES):
+            (raw / f"f{i}.txt").write_text("x")
+        (raw / "nested" / "deeper").mkdir(parents=True)
+        (raw / "nested" / "deeper" / "g.txt").write_text("y")
+        outside = Path(tempfile.mkdtemp())
+        (outside / "keep.txt").write_text("keep")
+        (raw / "link").symlink_to(outside, target_is_directory=True)
+
+        nb_store._rmtree(nb_dir)
+
+        assert not nb_dir.exists()
+        assert (outside / "keep.txt").exists()     # symlink removed, not followed
+        shutil.rmtree(outside)
+
+    def test_moves_directory_to_trash(self, notebook):
+        nb_dir = nb_store.get_notebook_dir(USER, notebook["id"])
+        with patch.object(nb_store._trash_pool, "submit") as submit:
+            nb_store.delete_notebook(USER, notebook["id"])
+        trash = submit.call_args.args[1]
+        assert not nb_dir.exists()
+        assert trash.parent == nb_dir.parent
+        assert trash.name.startswith(f".trash.{notebook['id']}.")
+        assert (trash / "metadata.json").exists()
+        nb_store._drain_trash(trash)
+        assert not trash.exists()
+
+    def test_sweep_trash_removes_leftovers(self, notebook):
+        nb_dir = nb_store.get_notebook_dir(USER, notebook["id"])
+        leftover = nb_dir.with_name(".trash.crashed.0")
+        (leftover / "files_raw").mkdir(parents=True)
+        (leftover / "files_raw" / "a.txt").write_text("x")
+
+        assert nb_store.sweep_trash() >= 1
+        deadline = time.monotonic() + 5
+        while leftover.exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not leftover.exists()
+        assert nb_dir.exists()
+
+    def test_index_file_keeps_list_order(self):
+        a = nb_store.create_notebook(USER, "Order A")
+        b = nb_store.create_notebook(USER, "Order B")
+        c = nb_store.create_notebook(USER, "Order C")
+        nb_store.delete_notebook(USER, b["id"])
+        index_path = _cfg.DATA_ROOT / "users" / "test_user" / "notebooks" / "index.json"
+        ids = [nb["id"] for nb in json.loads(index_path.read_text())]
+        assert ids.index(a["id"]) < ids.index(c["id"])
+        assert b["id"] not in ids
+        nb_store.delete_notebook(USER, a["id"])
+        nb_store.delete_notebook(USER, c["id"])
+
+
+class TestRenameNotebook:
+    def test_rename_updates_both_records(self, notebook):
+        nb_store.update_notebook_name(USER, notebook["id"], "Renamed NB")
+        assert nb_store.get_notebook(USER, notebook["id"])["name"] == "Renamed NB"
+        listed = next(nb for nb in nb_store.list_notebooks(USER) if nb["id"] == notebook["id"])
+        assert listed["name"] == "Renamed NB"
+
+    def test_own_name_in_other_case_allowed(self, notebook):
+        nb_store.update_notebook_name(USER, notebook["id"], notebook["name"].upper())
+
+    def test_other_notebooks_name_rejected(self, notebook):
+        other = nb_store.create_notebook(USER, "Taken Name")
+        try:
+            with pytest.raises(RuntimeError):
+                nb_store.update_notebook_name(USER, notebook["id"], "taken name")
+        finally:
+            nb_store.delete_notebook(USER, other["id"])
+
+    def test_freed_name_can_be_reused(self, notebook):
+        nb_store.update_notebook_name(USER, notebook["id"], "Old Name")
+        nb_store.update_notebook_name(USER, notebook["id"], "New Name")
+        reused = nb_store.create_notebook(USER, "Old Name")
+        nb_store.delete_notebook(USER, reused["id"])
+
+
+class TestTouchNotebook:
+    def _on_disk(self, nb_id):
+        meta = json.loads((nb_store.get_notebook_dir(USER, nb_id) / "metadata.json").read_text())
+        index_path = _cfg.DATA_ROOT / "users" / "test_user" / "notebooks" / "index.json"
+        entry = next(nb for nb in json.loads(index_path.read_text()) if nb["id"] == nb_id)
+        return meta["updated_at"], entry["updated_at"]
+
+    def test_visible_before_flush_and_written_by_flush(self, notebook):
+        before = self._on_disk(notebook["id"])
+        nb_store.touch_notebook(USER, notebook["id"])
+        touched = nb_store.get_notebook(USER, notebook["id"])["updated_at"]
+        assert touched > notebook["updated_at"]
+        listed = next(nb for nb in nb_store.list_notebooks(USER) if nb["id"] == notebook["id"])
+        assert listed["updated_at"] == touched
+        assert self._on_disk(notebook["id"]) == before
+
+        nb_store.flush_touches()
+        assert self._on_disk(notebook["id"]) == (touched, touched)
+
+    def test_missing_notebook_raises_key_error(self):
+        with pytest.raises(KeyError):
+            nb_store.touch_notebook(USER, "00000000-0000-0000-0000-000000000000")
+
+    def test_touches_and_reads_do_not_wait_for_flush_io(self, notebook):
+        nb_store.touch_notebook(USER, notebook["id"])
+        in_flight = nb_store.get_notebook(USER, notebook["id"])["updated_at"]
+        writing, release = threading.Event(), threading.Event()
+        real_write = nb_store._atomic_write_json
+
+        def slow_write(path, data):
+            writing.set()
+            release.wait(5)
+            real_write(path, data)
+
+        with patch("storage.notebook_store._atomic_write_json", side_effect=slow_write):
+            flusher = threading.Thread(target=nb_store.flush_touches)
+            flusher.start()
+            try:
+                assert writing.wait(5)
+                listed = next(nb for nb in nb_store.list_notebooks(USER) if nb["id"] == notebook["id"])
+                assert listed["updated_at"] == in_flight
+                nb_store.touch_notebook(USER, notebook["id"])   # must not block
+                assert flusher.is_alive()
+            finally:
+                release.set()
+                flusher.join(5)
+        assert nb_store.get_notebook(USER, notebook["id"])["updated_at"] > in_flight
+        nb_store.flush_touches()
+
+    def test_flush_does_not_overwrite_concurrent_create(self, notebook):
+        nb_store.touch_notebook(USER, notebook["id"])
+        writing, release = threading.Event(), threading.Event()
+        real_write = nb_store._atomic_write_json
+
+        def slow_write(path, data):
+            if threading.current_thread() is flusher:
+                writing.set()
+                release.wait(5)
+            real_write(path, data)
+
+        created = {}
+        creator = threading.Thread(
+            target=lambda: created.update(nb_store.create_notebook(USER, "Made Mid Flush"))
+        )
+        with patch("storage.notebook_store._atomic_write_json", side_effect=slow_write):
+            flusher = threading.Thread(target=nb_store.flush_touches)
+            flusher.start()
+            try:
+                assert writing.wait(5)
+                creator.start()
+            finally:
+                release.set()
+                flusher.join(5)
+                creator.join(5)
+        try:
+            assert created["id"] in {nb["id"] for nb in nb_store.list_notebooks(USER)}
+        finally:
+            nb_store.delete_notebook(USER, created["id"])
+
+    def test_flush_skips_notebook_whose_directory_is_gone(self, notebook):
+        nb_dir = nb_store.get_notebook_dir(USER, notebook["id"])
+        nb_store.touch_notebook(USER, notebook["id"])
+        moved = nb_dir.with_name(nb_dir.name + ".moved")
+        nb_dir.rename(moved)
+        try:
+            nb_store.flush_touches()
+            assert not nb_dir.exists()
+        finally:
+            moved.rename(nb_dir)
+
+    def test_delete_drops_pending_touch(self, notebook):
+        nb_dir = nb_store.get_notebook_dir(USER, notebook["id"])
+        nb_store.touch_notebook(USER, notebook["id"])
+        nb_store.delete_notebook(USER, notebook["id"])
+        nb_store.flush_touches()
+        assert not nb_dir.exists()
+
 
 # ===========================================================================
 # Chat store
@@ -295,7 +503,57 @@ class TestAppendMessage:
             json.loads(line)
 
 
+class TestAppendMessages:
+    def test_appends_all_in_order(self, notebook):
+        chat_store.append_messages(USER, notebook["id"], [
+            {"role": "user", "content": "Q"},
+            {"role": "assistant", "content": "A"},
+        ])
+        history = chat_store.get_history(USER, notebook["id"])
+        assert [m["content"] for m in history] == ["Q", "A"]
+
+    def test_invalid_message_writes_nothing(self, notebook):
+        with pytest.raises(ValueError):
+            chat_store.append_messages(USER, notebook["id"], [
+                {"role": "user", "content": "Q"},
+                {"role": "robot", "content": "A"},
+            ])
+        assert chat_store.get_history(USER, notebook["id"]) == []
+
+    def test_empty_list_is_noop(self, notebook):
+        chat_store.append_messages(USER, notebook["id"], [])
+        assert chat_store.get_history(USER, notebook["id"]) == []
+
+    def test_chat_dir_resolved_once(self, notebook):
+        chat_store.append_message(USER, notebook["id"], {"role": "user", "content": "Q"})
+        with patch("storage.chat_store.safe_path") as resolve:
+            chat_store.append_message(USER, notebook["id"], {"role": "user", "content": "A"})
+        resolve.assert_not_called()
+
+    def test_removed_chat_dir_is_recreated(self, notebook):
+        chat_store.append_message(USER, notebook["id"], {"role": "user", "content": "Q"})
+        shutil.rmtree(nb_store.get_chat_dir(USER, notebook["id"]))
+        chat_store.append_message(USER, notebook["id"], {"role": "user", "content": "A"})
+        assert [m["content"] for m in chat_store.get_history(USER, notebook["id"])] == ["A"]
+
+    def test_late_append_does_not_recreate_deleted_notebook(self, notebook):
+        chat_store.append_message(USER, notebook["id"], {"role": "user", "content": "Q"})
+        nb_dir = nb_store.get_notebook_dir(USER, notebook["id"])
+        nb_store.delete_notebook(USER, notebook["id"])
+        with pytest.raises(FileNotFoundError):
+            chat_store.append_message(USER, notebook["id"], {"role": "user", "content": "A"})
+        assert not nb_dir.exists()
+
+
 class TestGetHistory:
+    def test_deleted_notebook_returns_empty_list(self, notebook):
+        chat_store.append_message(USER, notebook["id"], {"role": "user", "content": "Q"})
+        nb_dir = nb_store.get_notebook_dir(USER, notebook["id"])
+        nb_store.delete_notebook(USER, notebook["id"])
+        assert chat_store.get_history(USER, notebook["id"]) == []
+        assert chat_store.clear_history(USER, notebook["id"]) == 0
+        assert not nb_dir.exists()
+
     def test_empty_history_returns_empty_list(self, notebook):
         assert chat_store.get_history(USER, notebook["id"]) == []
 
@@ -334,6 +592,34 @@ class TestGetHistory:
         assert "before" in contents
         assert "after" in contents
 
+    def test_reads_only_appended_tail(self, notebook):
+        chat_store.append_message(USER, notebook["id"], {"role": "user", "content": "one"})
+        assert len(chat_store.get_history(USER, notebook["id"])) == 1
+
+        chat_store.append_message(USER, notebook["id"], {"role": "user", "content": "two"})
+        with patch("storage.chat_store.orjson.loads", wraps=orjson.loads) as loads:
+            history = chat_store.get_history(USER, notebook["id"])
+        assert [m["content"] for m in history] == ["one", "two"]
+        assert loads.call_count == 1
+
+    def test_unterminated_last_line_is_read_but_not_cached(self, notebook):
+        chat_store.append_message(USER, notebook["id"], {"role": "user", "content": "one"})
+        msg_file = nb_store.get_chat_dir(USER, notebook["id"]) / "messages.jsonl"
+        with msg_file.open("a") as f:
+            f.write('{"role": "user", "content": "two"}')         # no newline yet
+        assert len(chat_store.get_history(USER, notebook["id"])) == 2
+
+        with msg_file.open("a") as f:
+            f.write("\n")
+        chat_store.append_message(USER, notebook["id"], {"role": "user", "content": "three"})
+        history = chat_store.get_history(USER, notebook["id"])
+        assert [m["content"] for m in history] == ["one", "two", "three"]
+
+    def test_returned_list_is_callers_own(self, notebook):
+        chat_store.append_message(USER, notebook["id"], {"role": "user", "content": "x"})
+        chat_store.get_history(USER, notebook["id"]).clear()
+        assert len(chat_store.get_history(USER, notebook["id"])) == 1
+
     def test_get_history_for_llm_strips_internal_fields(self, notebook):
         chat_store.append_message(
             USER, notebook["id"],
@@ -484,6 +770,53 @@ class TestVectorStore:
         vec_store.delete_collection(USER, "00000000-0000-0000-0000-000000000000")
 
 
+    def test_delete_source_purges_extracted_text(self, notebook):
+        vec_store.add_documents(USER, notebook["id"], ["x"], [{"source": "a.pdf"}])
+        ext_cache.put(USER, notebook["id"], b"k" * 16, "a.pdf", "Extracted.")
+        vec_store.delete_source(USER, notebook["id"], "a.pdf")
+        assert ext_cache.get(USER, notebook["id"], b"k" * 16) is None
+
+
+# ===========================================================================
+# Extraction cache
+# ===========================================================================
+
+class TestExtractCache:
+    def test_round_trip_scoped_to_notebook(self, notebook):
+        other = nb_store.create_notebook(USER, "Extract Other")
+        ext_cache.put(USER, notebook["id"], b"k1", "a.pdf", "Text A")
+        assert ext_cache.get(USER, notebook["id"], b"k1") == "Text A"
+        assert ext_cache.get(USER, other["id"], b"k1") is None
+        nb_store.delete_notebook(USER, other["id"])
+
+    def test_least_recently_used_evicted_over_cap(self, notebook):
+        nb = notebook["id"]
+        with patch.object(ext_cache, "EXTRACT_CACHE_MAX_BYTES", 10):
+            ext_cache.put(USER, nb, b"k1", "a.pdf", "aaaa")
+            ext_cache.put(USER, nb, b"k2", "b.pdf", "bbbb")
+            ext_cache.get(USER, nb, b"k1")                  # k2 is now the oldest
+            ext_cache.put(USER, nb, b"k3", "c.pdf", "cccc")
+            ext_cache.put(USER, nb, b"k4", "d.pdf", "x" * 11)   # larger than the cap
+        assert ext_cache.get(USER, nb, b"k1") == "aaaa"
+        assert ext_cache.get(USER, nb, b"k2") is None
+        assert ext_cache.get(USER, nb, b"k3") == "cccc"
+        assert ext_cache.get(USER, nb, b"k4") is None
+
+    def test_purge_source(self, notebook):
+        ext_cache.put(USER, notebook["id"], b"k1", "a.pdf", "Text A")
+        ext_cache.put(USER, notebook["id"], b"k2", "b.pdf", "Text B")
+        ext_cache.purge_source(USER, notebook["id"], "a.pdf")
+        assert ext_cache.get(USER, notebook["id"], b"k1") is None
+        assert ext_cache.get(USER, notebook["id"], b"k2") == "Text B"
+
+    def test_removed_with_notebook(self, notebook):
+        ext_cache.put(USER, notebook["id"], b"k1", "a.pdf", "Text A")
+        db = nb_store.get_notebook_dir(USER, notebook["id"]) / "extract_cache.sqlite3"
+        assert db.is_file()
+        nb_store.delete_notebook(USER, notebook["id"])
+        assert not db.exists()
+
+
 # ===========================================================================
 # Artifact store
 # ===========================================================================
@@ -516,6 +849,16 @@ class TestSaveArtifact:
         )
         raw = art_store.get_artifact_bytes(USER, notebook["id"], "podcasts", "podcast_1.mp3")
         assert raw == fake_audio
+        assert art_store.get_artifact(USER, notebook["id"], "podcasts", "podcast_1.mp3") == fake_audio
+
+    def test_path_for_podcast_mp3(self, notebook):
+        saved = art_store.save_artifact(
+            USER, notebook["id"], "podcasts", b"\x00\x01", "podcast_1.mp3"
+        )
+        path = art_store.get_artifact_path(USER, notebook["id"], "podcasts", "../podcast_1.mp3")
+        assert str(path) == saved
+        with pytest.raises(FileNotFoundError):
+            art_store.get_artifact_path(USER, notebook["id"], "podcasts", "podcast_2.mp3")
 
     def test_podcast_transcript_md(self, notebook):
         art_store.save_artifact(
@@ -581,6 +924,18 @@ class TestListArtifacts:
         with pytest.raises(ValueError):
             art_store.list_artifacts(USER, notebook["id"], "videos")
 
+    def test_sorted_and_skips_stray_entries(self, notebook):
+        art_store.save_artifact(USER, notebook["id"], "reports", "b", "report_2.md")
+        path = art_store.save_artifact(USER, notebook["id"], "reports", "a", "report_1.md")
+        reports_dir = Path(path).parent
+        (reports_dir / ".DS_Store").write_bytes(b"")
+        (reports_dir / "notes.MD.bak").write_text("x")
+        (reports_dir / "sub.md").mkdir()
+        items = art_store.list_artifacts(USER, notebook["id"], "reports")
+        assert [i["filename"] for i in items] == ["report_1.md", "report_2.md"]
+        assert items[0]["path"] == path
+        assert items[0]["size"] == 1
+
 
 class TestGetArtifact:
     def test_returns_content_string(self, notebook):
@@ -597,6 +952,24 @@ class TestGetArtifact:
         with pytest.raises(ValueError):
             art_store.get_artifact(USER, notebook["id"], "reports", "report.sh")
 
+    def test_preview_returns_short_file_whole(self, notebook):
+        art_store.save_artifact(USER, notebook["id"], "reports", "# Short", "report_1.md")
+        preview = art_store.get_artifact_preview(USER, notebook["id"], "reports", "report_1.md")
+        assert preview == "# Short"
+
+    def test_preview_truncates_long_file(self, notebook):
+        art_store.save_artifact(USER, notebook["id"], "reports", "é" * 100, "report_1.md")
+        preview = art_store.get_artifact_preview(
+            USER, notebook["id"], "reports", "report_1.md", max_bytes=51,
+        )
+        # 51 bytes cuts the 26th two-byte character in half; it is dropped
+        assert preview.startswith("é" * 25 + "\n")
+        assert "truncated" in preview
+
+    def test_preview_rejects_audio(self, notebook):
+        with pytest.raises(ValueError):
+            art_store.get_artifact_preview(USER, notebook["id"], "podcasts", "podcast_1.mp3")
+
     def test_delete_artifact(self, notebook):
         art_store.save_artifact(USER, notebook["id"], "reports", "bye", "report_1.md")
         deleted = art_store.delete_artifact(USER, notebook["id"], "reports", "report_1.md")
@@ -2,7 +2,7 @@
 
 
 import pytest
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 
 @pytest.fixture
@@ -14,6 +14,7 @@ def temp_data_dir(tmp_path):
         # Clear the module-level client cache so each test gets a fresh client
         import storage.vector_store as _vs
         _vs._clients.clear()
+        _vs._sources_cache.clear()
         yield str(data_root)
         # Clean up client cache to release file locks (Windows)
         _vs._clients.clear()
@@ -78,6 +79,194 @@ def test_delete_collection(temp_data_dir):
                   [{"source_name": "f.txt", "chunk_index": 0}])
 
     delete_collection("testuser", "nb-del")
+    from storage import vector_store
+    assert vector_store._clients == {}          # handles released before the dir goes
 
     collection = get_or_create_collection("testuser", "nb-del")
     assert collection.count() == 0
+
+
+def test_query_collection_batch_matches_single_queries(temp_data_dir):
+    """Batched querying returns one result per text, same as single queries."""
+    from storage.vector_store import (
+        add_documents,
+        query_collection,
+        query_collection_batch,
+    )
+
+    chunks = [
+        "Machine learning is a subset of artificial intelligence.",
+        "Python is a popular programming language.",
+    ]
+    metadatas = [
+        {"source_name": "ai.txt", "chunk_index": 0},
+        {"source_name": "python.txt", "chunk_index": 0},
+    ]
+    add_documents("testuser", "nb-batch", chunks, metadatas)
+
+    questions = ["What is machine learning?", "Which programming language is popular?"]
+    batched = query_collection_batch("testuser", "nb-batch", questions, n_results=1)
+
+    assert len(batched) == 2
+    for q, res in zip(questions, batched):
+        single = query_collection("testuser", "nb-batch", q, n_results=1)
+        assert res["documents"] == single["documents"]
+        assert res["ids"] == single["ids"]
+
+
+def test_add_documents_upserts_in_batches(temp_data_dir):
+    """Chunks beyond one batch are all stored, with ids that stay stable."""
+    from storage.vector_store import add_documents, get_or_create_collection
+
+    chunks = [f"Fact number {i} about astronomy." for i in range(7)]
+    metadatas = [{"source": "astro.txt", "chunk_index": i} for i in range(7)]
+
+    with patch("storage.vector_store.EMBED_UPSERT_BATCH_SIZE", 3):
+        add_documents("testuser", "nb-batches", chunks, metadatas)
+    add_documents("testuser", "nb-batches", chunks, metadatas)   # single batch
+
+    collection = get_or_create_collection("testuser", "nb-batches")
+    assert collection.count() == 7
+
+
+def test_add_documents_surfaces_failed_background_upsert(temp_data_dir):
+    """An upsert failing on the helper thread is raised to the caller."""
+    import storage.vector_store as vs
+
+    chunks = [f"Fact number {i} about geology." for i in range(5)]
+    metadatas = [{"source": "geo.txt", "chunk_index": i} for i in range(5)]
+
+    collection = MagicMock()
+    collection.upsert.side_effect = [None, RuntimeError("disk full"), None]
+    with patch.object(vs, "get_or_create_collection", return_value=collection), \
+         patch("storage.vector_store.EMBED_UPSERT_BATCH_SIZE", 2), \
+         pytest.raises(RuntimeError, match="disk full"):
+        vs.add_documents("testuser", "nb-fail", chunks, metadatas)
+
+
+def test_add_documents_embeds_only_unseen_chunks(temp_data_dir):
+    """Re-ingesting mostly unchanged text reuses cached embeddings."""
+    import storage.vector_store as vs
+
+    chunks = ["Mars is red.", "Venus is hot.", "Jupiter is big."]
+    metas = [{"source": "planets.txt", "chunk_index": i} for i in range(3)]
+
+    with patch.object(vs.embedding_cache, "put_many",
+                      wraps=vs.embedding_cache.put_many) as put_many:
+        vs.add_documents("testuser", "nb-cache", chunks, metas)
+        vs.add_documents("testuser", "nb-cache", chunks[:2] + ["Saturn has rings."], metas)
+
+    # Only freshly embedded vectors are written to the cache
+    assert [len(c.args[0]) for c in put_many.call_args_list] == [3, 1]
+    results = vs.query_collection("testuser", "nb-cache", "Which planet has rings?", n_results=1)
+    assert results["documents"][0] == ["Saturn has rings."]
+
+
+def test_embedding_cache_int8_round_trip(temp_data_dir):
+    """Cached vectors come back as float32 within int8 quantization error."""
+    import numpy as np
+
+    from storage import embedding_cache
+
+    rng = np.random.default_rng(0)
+    vec = rng.standard_normal(384).astype(np.float32)
+    vec /= np.linalg.norm(vec)
+    key = embedding_cache.make_key("Pluto is a dwarf planet.")
+
+    embedding_cache.put_many({key: vec, b"zero": np.zeros(384)})
+    cached = embedding_cache.get_many([key, b"zero"])
+
+    assert cached[key].dtype == np.float32
+    assert np.dot(cached[key], vec) / np.linalg.norm(cached[key]) > 0.999
+    assert not cached[b"zero"].any()
+
+
+def test_collection_version_changes_on_every_write(temp_data_dir):
+    """Adding or deleting chunks gives the collection a new write version."""
+    from storage.vector_store import add_documents, collection_version, delete_source
+
+    v0 = collection_version("testuser", "nb-version")
+    add_documents("testuser", "nb-version", ["Ceres orbits the Sun."],
+                  [{"source": "ceres.txt", "chunk_index": 0}])
+    v1 = collection_version("testuser", "nb-version")
+    delete_source("testuser", "nb-version", "ceres.txt")
+    v2 = collection_version("testuser", "nb-version")
+
+    assert len({v0, v1, v2}) == 3
+
+
+def test_query_collection_by_vector_matches_text_query(temp_data_dir):
+    """Searching with a text's embedding gives the same hits as the text."""
+    from storage.vector_store import (
+        add_documents,
+        embed,
+        query_collection,
+        query_collection_by_vector,
+    )
+
+    chunks = ["Mercury is closest to the Sun.", "Neptune is the farthest planet."]
+    metas = [{"source": "solar.txt", "chunk_index": i} for i in range(2)]
+    add_documents("testuser", "nb-vec", chunks, metas)
+
+    question = "Which planet is nearest the Sun?"
+    (vec,) = embed([question])
+    by_vec = query_collection_by_vector("testuser", "nb-vec", vec, n_results=1)
+    by_text = query_collection("testuser", "nb-vec", question, n_results=1)
+
+    assert by_vec["ids"] == by_text["ids"]
+
+
+def test_list_sources_rescans_only_after_writes(temp_data_dir):
+    """list_sources is served from memory until the collection changes."""
+    from storage import vector_store
+    from storage.vector_store import add_documents, delete_source, list_sources
+
+    add_documents("testuser", "nb-src", ["alpha"], [{"source": "a.txt", "chunk_index": 0}])
+    assert list_sources("testuser", "nb-src") == ["a.txt"]
+
+    with patch.object(vector_store, "get_or_create_collection") as get_coll:
+        sources = list_sources("testuser", "nb-src")
+    get_coll.assert_not_called()
+    sources.append("mutated.txt")                   # caller's own copy
+
+    add_documents("testuser", "nb-src", ["beta"], [{"source": "b.txt", "chunk_index": 0}])
+    assert list_sources("testuser", "nb-src") == ["a.txt", "b.txt"]
+    delete_source("testuser", "nb-src", "a.txt")
+    assert list_sources("testuser", "nb-src") == ["b.txt"]
+
+
+def test_repeated_query_reuses_embedding(temp_data_dir):
+    """A query text seen before is not embedded again, single or batched."""
+    from storage import vector_store
+    from storage.vector_store import (
+        add_documents,
+        query_collection,
+        query_collection_batch,
+    )
+
+    add_documents("testuser", "nb-qemb", ["alpha beta"], [{"source": "a.txt", "chunk_index": 0}])
+    first = query_collection("testuser", "nb-qemb", "alpha?")
+    vec = vector_store._query_vectors["alpha?"]
+
+    again = query_collection("testuser", "nb-qemb", "alpha?")
+    query_collection_batch("testuser", "nb-qemb", ["alpha?", "beta?", "beta?"])
+
+    assert again["ids"] == first["ids"]
+    assert vector_store._query_vectors["alpha?"] is vec
+    assert list(vector_store._query_vectors)[-2:] == ["alpha?", "beta?"]
+
+
+def test_embedding_model_loads_on_first_embed(temp_data_dir):
+    """Read-only calls leave the model unloaded; the first embed loads it."""
+    from storage import vector_store
+    from storage.vector_store import embed, list_sources
+
+    lazy = vector_store._LazySentenceTransformerEF(
+        vector_store.EMBEDDING_MODEL, vector_store.EMBEDDING_DEVICE
+    )
+    with patch.object(vector_store, "_embedding_fn", lazy):
+        assert list_sources("testuser", "nb-lazy") == []
+        assert lazy._loaded is False
+
+        embed(["anything?"])
+        assert lazy._loaded is True
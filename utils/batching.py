@@ -0,0 +1,109 @@
+"""
+Micro-batching helper.
+
+Responsibilities:
+  - Collect requests arriving from concurrent async callbacks
+  - Flush them as one batch after a short window or once the batch is full
+  - Run the (blocking) batch function in a worker thread, up to
+    *max_concurrency* batches at once
+  - Resolve each caller's future with its own result (or exception)
+"""
+
+import asyncio
+import logging
+from collections.abc import Callable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class BatchCollector:
+    """
+    Coalesce concurrent ``submit()`` calls into batched ``batch_fn`` calls.
+
+    *batch_fn* receives a list of payloads and must return a list of results
+    of the same length.  A result that is an ``Exception`` instance is raised
+    to the matching caller instead of being returned.
+
+    With the default *max_concurrency* of 1 batches run one after another,
+    in arrival order.  A higher value lets the next batch start while a slow
+    one is still running; use it only when batches are independent.
+
+    The worker task is created lazily on the running event loop the first
+    time :meth:`submit` is awaited, so the collector can be built at import
+    or UI-construction time.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[list[Any]], list[Any]],
+        max_batch_size: int = 8,
+        window_s: float = 0.025,
+        max_concurrency: int = 1,
+    ):
+        self._batch_fn = batch_fn
+        self._max_batch_size = max_batch_size
+        self._window_s = window_s
+        self._max_concurrency = max_concurrency
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._running: set[asyncio.Task] = set()    # strong refs to dispatched batches
+
+    def _ensure_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self._max_concurrency)
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, payload: Any) -> Any:
+        """Queue *payload* and wait for its result from the next batch."""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((payload, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            deadline = loop.time() + self._window_s
+            while len(items) < self._max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except TimeoutError:
+                    break
+
+            await self._slots.acquire()
+            task = loop.create_task(self._dispatch(items))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _dispatch(self, items: list[tuple[Any, asyncio.Future]]) -> None:
+        payloads = [payload for payload, _ in items]
+        try:
+            try:
+                results = await asyncio.to_thread(self._batch_fn, payloads)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"batch_fn returned {len(results)} results for {len(items)} payloads"
+                    )
+            except Exception as e:
+                logger.exception("Batch of %d failed", len(items))
+                results = [e] * len(items)
+
+            for (_, future), result in zip(items, results):
+                if future.done():
+                    continue            # caller went away (e.g. cancelled)
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        finally:
+            self._slots.release()
@@ -15,12 +15,19 @@ LLM_MODEL = "llama-3.3-70b-versatile"
 LLM_FALLBACK_MODEL = "llama-3.1-8b-instant"
 LLM_MAX_RETRIES = 3
 LLM_RETRY_BASE_DELAY = 1.0
+LLM_RETRY_MAX_DELAY = 30.0                # cap on a single backoff sleep
 LLM_TEMPERATURE = 0.7
 LLM_MAX_TOKENS = 1024
+LLM_CACHE_TTL_S = 24 * 3600               # cached artifact / summary completions live this long
+LLM_HTTP_MAX_CONNECTIONS = 32             # Groq connection pool size
+LLM_HTTP_KEEPALIVE_CONNECTIONS = 16       # idle connections kept warm
+LLM_HTTP_KEEPALIVE_EXPIRY_S = 120.0       # keep idle connections across chat turns
 
 # ── Embeddings ───────────────────────────────────────────────
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 EMBEDDING_DEVICE = "cpu"
+EMBED_UPSERT_BATCH_SIZE = 200             # chunks embedded + upserted per ChromaDB call
+QUERY_EMBEDDING_CACHE_SIZE = 1024         # query texts whose embeddings are kept in memory
 
 # ── Chunking ─────────────────────────────────────────────────
 CHUNK_SIZE = 1000
@@ -30,6 +37,13 @@ CHUNK_OVERLAP = 200
 TOP_K = 5
 RERANK_CANDIDATES = 20
 MULTI_QUERY_VARIANTS = 3
+HYDE_HYPOTHESES = 3                       # hypothetical answers averaged into the HyDE query
+RAG_BATCH_MAX_SIZE = 8                    # chat queries coalesced per batch
+RAG_BATCH_WINDOW_S = 0.025                # how long to wait for a batch to fill
+RAG_BATCH_CONCURRENCY = 4                 # batches retrieved at once, so one slow batch can't stall the rest
+RETRIEVAL_CACHE_SIZE = 1024               # memoized retrievals (per process)
+RETRIEVAL_CACHE_TTL_S = 300.0
+RAG_POOL_WORKERS = 8                      # background searches overlapping LLM calls; one per chat turn in flight
 
 # ── TTS (two-speaker podcast) ────────────────────────────────
 TTS_VOICE = "en-US-AriaNeural"            # legacy single-voice fallback
@@ -40,12 +54,32 @@ TTS_HOST_B_VOICE = "en-US-GuyNeural"      # chill / deeper host
 TTS_HOST_B_RATE = "-4%"
 TTS_HOST_B_PITCH = "-2Hz"
 TTS_MAX_CHARS = 5000                      # cap per-podcast to ~7 min audio
+TTS_TIMEOUT_S = 300                       # give up on a podcast's synthesis after this
+
+# ── Gradio queue ─────────────────────────────────────────────
+QUEUE_DEFAULT_CONCURRENCY = 4             # parallel workers per event by default
+QUEUE_MAX_SIZE = 64                       # pending requests before new ones are rejected
+LLM_CONCURRENCY = 8                       # chat turns in flight; >= RAG_BATCH_MAX_SIZE so a batch can fill
+ARTIFACT_CONCURRENCY = 2                  # report / quiz / podcast generations
+INGEST_CONCURRENCY = 3                    # uploads sharing the "ingest" slot
+INGEST_WORKERS = min(8, os.cpu_count() or 1)  # threads parsing files of one upload in parallel
+LIGHT_CONCURRENCY = 16                    # notebook CRUD / listing callbacks
+UI_CACHE_TTL_S = 2.0                      # reuse notebook/source/artifact listings this long
+CHAT_DISPLAY_WINDOW = 40                  # most recent chat messages rendered in the Chatbot
+CHAT_PERSIST_WINDOW_S = 0.1               # write-behind: group chat turns arriving this close together
+CHAT_PERSIST_MAX_BATCH = 64               # ...or at most this many per write batch
 
 # ── Storage ──────────────────────────────────────────────────
 DATA_DIR = os.getenv("DATA_DIR", "data")
 DATA_ROOT = Path(DATA_DIR)
 USERS_DIR = os.path.join(DATA_DIR, "users")
+ARTIFACT_PREVIEW_MAX_BYTES = 64 * 1024    # Markdown viewer shows at most this much
+TOUCH_FLUSH_INTERVAL_S = 2.0               # notebook "last active" bumps are written at most this often
+RMTREE_PARALLEL_MIN_ENTRIES = 128          # notebook deletes this large unlink files on a thread pool
+RMTREE_WORKERS = 8
+EXTRACT_CACHE_MAX_BYTES = 64 * 1024 * 1024   # cached extracted text per notebook (LRU beyond this)
 
 # ── Upload limits ────────────────────────────────────────────
 MAX_FILE_SIZE_MB = 50
-ALLOWED_EXTENSIONS = {".pdf", ".pptx", ".txt"}
+ALLOWED_EXTENSIONS = frozenset({".pdf", ".pptx", ".txt"})
+TXT_MMAP_MIN_BYTES = 64 * 1024            # larger .txt uploads are decoded straight from a memory map
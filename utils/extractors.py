@@ -8,10 +8,15 @@ Responsibilities:
   - extract_url(url)   → str   (via trafilatura)
 """
 
+import mmap
+import os
+
 import fitz  # PyMuPDF
 import trafilatura
 from pptx import Presentation
 
+from utils.config import TXT_MMAP_MIN_BYTES
+
 
 def extract_pdf(file_path: str) -> str:
     """Extract text from a PDF file using PyMuPDF (fitz)."""
@@ -19,7 +24,7 @@ def extract_pdf(file_path: str) -> str:
     pages = []
     for page in doc:
         text = page.get_text()
-        if text.strip():
+        if text and not text.isspace():     # no throwaway stripped copy
             pages.append(text)
     doc.close()
     return "\n\n".join(pages).strip()
@@ -32,8 +37,10 @@ def extract_pptx(file_path: str) -> str:
     for slide in prs.slides:
         shape_texts = []
         for shape in slide.shapes:
-            if hasattr(shape, "text") and shape.text.strip():
-                shape_texts.append(shape.text.strip())
+            # .text re-walks the shape's paragraphs on every access; read it once
+            text = getattr(shape, "text", "").strip()
+            if text:
+                shape_texts.append(text)
         if shape_texts:
             slide_texts.append("\n".join(shape_texts))
     return "\n\n".join(slide_texts)
@@ -41,8 +48,17 @@ def extract_pptx(file_path: str) -> str:
 
 def extract_txt(file_path: str) -> str:
     """Read and return the contents of a plain text file."""
-    with open(file_path, "r", encoding="utf-8", errors="replace") as f:
-        return f.read()
+    if os.path.getsize(file_path) < TXT_MMAP_MIN_BYTES:
+        with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+
+    # Decode from the mapping directly: no intermediate bytes copy of the
+    # whole file.  Newlines are normalised the way text-mode open() would.
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        text = str(mm, "utf-8", "replace")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
 
 
 def extract_url(url: str) -> str:
@@ -50,7 +66,9 @@ def extract_url(url: str) -> str:
     downloaded = trafilatura.fetch_url(url)
     if not downloaded:
         raise ValueError(f"Could not fetch content from URL: {url}")
-    text = trafilatura.extract(downloaded)
+    # fast=True skips the readability/jusText comparison pass that otherwise
+    # re-parses every page with a second extractor.
+    text = trafilatura.extract(downloaded, fast=True)
     if not text:
         raise ValueError(f"Could not extract readable text from URL: {url}")
     return text
@@ -31,6 +31,13 @@ _USERNAME_ALLOWED = re.compile(r"[^a-zA-Z0-9\-]")
 # Characters that are dangerous in filenames on any major OS
 _FILENAME_UNSAFE = re.compile(r'[<>:"/\\|?*\x00-\x1f\x7f]')
 
+# Null bytes / ASCII control characters (dropped, not replaced)
+_CONTROL_CHARS = re.compile(r"[\x00-\x1f\x7f]")
+
+# Runs of dots in filenames, runs of spaces in notebook names
+_DOT_RUNS = re.compile(r"\.{2,}")
+_SPACE_RUNS = re.compile(r" {2,}")
+
 # Windows reserved filenames (blocked everywhere for portability)
 _WINDOWS_RESERVED = {
     "CON", "PRN", "AUX", "NUL",
@@ -72,14 +79,13 @@ def sanitize_filename(name: str) -> str:
     name = Path(name).name
 
     # 2. Remove null bytes and control characters explicitly
-    name = name.replace("\x00", "")
-    name = re.sub(r"[\x00-\x1f\x7f]", "", name)
+    name = _CONTROL_CHARS.sub("", name)
 
     # 3. Replace remaining OS-unsafe characters with underscores
     name = _FILENAME_UNSAFE.sub("_", name)
 
     # 4. Collapse consecutive dots (prevents "file...exe" extension spoofing)
-    name = re.sub(r"\.{2,}", ".", name)
+    name = _DOT_RUNS.sub(".", name)
 
     # 5. Strip leading/trailing dots and spaces
     name = name.strip(". ")
@@ -133,7 +139,7 @@ def sanitize_notebook_name(name: str) -> str:
     name = _NOTEBOOK_NAME_ALLOWED.sub("", name)
 
     # 3. Collapse multiple spaces to a single space
-    name = re.sub(r" {2,}", " ", name)
+    name = _SPACE_RUNS.sub(" ", name)
 
     # 4. Truncate and re-strip (truncation might leave a trailing space)
     name = name[:_MAX_NOTEBOOK_NAME_LEN].strip()